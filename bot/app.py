@@ -1,7 +1,15 @@
 from __future__ import annotations
+import re
+import secrets
+from typing import Any, Dict
+
+from telegram import Update
 from telegram.ext import Application, ApplicationBuilder, CommandHandler, AIORateLimiter, CallbackQueryHandler
 
 from .config import Config
+from .db import repo
+from .services import coinlist, encoding, file_ids, instruments, render_cache, render_pool, snapshots, symbols
+from .services.outbox import Outbox
 
 # Mantengo tu import agregador para el resto de comandos:
 from .handlers import (
@@ -17,10 +25,62 @@ from .handlers.commands.commands import commands_cmd
 
 from .handlers.commands.estado import estado_cb
 from .handlers.commands.config import config_cb
+from .handlers.commands.purge import purge_cb
 
 from .handlers.error import error_handler
 
 
+async def _post_init(app: Application) -> None:
+    cfg: Config = app.bot_data["config"]
+    # cola write-behind (updates coalescidos de chats, p.ej. el header)
+    await repo.start_writer(cfg.db_path, flush_ms=cfg.db_flush_ms, max_pending=cfg.db_flush_max)
+    # cachés de render/envío y resolución de símbolos
+    render_cache.configure(cfg.render_cache_mb)
+    encoding.configure(cfg.image_budget_kb)
+    file_ids.configure(cfg.file_id_cache)
+    snapshots.configure(cfg.snapshot_ttl)
+    symbols.configure(cfg.symbol_map_ttl_h, cfg.symbol_resolve_deadline)
+    # workers de render con matplotlib ya cargado (y el mismo presupuesto de imagen)
+    await render_pool.start(cfg.render_procs, image_budget_kb=cfg.image_budget_kb)
+    # catálogo SPOT de OKX: disco al arrancar + tickSz de los símbolos en uso + refresco periódico
+    await instruments.start(app, await repo.list_symbols(cfg.db_path),
+                            path=cfg.instruments_path, max_age=cfg.instruments_refresh_min * 60)
+    # lista de CoinGecko (validación y sugerencias de /setcoin sin red)
+    await coinlist.start(app, path=cfg.coinlist_path, max_age=cfg.coinlist_refresh_h * 3600)
+    # cola de salida: el heartbeat encola y sigue; el envío va en segundo plano
+    app.bot_data["outbox"] = Outbox(app.bot, workers=cfg.outbox_workers).start()
+
+async def _post_stop(app: Application) -> None:
+    # antes de app.shutdown(): el bot todavía puede enviar lo que quede en cola
+    outbox = app.bot_data.pop("outbox", None)
+    if outbox is not None:
+        await outbox.stop(drain_timeout=10.0)
+
+async def _post_shutdown(app: Application) -> None:
+    # durabilidad: volcar lo que quede en cola antes de salir
+    await repo.close_writers()
+    await render_pool.stop()
+
+
+def webhook_params(cfg: Config) -> Dict[str, Any]:
+    """
+    kwargs para app.run_webhook. Telegram llama a {webhook_url}/{webhook_path} y el servidor
+    (tornado, vía PTB) escucha en webhook_listen:webhook_port; detrás puede ir un proxy/balanceador.
+    Sin WEBHOOK_SECRET se genera uno por arranque (vale para una sola instancia).
+    """
+    secret = cfg.webhook_secret or secrets.token_urlsafe(32)
+    if not re.fullmatch(r"[A-Za-z0-9_-]{1,256}", secret):
+        raise RuntimeError("WEBHOOK_SECRET solo admite A-Z, a-z, 0-9, _ y - (máx. 256)")
+    return dict(
+        listen=cfg.webhook_listen,
+        port=cfg.webhook_port,
+        url_path=cfg.webhook_path,
+        webhook_url=f"{cfg.webhook_url}/{cfg.webhook_path}",
+        secret_token=secret,
+        max_connections=cfg.webhook_max_connections,
+        allowed_updates=Update.ALL_TYPES,
+        drop_pending_updates=True,
+    )
 
 
 def build_app(cfg: Config) -> Application:
@@ -28,11 +88,14 @@ def build_app(cfg: Config) -> Application:
         ApplicationBuilder()
         .token(cfg.token)
         .rate_limiter(AIORateLimiter())
+        .post_init(_post_init)
+        .post_stop(_post_stop)
+        .post_shutdown(_post_shutdown)
         .build()
     )
     app.bot_data["config"] = cfg
     app.bot_data.setdefault("precision_chats", set())
-    app.bot_data.setdefault("runtime", {})  # para cooldown/peaks/etc.
+    app.bot_data.setdefault("runtime", {})  # para cooldowns/etc. (pico y última entrada van a la BD)
 
     # Comandos
     app.add_handler(CommandHandler("start", start_cmd))
@@ -57,6 +120,7 @@ def build_app(cfg: Config) -> Application:
     
 
     # Limpieza
+    app.add_handler(CallbackQueryHandler(purge_cb, pattern=r"^purge:"))
     app.add_handler(CommandHandler("purge", purge_cmd))
     app.add_handler(CommandHandler("clearbot", clearbot_cmd))
     app.add_handler(CommandHandler("clearchat", clearchat_cmd))
@@ -7,6 +7,40 @@ class Config:
     token: str
     poll_sec: int = 60
     db_path: str = "bot.db"
+    # write-behind de la BD: flush cada N ms o M escrituras
+    db_flush_ms: int = 250
+    db_flush_max: int = 500
+    # procesos de render (matplotlib); 0 = renderizar en hilos
+    render_procs: int = 2
+    # tareas de envío de la cola de salida a Telegram
+    outbox_workers: int = 4
+    # cachés y presupuestos de imagen
+    render_cache_mb: float = 32.0     # bytes renderizados compartidos entre chats
+    image_budget_kb: float = 200.0    # objetivo de tamaño por imagen subida
+    file_id_cache: int = 4096         # file_ids de Telegram recordados
+    snapshot_ttl: float = 20.0        # s que vale el snapshot de mercado de /estado
+    # panel live de /estado
+    estado_live_sec: int = 30
+    estado_live_idle_min: int = 30
+    # listados en disco: catálogo SPOT de OKX y lista de CoinGecko
+    instruments_path: str = "okx_instruments.json"
+    instruments_refresh_min: int = 360
+    coinlist_path: str = "cg_coins.json"
+    coinlist_refresh_h: int = 24
+    # resolución cg_id → instId de OKX
+    symbol_map_ttl_h: int = 168
+    symbol_resolve_deadline: float = 8.0
+    # webhook (si webhook_url está vacío se usa polling)
+    webhook_url: str = ""            # URL pública base, p.ej. https://bot.example.com
+    webhook_path: str = "telegram"
+    webhook_listen: str = "0.0.0.0"
+    webhook_port: int = 8443
+    webhook_secret: str = ""         # X-Telegram-Bot-Api-Secret-Token
+    webhook_max_connections: int = 40
+
+    @property
+    def use_webhook(self) -> bool:
+        return bool(self.webhook_url)
 
     @staticmethod
     def from_env() -> "Config":
@@ -15,4 +49,37 @@ class Config:
             raise RuntimeError("Falta BOT_TOKEN en .env")
         poll = int(os.getenv("POLL_SEC", "60"))
         db_path = os.getenv("DB_PATH", "bot.db")
-        return Config(token=token, poll_sec=poll, db_path=db_path)
+        flush_ms = int(os.getenv("DB_FLUSH_MS", "250"))
+        flush_max = int(os.getenv("DB_FLUSH_MAX", "500"))
+        render_procs = int(os.getenv("RENDER_PROCS", str(min(4, os.cpu_count() or 1))))
+        outbox_workers = int(os.getenv("OUTBOX_WORKERS", "4"))
+        render_cache_mb = float(os.getenv("RENDER_CACHE_MB", "32"))
+        image_budget_kb = float(os.getenv("IMAGE_BUDGET_KB", "200"))
+        file_id_cache = int(os.getenv("FILE_ID_CACHE", "4096"))
+        snapshot_ttl = float(os.getenv("SNAPSHOT_TTL", "20"))
+        live_sec = int(os.getenv("ESTADO_LIVE_SEC", "30"))
+        live_idle_min = int(os.getenv("ESTADO_LIVE_IDLE_MIN", "30"))
+        instruments_path = os.getenv("INSTRUMENTS_PATH", "okx_instruments.json")
+        instruments_refresh_min = int(os.getenv("INSTRUMENTS_REFRESH_MIN", "360"))
+        coinlist_path = os.getenv("COINLIST_PATH", "cg_coins.json")
+        coinlist_refresh_h = int(os.getenv("COINLIST_REFRESH_H", "24"))
+        symbol_map_ttl_h = int(os.getenv("SYMBOL_MAP_TTL_H", "168"))
+        symbol_deadline = float(os.getenv("SYMBOL_RESOLVE_DEADLINE", "8"))
+        webhook_url = os.getenv("WEBHOOK_URL", "").strip().rstrip("/")
+        webhook_path = os.getenv("WEBHOOK_PATH", "telegram").strip().strip("/")
+        webhook_listen = os.getenv("WEBHOOK_LISTEN", "0.0.0.0").strip()
+        webhook_port = int(os.getenv("WEBHOOK_PORT", "8443"))
+        webhook_secret = os.getenv("WEBHOOK_SECRET", "").strip()
+        webhook_max_conn = max(1, min(100, int(os.getenv("WEBHOOK_MAX_CONNECTIONS", "40"))))
+        return Config(token=token, poll_sec=poll, db_path=db_path,
+                      db_flush_ms=flush_ms, db_flush_max=flush_max,
+                      render_procs=render_procs, outbox_workers=outbox_workers,
+                      render_cache_mb=render_cache_mb, image_budget_kb=image_budget_kb,
+                      file_id_cache=file_id_cache, snapshot_ttl=snapshot_ttl,
+                      estado_live_sec=live_sec, estado_live_idle_min=live_idle_min,
+                      instruments_path=instruments_path, instruments_refresh_min=instruments_refresh_min,
+                      coinlist_path=coinlist_path, coinlist_refresh_h=coinlist_refresh_h,
+                      symbol_map_ttl_h=symbol_map_ttl_h, symbol_resolve_deadline=symbol_deadline,
+                      webhook_url=webhook_url, webhook_path=webhook_path,
+                      webhook_listen=webhook_listen, webhook_port=webhook_port,
+                      webhook_secret=webhook_secret, webhook_max_connections=webhook_max_conn)
@@ -1,6 +1,7 @@
 # bot/db/models.py
 from __future__ import annotations
 from dataclasses import dataclass
+from typing import Optional, Tuple
 
 @dataclass
 class ChatState:
@@ -14,3 +15,28 @@ class ChatState:
     alerts_on: int = 1
     # 👇 nuevo: preferencia global por chat
     dark_mode: int = 0  # 0=claro, 1=oscuro
+    # posición virtual abierta (espejo de la fila abierta en `positions`)
+    position_entry: Optional[float] = None
+    # header fijado: mensaje que se edita in-place + firma de sus entradas
+    header_msg_id: Optional[int] = None
+    header_sig: Optional[str] = None
+    # estado del heartbeat entre ticks (va por la cola write-behind): máximo desde la entrada
+    # y vela 15m de la última entrada (epoch s, UTC)
+    peak: Optional[float] = None
+    last_entry_bar: Optional[float] = None
+
+
+# (coin_id, symbol_okx) que sigue un chat con alertas activas
+SubKey = Tuple[str, str]
+
+@dataclass
+class SubscriptionChange:
+    """Cambio incremental de suscripción (old/new = None si no tiene alertas activas)."""
+    chat_id: int
+    old: Optional[SubKey]
+    new: Optional[SubKey]
+    state: Optional[ChatState] = None  # estado tras el cambio (ajustes incluidos)
+
+    @property
+    def moved(self) -> bool:
+        return self.old != self.new
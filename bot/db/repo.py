@@ -1,9 +1,21 @@
 # bot/db/repo.py
 from __future__ import annotations
 import asyncio
+import logging
 import sqlite3
-from typing import Optional
-from .models import ChatState
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+from .models import ChatState, SubKey, SubscriptionChange
+
+log = logging.getLogger("repo")
+
+# columnas editables de `chats` (todo lo demás se rechaza).
+# position_entry/position_id NO están: solo los tocan open_position/close_position junto al ledger.
+# header_* y peak/last_entry_bar sí (update_fields/queue_update), pero upsert_chat no las escribe:
+# son del header y del heartbeat.
+_UPSERT_FIELDS = ("coin_id", "symbol_okx", "tp_pct", "sl_pct", "modo", "precision_on", "alerts_on", "dark_mode")
+_CHAT_FIELDS = set(_UPSERT_FIELDS) | {"header_msg_id", "header_sig", "peak", "last_entry_bar"}
 
 # ---------------- base ----------------
 def _connect(db_path: str) -> sqlite3.Connection:
@@ -11,11 +23,17 @@ def _connect(db_path: str) -> sqlite3.Connection:
     con.row_factory = sqlite3.Row
     return con
 
-def setup(db_path: str) -> None:
-    con = _connect(db_path)
-    cur = con.cursor()
-    # tabla base
-    cur.execute(
+# ---------------- migraciones (PRAGMA user_version) ----------------
+def _columns(con: sqlite3.Connection, table: str) -> set:
+    return {r["name"] for r in con.execute(f"PRAGMA table_info({table});")}
+
+def _add_column(con: sqlite3.Connection, table: str, name: str, ddl: str) -> None:
+    # BDs previas al versionado pueden traer ya la columna (migración suave antigua)
+    if name not in _columns(con, table):
+        con.execute(f"ALTER TABLE {table} ADD COLUMN {name} {ddl};")
+
+def _m1_chats(con: sqlite3.Connection) -> None:
+    con.execute(
         """
         CREATE TABLE IF NOT EXISTS chats (
             chat_id      INTEGER PRIMARY KEY,
@@ -29,13 +47,128 @@ def setup(db_path: str) -> None:
         );
         """
     )
-    # migración suave: asegurar dark_mode
+
+def _m2_dark_mode(con: sqlite3.Connection) -> None:
+    _add_column(con, "chats", "dark_mode", "INTEGER NOT NULL DEFAULT 0")
+
+def _m3_positions(con: sqlite3.Connection) -> None:
+    # posición virtual abierta + ledger (hasta v8 la fila se completaba al cerrar; ver _m8)
+    _add_column(con, "chats", "position_entry", "REAL")
+    con.execute(
+        """
+        CREATE TABLE IF NOT EXISTS positions (
+            id          INTEGER PRIMARY KEY AUTOINCREMENT,
+            chat_id     INTEGER NOT NULL,
+            coin_id     TEXT    NOT NULL,
+            symbol      TEXT    NOT NULL,
+            entry_price REAL    NOT NULL,
+            opened_at   REAL    NOT NULL,
+            exit_price  REAL,
+            exit_reason TEXT,
+            pnl_pct     REAL,
+            closed_at   REAL
+        );
+        """
+    )
+    con.execute("CREATE INDEX IF NOT EXISTS idx_positions_chat_opened ON positions(chat_id, opened_at);")
+    con.execute("CREATE INDEX IF NOT EXISTS idx_positions_symbol_opened ON positions(symbol, opened_at);")
+    # a lo sumo UNA posición abierta por chat (y lookup directo)
+    con.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_positions_open ON positions(chat_id) WHERE closed_at IS NULL;")
+
+def _m4_subscriptions(con: sqlite3.Connection) -> None:
+    # suscripciones por símbolo (list_subscriptions)
+    con.execute("CREATE INDEX IF NOT EXISTS idx_chats_alerts_symbol ON chats(alerts_on, symbol_okx, coin_id);")
+
+def _m5_header(con: sqlite3.Connection) -> None:
+    # header fijado por chat: mensaje a editar + firma de las entradas que lo produjeron
+    _add_column(con, "chats", "header_msg_id", "INTEGER")
+    _add_column(con, "chats", "header_sig", "TEXT")
+
+def _m6_symbol_map(con: sqlite3.Connection) -> None:
+    # cg_id → instId OKX resuelto (inst_id NULL = no encontrado; se reintenta antes)
+    con.execute(
+        """
+        CREATE TABLE IF NOT EXISTS symbol_map (
+            cg_id       TEXT PRIMARY KEY,
+            inst_id     TEXT,
+            source      TEXT,
+            resolved_at REAL NOT NULL
+        );
+        """
+    )
+
+def _m7_heartbeat_state(con: sqlite3.Connection) -> None:
+    # estado del heartbeat entre ticks (antes solo en bot_data: se perdía al reiniciar)
+    _add_column(con, "chats", "peak", "REAL")
+    _add_column(con, "chats", "last_entry_bar", "REAL")
+
+def _m8_append_only_ledger(con: sqlite3.Connection) -> None:
+    # ledger append-only: las salidas son filas nuevas en position_exits y `positions` ya no se actualiza.
+    # La posición abierta (una como mucho) es chats.position_id; el índice parcial sobre closed_at
+    # dejaría de valer (closed_at queda NULL en las filas nuevas) y se retira.
+    con.execute(
+        """
+        CREATE TABLE IF NOT EXISTS position_exits (
+            position_id INTEGER PRIMARY KEY REFERENCES positions(id),
+            exit_price  REAL,
+            exit_reason TEXT    NOT NULL,
+            pnl_pct     REAL,
+            closed_at   REAL    NOT NULL
+        );
+        """
+    )
+    con.execute(
+        "INSERT OR IGNORE INTO position_exits (position_id, exit_price, exit_reason, pnl_pct, closed_at) "
+        "SELECT id, exit_price, COALESCE(exit_reason, ''), pnl_pct, closed_at FROM positions WHERE closed_at IS NOT NULL;"
+    )
+    _add_column(con, "chats", "position_id", "INTEGER")
+    con.execute(
+        "UPDATE chats SET position_id=(SELECT p.id FROM positions p "
+        "WHERE p.chat_id=chats.chat_id AND p.closed_at IS NULL);"
+    )
+    con.execute("DROP INDEX IF EXISTS idx_positions_open;")
+
+# (versión, paso). Solo se AÑADEN al final; nunca se editan las ya publicadas.
+MIGRATIONS: List[Tuple[int, Callable[[sqlite3.Connection], None]]] = [
+    (1, _m1_chats),
+    (2, _m2_dark_mode),
+    (3, _m3_positions),
+    (4, _m4_subscriptions),
+    (5, _m5_header),
+    (6, _m6_symbol_map),
+    (7, _m7_heartbeat_state),
+    (8, _m8_append_only_ledger),
+]
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+_MIGRATED: set = set()  # db_paths ya migrados en este proceso
+
+def migrate(db_path: str) -> int:
+    """Aplica (una sola vez) las migraciones pendientes según PRAGMA user_version."""
+    con = _connect(db_path)
+    con.isolation_level = None  # transacciones explícitas (DDL incluido)
     try:
-        cur.execute("ALTER TABLE chats ADD COLUMN dark_mode INTEGER NOT NULL DEFAULT 0;")
-    except sqlite3.OperationalError:
-        pass
-    con.commit()
-    con.close()
+        current = con.execute("PRAGMA user_version;").fetchone()[0]
+        for version, step in MIGRATIONS:
+            if version <= current:
+                continue
+            con.execute("BEGIN IMMEDIATE;")
+            try:
+                step(con)
+                con.execute(f"PRAGMA user_version={version};")
+                con.execute("COMMIT;")
+            except Exception:
+                con.execute("ROLLBACK;")
+                raise
+            log.info("BD %s migrada a v%s (%s)", db_path, version, step.__name__)
+            current = version
+        return current
+    finally:
+        con.close()
+
+def setup(db_path: str) -> None:
+    migrate(db_path)
+    _MIGRATED.add(db_path)
 
 # ---------------- sync internals ----------------
 def _get_chat_sync(db_path: str, chat_id: int) -> Optional[ChatState]:
@@ -44,9 +177,10 @@ def _get_chat_sync(db_path: str, chat_id: int) -> Optional[ChatState]:
     cur.execute("SELECT * FROM chats WHERE chat_id=?", (chat_id,))
     row = cur.fetchone()
     con.close()
-    if not row:
-        return None
-    keys = row.keys()
+    return _row_to_state(row) if row else None
+
+def _row_to_state(row: sqlite3.Row) -> ChatState:
+    # el esquema ya está migrado: columnas fijas, sin sondear row.keys()
     return ChatState(
         chat_id=row["chat_id"],
         coin_id=row["coin_id"],
@@ -56,13 +190,38 @@ def _get_chat_sync(db_path: str, chat_id: int) -> Optional[ChatState]:
         modo=row["modo"],
         precision_on=row["precision_on"],
         alerts_on=row["alerts_on"],
-        dark_mode=(row["dark_mode"] if "dark_mode" in keys else 0),
+        dark_mode=row["dark_mode"],
+        position_entry=row["position_entry"],
+        header_msg_id=row["header_msg_id"],
+        header_sig=row["header_sig"],
+        peak=row["peak"],
+        last_entry_bar=row["last_entry_bar"],
     )
 
-def _upsert_chat_sync(db_path: str, st: ChatState) -> None:
+def _write_sync(db_path: str, chat_ids: Iterable[int], body: Callable, *args, **kwargs):
+    """
+    Ejecuta body(con, ...) en UNA transacción (BEGIN IMMEDIATE). Con `chat_ids`, el estado de esos chats
+    se lee antes y después DENTRO de la misma transacción: ninguna otra escritura cabe entre medias.
+    Devuelve (resultado, antes, después); antes/después = None sin chat_ids.
+    """
+    ids = list(chat_ids)
     con = _connect(db_path)
-    cur = con.cursor()
-    cur.execute(
+    try:
+        con.execute("BEGIN IMMEDIATE;")
+        try:
+            before = _states_con(con, ids) if ids else None
+            out = body(con, *args, **kwargs)
+            after = _states_con(con, ids) if ids else None
+            con.commit()
+        except Exception:
+            con.rollback()
+            raise
+        return out, before, after
+    finally:
+        con.close()
+
+def _upsert_chat_tx(con: sqlite3.Connection, st: ChatState) -> None:
+    con.execute(
         """
         INSERT INTO chats (chat_id, coin_id, symbol_okx, tp_pct, sl_pct, modo, precision_on, alerts_on, dark_mode)
         VALUES (:chat_id, :coin_id, :symbol_okx, :tp_pct, :sl_pct, :modo, :precision_on, :alerts_on, :dark_mode)
@@ -76,66 +235,548 @@ def _upsert_chat_sync(db_path: str, st: ChatState) -> None:
             alerts_on=excluded.alerts_on,
             dark_mode=excluded.dark_mode;
         """,
-        {
-            "chat_id": st.chat_id,
-            "coin_id": st.coin_id,
-            "symbol_okx": st.symbol_okx,
-            "tp_pct": st.tp_pct,
-            "sl_pct": st.sl_pct,
-            "modo": st.modo,
-            "precision_on": st.precision_on,
-            "alerts_on": st.alerts_on,
-            "dark_mode": st.dark_mode,
-        },
+        {k: getattr(st, k) for k in ("chat_id",) + _UPSERT_FIELDS},
     )
-    con.commit()
-    con.close()
 
-def _update_fields_sync(db_path: str, chat_id: int, **fields) -> None:
-    allowed = {"coin_id", "symbol_okx", "tp_pct", "sl_pct", "modo", "precision_on", "alerts_on", "dark_mode"}
-    unknown = set(fields) - allowed
+def _upsert_chat_sync(db_path: str, st: ChatState) -> None:
+    _write_sync(db_path, (), _upsert_chat_tx, st)
+
+def _check_fields(fields: Dict[str, Any]) -> Dict[str, Any]:
+    unknown = set(fields) - _CHAT_FIELDS
     if unknown:
         names = ", ".join(sorted(unknown))
         raise ValueError(f"Unknown field(s): {names}")
+    return dict(fields)
 
-    payload = {k: v for k, v in fields.items() if k in allowed}
+def _update_fields_tx(con: sqlite3.Connection, chat_id: int, **fields) -> None:
+    payload = _check_fields(fields)
     if not payload:
         # Nothing to update – return early without touching the database.
         return
 
-    # asegurar existencia
-    st = _get_chat_sync(db_path, chat_id)
-    if not st:
-        st = ChatState(chat_id=chat_id)
-        for k, v in payload.items():
-            setattr(st, k, v)
-        _upsert_chat_sync(db_path, st)
-        return
-
+    # asegurar existencia (defaults del esquema) y luego UPDATE: así también aplican columnas que upsert no escribe
+    con.execute("INSERT OR IGNORE INTO chats (chat_id) VALUES (?);", (chat_id,))
     sets = ", ".join([f"{k}=:{k}" for k in payload.keys()])
     payload["chat_id"] = chat_id
+    con.execute(f"UPDATE chats SET {sets} WHERE chat_id=:chat_id;", payload)
 
+def _update_fields_sync(db_path: str, chat_id: int, **fields) -> None:
+    _write_sync(db_path, (), _update_fields_tx, chat_id, **fields)
+
+def _states_con(con: sqlite3.Connection, chat_ids: List[int]) -> Dict[int, ChatState]:
+    marks = ", ".join("?" * len(chat_ids))
+    rows = con.execute(f"SELECT * FROM chats WHERE chat_id IN ({marks});", chat_ids).fetchall()
+    return {r["chat_id"]: _row_to_state(r) for r in rows}
+
+def _states_sync(db_path: str, chat_ids: Iterable[int]) -> Dict[int, ChatState]:
+    ids = list(chat_ids)
+    if not ids:
+        return {}
     con = _connect(db_path)
-    cur = con.cursor()
-    cur.execute(f"UPDATE chats SET {sets} WHERE chat_id=:chat_id;", payload)
-    con.commit()
-    con.close()
+    try:
+        return _states_con(con, ids)
+    finally:
+        con.close()
+
+
+# ---------------- cg_id → instId ----------------
+def _get_symbol_map_sync(db_path: str, cg_id: str) -> Optional[Dict[str, Any]]:
+    con = _connect(db_path)
+    try:
+        row = con.execute("SELECT * FROM symbol_map WHERE cg_id=?;", (cg_id,)).fetchone()
+    finally:
+        con.close()
+    return dict(row) if row else None
+
+def _put_symbol_map_sync(db_path: str, cg_id: str, inst_id: Optional[str], source: Optional[str]) -> None:
+    con = _connect(db_path)
+    try:
+        con.execute(
+            "INSERT INTO symbol_map (cg_id, inst_id, source, resolved_at) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(cg_id) DO UPDATE SET inst_id=excluded.inst_id, source=excluded.source, "
+            "resolved_at=excluded.resolved_at;",
+            (cg_id, inst_id, source, time.time()),
+        )
+        con.commit()
+    finally:
+        con.close()
+
+
+# ---------------- suscripciones por símbolo ----------------
+def _sub_key(st: Optional[ChatState]) -> Optional[SubKey]:
+    if st is None or not st.alerts_on:
+        return None
+    return (st.coin_id, st.symbol_okx)
+
+def _list_subscriptions_sync(db_path: str, symbol_okx: Optional[str] = None) -> Dict[SubKey, List[ChatState]]:
+    """Chats con alertas activas agrupados por (coin_id, symbol_okx), en una sola consulta indexada."""
+    sql = "SELECT * FROM chats WHERE alerts_on=1"
+    args: list = []
+    if symbol_okx is not None:
+        sql += " AND symbol_okx=?"
+        args.append(symbol_okx)
+    sql += " ORDER BY symbol_okx, coin_id;"
+    con = _connect(db_path)
+    try:
+        rows = con.execute(sql, args).fetchall()
+    finally:
+        con.close()
+    groups: Dict[SubKey, List[ChatState]] = {}
+    for r in rows:
+        st = _row_to_state(r)
+        groups.setdefault((st.coin_id, st.symbol_okx), []).append(st)
+    return groups
+
+def _list_symbols_sync(db_path: str) -> List[str]:
+    con = _connect(db_path)
+    try:
+        rows = con.execute("SELECT DISTINCT symbol_okx FROM chats WHERE symbol_okx IS NOT NULL AND symbol_okx != '';").fetchall()
+    finally:
+        con.close()
+    return [r[0] for r in rows]
+
+_LISTENERS: List[Callable[[SubscriptionChange], None]] = []
+
+def add_subscription_listener(fn: Callable[[SubscriptionChange], None]) -> None:
+    """Registra un callback que recibe cada SubscriptionChange tras escribir en `chats`."""
+    if fn not in _LISTENERS:
+        _LISTENERS.append(fn)
+
+def remove_subscription_listener(fn: Callable[[SubscriptionChange], None]) -> None:
+    if fn in _LISTENERS:
+        _LISTENERS.remove(fn)
+
+def _sub_view(st: Optional[ChatState]) -> Optional[tuple]:
+    """Lo que ve un suscriptor: clave + ajustes. Posición, header y estado del heartbeat no cuentan."""
+    if _sub_key(st) is None:
+        return None
+    return tuple(getattr(st, k) for k in _UPSERT_FIELDS)
+
+def _emit_changes(before: Dict[int, ChatState], after: Dict[int, ChatState], chat_ids: Iterable[int]) -> None:
+    for chat_id in chat_ids:
+        old, new = before.get(chat_id), after.get(chat_id)
+        if _sub_view(old) == _sub_view(new):
+            continue
+        ch = SubscriptionChange(chat_id=chat_id, old=_sub_key(old), new=_sub_key(new), state=new)
+        for fn in list(_LISTENERS):
+            try:
+                fn(ch)
+            except Exception as e:
+                log.warning("subscription listener error: %s", e)
+
+async def _tracked(db_path: str, chat_id: int, keys, body: Callable, *args, **kwargs):
+    """
+    Escritura directa de `chat_id` (body(con, ...) en hilo; reemplaza `keys` en cola). Si hay listeners,
+    el antes/después sale de la misma transacción y se notifica si cambia lo que ven los suscriptores.
+    """
+    track = [chat_id] if _LISTENERS else []
+    out, before, after = await asyncio.to_thread(_direct_sync, db_path, chat_id, keys,
+                                                 _write_sync, db_path, track, body, *args, **kwargs)
+    if track:
+        _emit_changes(before, after, track)
+    return out
+
+
+class SubscriptionIndex:
+    """
+    Índice en memoria (coin_id, symbol_okx) -> {chat_id: ChatState} de chats con alertas.
+    Se carga una vez y se mantiene con los SubscriptionChange (sin re-escanear la tabla).
+    """
+
+    def __init__(self) -> None:
+        self.groups: Dict[SubKey, Dict[int, ChatState]] = {}
+        self._where: Dict[int, SubKey] = {}
+
+    @classmethod
+    async def load(cls, db_path: str, listen: bool = True) -> "SubscriptionIndex":
+        idx = cls()
+        if listen:
+            add_subscription_listener(idx.apply)
+        for key, chats in (await list_subscriptions(db_path)).items():
+            for st in chats:
+                idx.groups.setdefault(key, {})[st.chat_id] = st
+                idx._where[st.chat_id] = key
+        return idx
+
+    def apply(self, ch: SubscriptionChange) -> None:
+        old = self._where.pop(ch.chat_id, None)
+        if old is not None:
+            grp = self.groups.get(old, {})
+            grp.pop(ch.chat_id, None)
+            if not grp:
+                self.groups.pop(old, None)
+        if ch.new is not None and ch.state is not None:
+            self.groups.setdefault(ch.new, {})[ch.chat_id] = ch.state
+            self._where[ch.chat_id] = ch.new
+
+    def chats_for(self, key: SubKey) -> List[ChatState]:
+        return list(self.groups.get(key, {}).values())
+
+    def keys(self) -> List[SubKey]:
+        return list(self.groups)
+
+    def close(self) -> None:
+        remove_subscription_listener(self.apply)
+
+
+# ---------------- ledger de posiciones ----------------
+# Append-only: una fila en `positions` por entrada y otra en `position_exits` por salida; nada se
+# actualiza. Las columnas exit_*/pnl_pct/closed_at de `positions` son de antes de v8 (ya copiadas).
+_LEDGER_SELECT = (
+    "SELECT p.id, p.chat_id, p.coin_id, p.symbol, p.entry_price, p.opened_at, "
+    "x.exit_price, x.exit_reason, x.pnl_pct, x.closed_at "
+    "FROM positions p LEFT JOIN position_exits x ON x.position_id=p.id"
+)
+
+def _open_row(con: sqlite3.Connection, chat_id: int) -> Optional[sqlite3.Row]:
+    # O(1): chats (PK) → positions (PK)
+    return con.execute(
+        "SELECT p.* FROM chats c JOIN positions p ON p.id=c.position_id WHERE c.chat_id=?;", (chat_id,)
+    ).fetchone()
+
+def _get_open_position_sync(db_path: str, chat_id: int) -> Optional[Dict[str, Any]]:
+    con = _connect(db_path)
+    try:
+        row = _open_row(con, chat_id)
+    finally:
+        con.close()
+    return dict(row) if row else None
+
+def _open_position_tx(con: sqlite3.Connection, chat_id: int, coin_id: str, symbol: str, price: float,
+                      opened_at: Optional[float] = None) -> int:
+    """
+    Abre posición (si ya hay una abierta, la devuelve tal cual). Devuelve el id.
+    Una abierta por chat: chats.position_id solo tiene un hueco y se escribe bajo BEGIN IMMEDIATE.
+    """
+    ts = time.time() if opened_at is None else float(opened_at)
+    row = _open_row(con, chat_id)
+    if row:
+        return int(row["id"])
+    cur = con.execute(
+        "INSERT INTO positions (chat_id, coin_id, symbol, entry_price, opened_at) VALUES (?, ?, ?, ?, ?);",
+        (chat_id, coin_id, symbol, float(price), ts),
+    )
+    con.execute("INSERT OR IGNORE INTO chats (chat_id) VALUES (?);", (chat_id,))
+    con.execute("UPDATE chats SET position_id=?, position_entry=? WHERE chat_id=?;",
+                (cur.lastrowid, float(price), chat_id))
+    return int(cur.lastrowid)
+
+def _close_position_tx(con: sqlite3.Connection, chat_id: int, price: Optional[float], reason: str,
+                       closed_at: Optional[float] = None) -> Optional[Dict[str, Any]]:
+    """Cierra la posición abierta (tp/sl/trailing/reset) añadiendo su salida. Devuelve la operación o None."""
+    ts = time.time() if closed_at is None else float(closed_at)
+    row = _open_row(con, chat_id)
+    con.execute("UPDATE chats SET position_id=NULL, position_entry=NULL WHERE chat_id=?;", (chat_id,))
+    if not row:
+        return None
+    entry = float(row["entry_price"])
+    pnl = None if price is None else (float(price) - entry) / max(entry, 1e-12) * 100.0
+    con.execute(
+        "INSERT INTO position_exits (position_id, exit_price, exit_reason, pnl_pct, closed_at) VALUES (?, ?, ?, ?, ?);",
+        (row["id"], None if price is None else float(price), reason, pnl, ts),
+    )
+    out = dict(row)
+    out.update(exit_price=price, exit_reason=reason, pnl_pct=pnl, closed_at=ts)
+    return out
+
+def _positions_where(chat_id: Optional[int], symbol: Optional[str], since: Optional[float]):
+    conds, args = [], []
+    if chat_id is not None:
+        conds.append("p.chat_id=?"); args.append(chat_id)
+    if symbol is not None:
+        conds.append("p.symbol=?"); args.append(symbol)
+    if since is not None:
+        conds.append("p.opened_at>=?"); args.append(float(since))
+    return (" WHERE " + " AND ".join(conds)) if conds else "", args
+
+def _list_positions_sync(db_path: str, chat_id: Optional[int] = None, symbol: Optional[str] = None,
+                         since: Optional[float] = None, limit: int = 100) -> List[Dict[str, Any]]:
+    where, args = _positions_where(chat_id, symbol, since)
+    con = _connect(db_path)
+    try:
+        rows = con.execute(f"{_LEDGER_SELECT}{where} ORDER BY p.opened_at DESC LIMIT ?;", (*args, int(limit))).fetchall()
+    finally:
+        con.close()
+    return [dict(r) for r in rows]
+
+def _position_stats_sync(db_path: str, chat_id: Optional[int] = None, symbol: Optional[str] = None,
+                         since: Optional[float] = None) -> Dict[str, Any]:
+    where, args = _positions_where(chat_id, symbol, since)
+    where += (" AND " if where else " WHERE ") + "x.pnl_pct IS NOT NULL"
+    con = _connect(db_path)
+    try:
+        row = con.execute(
+            f"""
+            SELECT COUNT(*) AS trades,
+                   COALESCE(SUM(x.pnl_pct > 0), 0) AS wins,
+                   AVG(x.pnl_pct) AS avg_pnl_pct,
+                   COALESCE(SUM(x.pnl_pct), 0.0) AS total_pnl_pct,
+                   MIN(x.pnl_pct) AS worst_pnl_pct,
+                   MAX(x.pnl_pct) AS best_pnl_pct
+            FROM positions p JOIN position_exits x ON x.position_id=p.id{where};
+            """,
+            args,
+        ).fetchone()
+    finally:
+        con.close()
+    out = dict(row)
+    out["win_rate"] = (out["wins"] / out["trades"]) if out["trades"] else 0.0
+    return out
+
+
+def _apply_batch_tx(con: sqlite3.Connection, batch: Dict[int, Dict[str, Any]]) -> None:
+    # agrupar por conjunto de columnas para usar executemany
+    groups: Dict[tuple, list] = {}
+    for chat_id, fields in batch.items():
+        cols = tuple(sorted(fields))
+        groups.setdefault(cols, []).append({**fields, "chat_id": chat_id})
+    con.executemany("INSERT OR IGNORE INTO chats (chat_id) VALUES (?);", [(cid,) for cid in batch])
+    for cols, rows in groups.items():
+        sets = ", ".join(f"{k}=:{k}" for k in cols)
+        con.executemany(f"UPDATE chats SET {sets} WHERE chat_id=:chat_id;", rows)
+
+def _apply_batch_sync(db_path: str, batch: Dict[int, Dict[str, Any]], track: bool = False):
+    """
+    Aplica {chat_id: campos} en UNA transacción (crea filas faltantes con defaults).
+    Con `track`, devuelve (antes, después) de esos chats leídos en esa misma transacción.
+    """
+    if not batch:
+        return None
+    _, before, after = _write_sync(db_path, list(batch) if track else (), _apply_batch_tx, batch)
+    return (before, after) if track else None
+
+
+# ---------------- write-behind ----------------
+class WriteBehind:
+    """
+    Cola write-behind para updates frecuentes de `chats` que no necesitan durabilidad inmediata:
+    el estado por tick del heartbeat (peak/last_entry_bar) y header_msg_id/header_sig del header.
+    Entradas y salidas NO pasan por aquí: van directas al ledger (positions + chats.position_entry).
+    - Coalesce: varios updates del mismo chat se fusionan (gana el último valor).
+    - Vuelca en UNA transacción cada `flush_ms` o al acumular `max_pending` escrituras.
+    - `stop()` hace el flush final (durabilidad al apagar).
+    - Las escrituras directas (`direct`) se serializan con el flush: nunca las pisa un lote más viejo.
+    """
+
+    def __init__(self, db_path: str, flush_ms: int = 250, max_pending: int = 500):
+        self.db_path = db_path
+        self.flush_ms = max(1, int(flush_ms))
+        self.max_pending = max(1, int(max_pending))
+        self._pending: Dict[int, Dict[str, Any]] = {}
+        self._inflight: Dict[int, Dict[str, Any]] = {}  # lote que se está escribiendo (sigue visible)
+        self._since_flush = 0
+        self._lock = threading.Lock()
+        self._io = threading.Lock()  # flush ↔ escrituras directas
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    # --- cola ---
+    def queue(self, chat_id: int, **fields) -> None:
+        payload = _check_fields(fields)
+        if not payload:
+            return
+        with self._lock:
+            self._pending.setdefault(chat_id, {}).update(payload)
+            self._since_flush += 1
+            full = self._since_flush >= self.max_pending
+        if full and self._wake is not None:
+            self._wake.set()
+
+    def pending_for(self, chat_id: int) -> Dict[str, Any]:
+        with self._lock:
+            out = dict(self._inflight.get(chat_id, {}))
+            out.update(self._pending.get(chat_id, {}))
+            return out
+
+    def discard(self, chat_id: int, keys=None) -> None:
+        """Olvida campos pendientes (una escritura directa más nueva los reemplaza)."""
+        with self._lock:
+            cur = self._pending.get(chat_id)
+            if cur is None:
+                return
+            for k in (list(cur) if keys is None else keys):
+                cur.pop(k, None)
+            if not cur:
+                self._pending.pop(chat_id, None)
+
+    def direct(self, chat_id: int, keys, fn: Callable, *args, **kwargs):
+        """
+        Escritura directa (hilo): espera a que termine el flush en curso, olvida `keys` de la cola
+        y escribe. Así gana siempre frente a valores encolados antes.
+        """
+        with self._io:
+            self.discard(chat_id, keys)
+            return fn(*args, **kwargs)
+
+    # --- flush ---
+    def flush_sync(self) -> int:
+        return self._flush_sync(track=False)[0]
+
+    def _flush_sync(self, track: bool):
+        with self._io:
+            return self._flush_locked(track)
+
+    def _flush_locked(self, track: bool):
+        with self._lock:
+            batch, self._pending = self._pending, {}
+            # hasta que el COMMIT termine, get_chat debe seguir viendo el lote (ni BD ni cola lo tienen aún)
+            self._inflight = {chat_id: dict(fields) for chat_id, fields in batch.items()}
+            self._since_flush = 0
+        if not batch:
+            return 0, None
+        try:
+            states = _apply_batch_sync(self.db_path, batch, track)
+        except Exception:
+            # re-encolar sin pisar valores más nuevos
+            with self._lock:
+                for chat_id, fields in batch.items():
+                    cur = self._pending.setdefault(chat_id, {})
+                    for k, v in fields.items():
+                        cur.setdefault(k, v)
+            raise
+        finally:
+            with self._lock:
+                self._inflight = {}
+        diff = (*states, list(batch)) if track else None
+        return len(batch), diff
+
+    async def flush(self) -> int:
+        n, diff = await asyncio.to_thread(self._flush_sync, bool(_LISTENERS))
+        if diff:
+            _emit_changes(*diff)
+        return n
+
+    # --- ciclo de vida ---
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self) -> None:
+        if self.running:
+            return
+        self._wake = asyncio.Event()
+        self._task = asyncio.get_running_loop().create_task(self._run(), name=f"write-behind:{self.db_path}")
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.flush_ms / 1000.0)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                log.warning("write-behind flush error (%s): %s", self.db_path, e)
+
+    async def stop(self) -> None:
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        await self.flush()
+
+
+_WRITERS: Dict[str, WriteBehind] = {}  # db_path -> cola
+
+def get_writer(db_path: str, flush_ms: int = 250, max_pending: int = 500) -> WriteBehind:
+    w = _WRITERS.get(db_path)
+    if w is None:
+        w = _WRITERS[db_path] = WriteBehind(db_path, flush_ms=flush_ms, max_pending=max_pending)
+    return w
+
+def _direct_sync(db_path: str, chat_id: int, keys, fn: Callable, *args, **kwargs):
+    """Ejecuta una escritura directa de `chat_id` que reemplaza los `keys` en cola (None = todos)."""
+    w = _WRITERS.get(db_path)
+    if w is None:
+        return fn(*args, **kwargs)
+    return w.direct(chat_id, keys, fn, *args, **kwargs)
 
 # ---------------- async wrappers (compat) ----------------
 async def ensure_schema(db_path: str) -> None:
-    """Wrapper async para main.py."""
-    # Es rápido; no hace falta to_thread, pero si quieres:
-    # await asyncio.to_thread(setup, db_path)
-    setup(db_path)
+    """Wrapper async para main.py (arranque). Migra una vez por proceso; luego es no-op."""
+    if db_path in _MIGRATED:
+        return
+    await asyncio.to_thread(setup, db_path)
 
 async def get_chat(db_path: str, chat_id: int) -> Optional[ChatState]:
-    """Compat: tus handlers usan `await repo.get_chat(...)`."""
-    return await asyncio.to_thread(_get_chat_sync, db_path, chat_id)
+    """Compat: tus handlers usan `await repo.get_chat(...)`. Incluye escrituras aún en cola."""
+    # la cola se lee ANTES que la BD: si un flush termina entre medias, la BD ya lo incluye
+    w = _WRITERS.get(db_path)
+    pending = w.pending_for(chat_id) if w is not None else {}
+    st = await asyncio.to_thread(_get_chat_sync, db_path, chat_id)
+    if pending:
+        st = st or ChatState(chat_id=chat_id)
+        for k, v in pending.items():
+            setattr(st, k, v)
+    return st
 
 async def upsert_chat(db_path: str, st: ChatState) -> None:
     """Compat: tus handlers usan `await repo.upsert_chat(...)`."""
-    await asyncio.to_thread(_upsert_chat_sync, db_path, st)
+    # solo reemplaza en la cola lo que escribe: header_* encolados por el header siguen pendientes
+    await _tracked(db_path, st.chat_id, _UPSERT_FIELDS, _upsert_chat_tx, st)
 
 async def update_fields(db_path: str, chat_id: int, **fields) -> None:
     """Compat: p.ej. /modo llama a repo.update_fields con await."""
-    await asyncio.to_thread(_update_fields_sync, db_path, chat_id, **fields)
+    await _tracked(db_path, chat_id, list(fields), _update_fields_tx, chat_id, **fields)
+
+async def get_open_position(db_path: str, chat_id: int) -> Optional[Dict[str, Any]]:
+    return await asyncio.to_thread(_get_open_position_sync, db_path, chat_id)
+
+async def open_position(db_path: str, chat_id: int, coin_id: str, symbol: str, price: float,
+                        opened_at: Optional[float] = None) -> int:
+    """Registra ENTRADA (virtual) en el ledger y deja chats.position_entry sincronizado."""
+    return await _tracked(db_path, chat_id, (), _open_position_tx, chat_id, coin_id, symbol, price, opened_at)
+
+async def close_position(db_path: str, chat_id: int, price: Optional[float], reason: str,
+                         closed_at: Optional[float] = None) -> Optional[Dict[str, Any]]:
+    """Registra SALIDA (tp/sl/trailing/reset) y limpia chats.position_entry."""
+    return await _tracked(db_path, chat_id, (), _close_position_tx, chat_id, price, reason, closed_at)
+
+async def list_positions(db_path: str, chat_id: Optional[int] = None, symbol: Optional[str] = None,
+                         since: Optional[float] = None, limit: int = 100) -> List[Dict[str, Any]]:
+    return await asyncio.to_thread(_list_positions_sync, db_path, chat_id, symbol, since, limit)
+
+async def position_stats(db_path: str, chat_id: Optional[int] = None, symbol: Optional[str] = None,
+                         since: Optional[float] = None) -> Dict[str, Any]:
+    return await asyncio.to_thread(_position_stats_sync, db_path, chat_id, symbol, since)
+
+async def list_subscriptions(db_path: str, symbol_okx: Optional[str] = None) -> Dict[SubKey, List[ChatState]]:
+    """{(coin_id, symbol_okx): [ChatState, ...]} de todos los chats con alertas activas."""
+    return await asyncio.to_thread(_list_subscriptions_sync, db_path, symbol_okx)
+
+async def get_symbol_map(db_path: str, cg_id: str) -> Optional[Dict[str, Any]]:
+    """{cg_id, inst_id, source, resolved_at} o None. inst_id None = resolución fallida guardada."""
+    return await asyncio.to_thread(_get_symbol_map_sync, db_path, cg_id)
+
+async def put_symbol_map(db_path: str, cg_id: str, inst_id: Optional[str], source: Optional[str] = None) -> None:
+    await asyncio.to_thread(_put_symbol_map_sync, db_path, cg_id, inst_id, source)
+
+async def list_symbols(db_path: str) -> List[str]:
+    """Símbolos OKX configurados en algún chat (para precargar su tickSz)."""
+    return await asyncio.to_thread(_list_symbols_sync, db_path)
+
+async def queue_update(db_path: str, chat_id: int, **fields) -> None:
+    """Como update_fields pero diferido/coalescido (p.ej. el header). No espera a SQLite."""
+    w = get_writer(db_path)
+    w.queue(chat_id, **fields)
+    if not w.running:
+        w.start()
+
+async def start_writer(db_path: str, flush_ms: int = 250, max_pending: int = 500) -> WriteBehind:
+    """Arranca la cola write-behind de `db_path` (post_init)."""
+    w = get_writer(db_path, flush_ms=flush_ms, max_pending=max_pending)
+    w.flush_ms, w.max_pending = max(1, int(flush_ms)), max(1, int(max_pending))
+    w.start()
+    return w
+
+async def close_writers() -> None:
+    """Flush final de todas las colas (post_shutdown)."""
+    for w in list(_WRITERS.values()):
+        try:
+            await w.stop()
+        except Exception as e:
+            log.warning("write-behind flush final error (%s): %s", w.db_path, e)
@@ -1,9 +1,10 @@
 from __future__ import annotations
-import asyncio
 from telegram import Update
 from telegram.constants import ParseMode
 from telegram.ext import ContextTypes
 
+from ...services import bulk_delete
+
 async def clearbot_cmd(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
     chat = update.effective_chat
     msg = update.message
@@ -21,15 +22,7 @@ async def clearbot_cmd(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
         n = 50
 
     last_id = msg.message_id
-    deleted, tried = 0, 0
-    for mid in range(last_id - 1, max(last_id - n - 1, 1), -1):
-        tried += 1
-        try:
-            await ctx.bot.delete_message(chat.id, mid)
-            deleted += 1
-        except Exception:
-            pass
-        if tried % 25 == 0:
-            await asyncio.sleep(0.08)
+    # ≤ 5 lotes de deleteMessages: cabe en el propio handler
+    res = await bulk_delete.delete_ids(ctx.bot, chat.id, range(last_id - 1, max(last_id - n - 1, 1), -1))
 
-    await msg.reply_text(f"🧽 ClearBot: eliminados {deleted} mensajes del bot (intentados {tried}).")
+    await msg.reply_text(f"🧽 ClearBot: procesados {res.processed} de {res.requested} ids (los que no existen se omiten).")
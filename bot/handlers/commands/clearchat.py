@@ -1,9 +1,9 @@
 from __future__ import annotations
-import asyncio
 from telegram import Update
-from telegram.constants import ParseMode
 from telegram.ext import ContextTypes
 
+from ...services import bulk_delete
+
 async def clearchat_cmd(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
     chat = update.effective_chat
     msg = update.message
@@ -21,28 +21,23 @@ async def clearchat_cmd(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
         except Exception:
             limit = 1000
 
+    runtime = ctx.application.bot_data.setdefault("runtime", {})
+    if not bulk_delete.begin(runtime, chat.id):
+        await msg.reply_text("Ya hay una limpieza en curso en este chat.")
+        return
+
     last_id = msg.message_id
-    deleted = tried = 0
+    ids = range(last_id, max(last_id - limit, 1), -1)
 
-    for mid in range(last_id, max(last_id - limit, 1), -1):
-        tried += 1
-        try:
-            await ctx.bot.delete_message(chat.id, mid)
-            deleted += 1
-        except Exception:
-            pass
-        if tried % 25 == 0:
-            await asyncio.sleep(0.08)
-
-    note = (
-        "🧹 <b>ClearChat (privado)</b>\n"
-        f"Intentados: <code>{tried}</code> · Eliminados: <code>{deleted}</code>\n"
-        "<i>Nota:</i> Telegram no permite a los bots borrar <b>tus</b> mensajes en chats privados.\n"
-        "Para limpiar <b>todo</b>, usa “Vaciar chat / Clear history”."
+    def summary(res: bulk_delete.DeleteResult) -> str:
+        return (
+            f"🧹 <b>ClearChat (privado)</b>{' — cancelado' if res.cancelled else ''}\n"
+            f"Intentados: <code>{res.requested}</code> · Procesados: <code>{res.processed}</code>\n"
+            "<i>Nota:</i> Telegram no permite a los bots borrar <b>tus</b> mensajes en chats privados.\n"
+            "Para limpiar <b>todo</b>, usa “Vaciar chat / Clear history”."
+        )
+
+    ctx.application.create_task(
+        bulk_delete.run_with_status(ctx.application, chat.id, ids, "🧹 <b>ClearChat</b>", summary, autodelete=3),
+        update=update,
     )
-    m = await ctx.bot.send_message(chat.id, note, parse_mode=ParseMode.HTML)
-    try:
-        await asyncio.sleep(3)
-        await ctx.bot.delete_message(chat.id, m.message_id)
-    except Exception:
-        pass
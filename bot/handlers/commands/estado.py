@@ -2,7 +2,9 @@
 from __future__ import annotations
 import os
 import io
+import time
 import asyncio
+from functools import lru_cache
 from typing import Optional, Tuple, List
 
 import pandas as pd
@@ -10,11 +12,7 @@ import pytz
 from tzlocal import get_localzone
 from PIL import Image, ImageDraw, ImageFont, ImageFilter
 
-from telegram import (
-    Update, InputFile,
-    InlineKeyboardMarkup, InlineKeyboardButton,
-    InputMediaPhoto, InputMediaDocument,
-)
+from telegram import Update, InlineKeyboardMarkup, InlineKeyboardButton
 from telegram.ext import ContextTypes
 from telegram.constants import ParseMode
 from telegram.error import BadRequest
@@ -25,7 +23,7 @@ from ...db.models import ChatState
 from ..jobs import get_4h_context, get_15m_oper, get_5m_execution
 from ...services.formatting import fmt_price
 from ...services.levels import get_levels
-from ...services.indicators import rsi as rsi_func, macd as macd_func
+from ...services import encoding, file_ids, render_cache, signals, snapshots
 
 
 # ============== helpers numéricos/texto ==============
@@ -55,6 +53,7 @@ def _wrap_text(draw: ImageDraw.ImageDraw, text: str, font: ImageFont.ImageFont,
 
 
 # ============== helpers de dibujo/IO ==============
+@lru_cache(maxsize=32)
 def _load_font(size: int) -> ImageFont.FreeTypeFont | ImageFont.ImageFont:
     preferred = [
         "C:/Windows/Fonts/arial.ttf",
@@ -121,51 +120,56 @@ def _badge(draw: ImageDraw.ImageDraw, xy: Tuple[int,int,int,int], text: str, bg:
     x0, y0, x1, y1 = xy
     draw.text((x0 + (x1-x0 - tw)//2, y0 + (y1-y0 - th)//2), text, font=font, fill=fg)
 
-def _fresh_inputfile(buf: io.BytesIO, filename: str) -> InputFile:
-    """Crea un InputFile con buffer nuevo desde el contenido actual (evita 'File must be non-empty')."""
-    data = buf.getvalue()
-    return InputFile(io.BytesIO(data), filename=filename)
+# Geometría fija de la tarjeta (igual en todos los renders)
+_W, _H = 1280, 800
+_M, _R = 32, 24
+_OUTER = (_M, _M, _W - _M, _H - _M)
+_INNER = (_M + 14, _M + 14, _W - _M - 14, _H - _M - 14)
+_PAD = 28
+_PANEL_H, _REASONS_H, _BOTTOM_PAD = 130, 120, 28
+_SPARK_LEFT = int(_INNER[0] + (_INNER[2] - _INNER[0]) * 0.60)
+_SPARK_TOP = _INNER[1] + _PAD + 115
+_SPARK_RECT = (_SPARK_LEFT, _SPARK_TOP, _INNER[2] - _PAD,
+               max(_SPARK_TOP + 120, _INNER[3] - (_PANEL_H + _REASONS_H + _BOTTOM_PAD + 18)))
+
+@lru_cache(maxsize=16)
+def _static_layer(bg, panel, frame, sp_bg, sp_border) -> Image.Image:
+    """
+    Capa estática: fondo, sombra (blur a lienzo completo), marco, panel interior y caja
+    de la sparkline. Se pinta una vez por tema/color de tendencia; cada render la copia.
+    """
+    img = Image.new("RGBA", (_W, _H), (*bg, 255))
+    _drop_shadow(img, _OUTER, radius=_R, offset=(8, 10), alpha=100)
+    draw = ImageDraw.Draw(img, "RGBA")
+    _draw_rounded_rect(draw, _OUTER, radius=_R, fill=None, outline=frame, width=12)
+    _draw_rounded_rect(draw, _INNER, radius=_R - 8, fill=panel, outline=None, width=0)
+    _draw_rounded_rect(draw, _SPARK_RECT, radius=14, fill=sp_bg, outline=sp_border, width=2)
+    return img
 
+@lru_cache(maxsize=1)
+def _spark_mask() -> Image.Image:
+    """Máscara de la caja de la sparkline (para re-aplicarla sobre texto que la invada)."""
+    x0, y0, x1, y1 = _SPARK_RECT
+    m = Image.new("L", (x1 - x0 + 1, y1 - y0 + 1), 0)
+    _draw_rounded_rect(ImageDraw.Draw(m), (0, 0, x1 - x0, y1 - y0), radius=14, fill=255, outline=255, width=2)
+    return m
+
+async def _send_estado(bot, chat_id: int, buf: io.BytesIO, filename: str, caption: str, as_document: bool,
+                       live: bool = False):
+    """Envía el panel con botones; file_ids sube un buffer nuevo cada vez (evita 'File must be non-empty')."""
+    if as_document:
+        return await file_ids.send_document(
+            bot, chat_id, buf, filename,
+            caption=caption, parse_mode=ParseMode.HTML, reply_markup=_kb_estado(live),
+            disable_content_type_detection=True,
+        )
+    return await file_ids.send_photo(
+        bot, chat_id, buf, filename,
+        caption=caption, parse_mode=ParseMode.HTML, reply_markup=_kb_estado(live),
+    )
 
-# ============== lógica de señal ==============
-def _strong_signal(
-    trend_up: bool, trend_down: bool,
-    rsi15: float, rsi5: float,
-    macd15u: bool, macd5u: bool, macd_hist_up: bool,
-    price: float, ema20: float, ema50: float, ema200: float,
-    f618: Optional[float],
-) -> Optional[str]:
-    """Detección estricta de STRONG BUY / STRONG SELL."""
-    if (trend_up and macd15u and macd5u and macd_hist_up and price > ema20 > ema50 > ema200
-        and rsi15 >= 55 and rsi5 >= 50 and (f618 is None or price >= f618 * 1.0005)):
-        return "STRONG BUY"
-    if (trend_down and (not macd15u) and (not macd5u) and (not macd_hist_up) and price < ema20 < ema50 < ema200
-        and rsi15 <= 45 and rsi5 <= 50 and (f618 is None or price <= f618 * 0.9995)):
-        return "STRONG SELL"
-    return None
-
-def _moderate_signal(
-    trend_up: bool, trend_down: bool,
-    rsi15: float, rsi5: float,
-    macd15u: bool, macd5u: bool,
-    price: float, ema20: float, ema50: float, ema200: float,
-) -> str:
-    score = 0
-    if trend_up: score += 2
-    if trend_down: score -= 2
-    score += 1 if macd15u else -1
-    score += 1 if macd5u else -1
-    score += 1 if price > ema20 else -1
-    score += 1 if price > ema50 else -1
-    score += 1 if price > ema200 else -1
-    if rsi15 >= 60: score += 1
-    if rsi15 < 45: score -= 1
-    if rsi5 >= 55: score += 1
-    if rsi5 < 45: score -= 1
-    if score >= 2: return "BUY"
-    if score <= -2: return "SELL"
-    return "NEUTRAL"
 
+# ============== lógica de señal ==============
 def _reasons_text(
     decision: str,
     trend_up: bool, trend_down: bool,
@@ -203,10 +207,12 @@ def _reasons_text(
 
 
 # ============== teclado & render wrappers ==============
-def _kb_estado() -> InlineKeyboardMarkup:
+def _kb_estado(live: bool = False) -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(
         [[
             InlineKeyboardButton("🔄 Refrescar", callback_data="state:refresh"),
+            (InlineKeyboardButton("⏹ Live", callback_data="state:stop") if live
+             else InlineKeyboardButton("📡 Live", callback_data="state:live")),
             InlineKeyboardButton("❌ Cerrar",    callback_data="state:close"),
         ]]
     )
@@ -228,10 +234,6 @@ def _render_estado_image(
     decision_main: str = "ESPERAR",
     sec_signal: str = "NEUTRAL",
 ) -> Image.Image:
-    W, H = 1280, 800
-    M = 32
-    R = 24
-
     # Paleta
     if theme == "dark":
         BG = (15, 23, 42)
@@ -267,17 +269,11 @@ def _render_estado_image(
     else:
         trend_badge_bg = COL_WARN; trend_text = "LATERAL"; spark_color = COL_WARN
 
-    # Lienzo
-    img = Image.new("RGBA", (W, H), (*BG, 255))
+    # Lienzo: copia de la capa estática (fondo, sombra, marco por tendencia, panel, caja sparkline)
+    static = _static_layer(BG, PANEL, trend_badge_bg, SP_BG, SP_BORDER)
+    img = static.copy()
     draw = ImageDraw.Draw(img, "RGBA")
-
-    # Marco + sombra (exterior depende de tendencia)
-    outer = (M, M, W - M, H - M)
-    _drop_shadow(img, outer, radius=R, offset=(8, 10), alpha=100)
-    _draw_rounded_rect(draw, outer, radius=R, fill=None, outline=trend_badge_bg, width=12)
-
-    inner = (M + 14, M + 14, W - M - 14, H - M - 14)
-    _draw_rounded_rect(draw, inner, radius=R - 8, fill=PANEL, outline=None, width=0)
+    inner = _INNER
 
     # Fuentes
     f_h1 = _load_font(52)
@@ -290,7 +286,7 @@ def _render_estado_image(
     f_badge2 = _load_font(30)
 
     # Layout base
-    pad = 28
+    pad = _PAD
     left_x = inner[0] + pad
     right_x = inner[2] - pad
     top_y = inner[1] + pad
@@ -356,17 +352,16 @@ def _render_estado_image(
         _badge(draw, (vbx, vby, vbx + vbadge_w, vby + vbadge_h), f"Var. diaria: {day_change_pct:+.2f}%", vcol, _load_font(28))
 
     # ----------- Alturas reservadas para panel & razones -----------
-    panel_h = 130
-    reasons_h = 120
-    bottom_padding = 28
-
-    # Sparkline — más compacta y sin encimar
-    spark_left = int(inner[0] + (inner[2] - inner[0]) * 0.60)
-    spark_top  = top_y + 115
-    spark_bottom_limit = inner[3] - (panel_h + reasons_h + bottom_padding + 18)
-    spark_rect = (spark_left, spark_top, right_x, max(spark_top + 120, spark_bottom_limit))
-    _draw_rounded_rect(draw, spark_rect, radius=14, fill=SP_BG, outline=SP_BORDER, width=2)
-    _draw_sparkline(draw, spark_rect, closes_for_spark, color=spark_color, thickness=3)
+    panel_h = _PANEL_H
+    reasons_h = _REASONS_H
+
+    # Sparkline — más compacta y sin encimar (la caja viene en la capa estática)
+    spark_left = _SPARK_LEFT
+    # la caja queda por encima del texto que la invada, como cuando se pintaba aquí
+    sx, sy = _SPARK_RECT[:2]
+    mask = _spark_mask()
+    img.paste(static.crop((sx, sy, sx + mask.width, sy + mask.height)), (sx, sy), mask)
+    _draw_sparkline(draw, _SPARK_RECT, closes_for_spark, color=spark_color, thickness=3)
 
     # Razones (abajo izquierda)
     reasons_x = left_x
@@ -424,6 +419,11 @@ def _render_estado_image(
     return img
 
 
+def _estado_image_bytes(as_document: bool, **render_kwargs) -> bytes:
+    # documento: sin pérdida; foto: el formato más liviano que quepa en el presupuesto
+    return encoding.encode(_render_estado_image(**render_kwargs), lossless=as_document, kind="estado")
+
+
 async def _build_estado_payload(
     st: ChatState,
     ctx4: dict, op15: dict, ex5: dict,
@@ -444,7 +444,7 @@ async def _build_estado_payload(
     trend_up, trend_down = bool(ctx4["trend_up"]), bool(ctx4["trend_down"])
     closes15 = op15["df"]["close"]
 
-    img = _render_estado_image(
+    render_kwargs = dict(
         coin=st.coin_id,
         price_fmt=fmt_price(st.symbol_okx, price_now),
         price_val=price_now,
@@ -460,15 +460,11 @@ async def _build_estado_payload(
         decision_main=decision_main,
         sec_signal=sec_signal,
     )
-
-    buf = io.BytesIO()
-    if as_document:
-        filename = f"estado_{st.coin_id.lower()}.png"
-        img.save(buf, format="PNG")
-    else:
-        filename = f"estado_{st.coin_id.lower()}.jpg"
-        img.convert("RGB").save(buf, format="JPEG", quality=95, optimize=True)
-    buf.seek(0)
+    # Render + encode en hilo; mismos valores visibles → mismos bytes (cache compartida)
+    buf = await asyncio.to_thread(
+        render_cache.cached, "estado", _estado_image_bytes, as_document, **render_kwargs
+    )
+    filename = encoding.filename(f"estado_{st.coin_id.lower()}", buf.getvalue())
 
     caption = ("💡 Usa /grafica\npara velas 15m con Pivotes/Fibo.\n\n"
                "📏 Usa /niveles\npara Pivotes y Fibonacci.\n\n"
@@ -477,31 +473,33 @@ async def _build_estado_payload(
     return buf, filename, caption
 
 
-# ============== /estado ==============
-async def estado_cmd(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
-    """
-    /estado        -> usa el tema guardado (claro/oscuro) para este chat
-    /estado doc    -> igual, pero como documento PNG (se puede refrescar también)
-    """
-    app = ctx.application
-    cfg: Config = app.bot_data["config"]
-    chat_id = update.effective_chat.id
-
-    st = await repo.get_chat(cfg.db_path, chat_id) or ChatState(chat_id=chat_id)
-
-    args = [a.lower() for a in (ctx.args or ())]
-    as_document = any(a in ("doc", "documento", "file", "archivo") for a in args)
-    theme = "dark" if bool(st.dark_mode) else "light"
-
-    # Datasets
+# ============== datos compartidos + señales ==============
+async def _fetch_market(coin_id: str, symbol_okx: str) -> Optional[dict]:
+    """Descarga 4H/15M/5M + niveles. Una sola vez por símbolo aunque lo pidan varios chats (snapshots)."""
     ctx4, op15, ex5 = await asyncio.gather(
-        get_4h_context(st.coin_id, st.symbol_okx),
-        get_15m_oper(st.coin_id, st.symbol_okx),
-        get_5m_execution(st.coin_id, st.symbol_okx),
+        get_4h_context(coin_id, symbol_okx),
+        get_15m_oper(coin_id, symbol_okx),
+        get_5m_execution(coin_id, symbol_okx),
     )
     if None in (ctx4, op15, ex5):
-        await update.message.reply_text("❌ No pude obtener datos ahora. Intenta otra vez en 1–2 minutos.")
-        return
+        return None
+    try:
+        levels = await get_levels(coin_id, symbol_okx)
+    except Exception:
+        levels = None
+    return {"ctx4": ctx4, "op15": op15, "ex5": ex5, "levels": levels}
+
+
+async def _estado_inputs(st: ChatState) -> Optional[dict]:
+    """
+    Todo lo que muestra el panel (salvo tema/formato), a partir del snapshot compartido del símbolo.
+    Devuelve kwargs para _build_estado_payload, o None si no hay datos.
+    """
+    snap = await snapshots.get(("estado", st.coin_id, st.symbol_okx),
+                               lambda: _fetch_market(st.coin_id, st.symbol_okx))
+    if snap is None:
+        return None
+    ctx4, op15, ex5, levels = snap["ctx4"], snap["op15"], snap["ex5"], snap["levels"]
 
     # Hora local
     try:
@@ -531,93 +529,166 @@ async def estado_cmd(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
     except Exception:
         pass
 
-    # Señales auxiliares
-    closes15 = op15["df"]["close"]
-    try:
-        rsi_series = rsi_func(closes15.astype(float), 14).dropna()
-        rsi15 = float(op15["rsi"])
-        rsi5 = float(ex5["rsi"])
-        rsi15_prev = float(rsi_series.iloc[-2]) if len(rsi_series) >= 2 else rsi15
-        rsi15_cross_up = (rsi15_prev < 50 <= rsi15)
-    except Exception:
-        rsi15_cross_up = False
-        rsi15 = float(op15["rsi"])
-        rsi5 = float(ex5["rsi"])
+    # Señal y decisión (mismo motor que el heartbeat, sobre la vela en formación)
+    view = signals.market_view(signals.snapshot(op15["df"], ex5["df"], ctx4, levels, precision=False))
+    sec_signal, decision_main = view["signal"], view["decision"]
+    reasons_line = _reasons_text(
+        decision=decision_main,
+        trend_up=view["trend_up"], trend_down=view["trend_down"],
+        price=view["price"], ema20=view["ema20"], ema50=view["ema50"],
+        rsi15=view["rsi15"], rsi5=view["rsi5"],
+        macd15u=view["macd15u"], macd5u=view["macd5u"],
+        rsi15_series_ok_cross=view["rsi15_cross_up"],
+        macd_hist_up=view["macd_hist_up"],
+        f618_confirmed=view["f618_confirmed"],
+    )
+
+    return dict(
+        ctx4=ctx4, op15=op15, ex5=ex5,
+        tz_local=tz_local, last_ts_local_str=last_ts_local_str, day_change_pct=day_change_pct,
+        reasons_line=reasons_line, decision_main=decision_main, sec_signal=sec_signal,
+    )
+
+
+# ============== /estado ==============
+async def estado_cmd(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
+    """
+    /estado        -> usa el tema guardado (claro/oscuro) para este chat
+    /estado doc    -> igual, pero como documento PNG (se puede refrescar también)
+    /estado live   -> el panel se actualiza solo (cierre de vela / cambio de señal)
+    """
+    app = ctx.application
+    cfg: Config = app.bot_data["config"]
+    chat_id = update.effective_chat.id
+
+    st = await repo.get_chat(cfg.db_path, chat_id) or ChatState(chat_id=chat_id)
+
+    args = [a.lower() for a in (ctx.args or ())]
+    as_document = any(a in ("doc", "documento", "file", "archivo") for a in args)
+    live = any(a in ("live", "vivo") for a in args)
+    theme = "dark" if bool(st.dark_mode) else "light"
 
+    inputs = await _estado_inputs(st)
+    if inputs is None:
+        await update.message.reply_text("❌ No pude obtener datos ahora. Intenta otra vez en 1–2 minutos.")
+        return
+
+    # Render a buffer (no enviar aún)
+    buf, filename, caption = await _build_estado_payload(st, theme=theme, as_document=as_document, **inputs)
+
+    # Envío con botones (por file_id si otro chat ya recibió la misma imagen)
+    msg = await _send_estado(ctx.bot, chat_id, buf, filename, caption, as_document, live=live)
+    if live and msg is not None:
+        start_live(app, chat_id, msg.message_id, as_document, inputs)
+
+
+# ============== modo live ==============
+# cada cuánto se mira el snapshot y tras cuánto sin interacción se apaga: Config.estado_live_*
+_LIVE_MOVE_PCT = 0.5  # movimiento de precio que sí se publica
+
+def _live_name(chat_id: int) -> str:
+    return f"estado_live:{chat_id}"
+
+def _live_sig(inputs: dict) -> str:
+    """Lo que justifica editar: vela 15m nueva, señal/decisión/razones o tendencia 4H."""
     try:
-        m, s, h = macd_func(closes15.astype(float))
-        macd_hist_up = len(h.dropna()) >= 2 and (float(h.iloc[-1]) > float(h.iloc[-2]))
+        bar = str(inputs["op15"]["df"]["time"].iloc[-1])
     except Exception:
-        macd_hist_up = False
-
-    # Niveles (para F618)
+        bar = "—"
+    ctx4 = inputs["ctx4"]
+    return "|".join((bar, inputs["sec_signal"], inputs["decision_main"], inputs["reasons_line"],
+                     str(bool(ctx4["trend_up"])), str(bool(ctx4["trend_down"]))))
+
+def _live_needs_update(data: dict, inputs: dict) -> bool:
+    if data.get("sig") != _live_sig(inputs):
+        return True
+    prev, price = data.get("price"), float(inputs["op15"]["price"])
+    return bool(prev) and abs(_perc(price, prev)) >= _LIVE_MOVE_PCT
+
+def _live_jobs(app, chat_id: int):
     try:
-        levels = await get_levels(st.coin_id, st.symbol_okx)
-        f618 = levels.get("F618") if levels else None
-        f618_confirmed = (f618 is not None) and (float(op15["price"]) >= f618 * 1.001)
+        return app.job_queue.get_jobs_by_name(_live_name(chat_id))
     except Exception:
-        f618 = None
-        f618_confirmed = False
+        return [j for j in app.job_queue.jobs() if j.name == _live_name(chat_id)]
 
-    # Señal secundaria y decisión
-    trend_up, trend_down = bool(ctx4["trend_up"]), bool(ctx4["trend_down"])
-    macd15u, macd5u = bool(op15["macd_up"]), bool(ex5["macd_up"])
-    sec_signal = _strong_signal(
-        trend_up, trend_down, rsi15, rsi5, macd15u, macd5u, macd_hist_up,
-        float(op15["price"]), float(op15["ema20"]), float(op15["ema50"]), float(op15["ema200"]), f618
+def start_live(app, chat_id: int, message_id: int, as_document: bool, inputs: dict) -> None:
+    """Un panel live por chat: si ya había otro, el nuevo lo reemplaza."""
+    cfg: Config = app.bot_data["config"]
+    stop_live(app, chat_id)
+    idle = cfg.estado_live_idle_min * 60
+    app.job_queue.run_repeating(
+        estado_live_job, interval=cfg.estado_live_sec, first=cfg.estado_live_sec, name=_live_name(chat_id),
+        chat_id=chat_id,
+        data={
+            "chat_id": chat_id, "message_id": message_id, "as_document": as_document,
+            "sig": _live_sig(inputs), "price": float(inputs["op15"]["price"]),
+            "idle": idle, "until": time.monotonic() + idle,
+        },
     )
-    if sec_signal is None:
-        sec_signal = _moderate_signal(
-            trend_up, trend_down, rsi15, rsi5, macd15u, macd5u,
-            float(op15["price"]), float(op15["ema20"]), float(op15["ema50"]), float(op15["ema200"])
-        )
 
-    decision_main = "ENTRAR YA" if sec_signal in ("STRONG BUY", "BUY") else "ESPERAR"
-    reasons_line = _reasons_text(
-        decision=decision_main,
-        trend_up=trend_up, trend_down=trend_down,
-        price=float(op15["price"]), ema20=float(op15["ema20"]), ema50=float(op15["ema50"]),
-        rsi15=rsi15, rsi5=rsi5,
-        macd15u=macd15u, macd5u=macd5u,
-        rsi15_series_ok_cross=rsi15_cross_up,
-        macd_hist_up=macd_hist_up,
-        f618_confirmed=f618_confirmed,
-    )
+def stop_live(app, chat_id: int, message_id: Optional[int] = None) -> Optional[dict]:
+    """Detiene el live del chat (si `message_id`, solo si es ese mensaje). Devuelve sus datos."""
+    out = None
+    for j in _live_jobs(app, chat_id):
+        if message_id is None or j.data.get("message_id") == message_id:
+            j.schedule_removal()
+            out = j.data
+    return out
+
+def _touch_live(app, chat_id: int, message_id: int) -> bool:
+    """Interacción del usuario con el panel live: renueva el plazo de inactividad."""
+    for j in _live_jobs(app, chat_id):
+        if j.data.get("message_id") == message_id:
+            j.data["until"] = time.monotonic() + j.data["idle"]
+            return True
+    return False
+
+async def estado_live_job(ctx: ContextTypes.DEFAULT_TYPE):
+    job = ctx.job
+    data = job.data
+    app = ctx.application
+    cfg: Config = app.bot_data["config"]
+    chat_id, message_id = data["chat_id"], data["message_id"]
 
-    # Render a buffer (no enviar aún)
-    buf, filename, caption = await _build_estado_payload(
-        st, ctx4, op15, ex5, tz_local, last_ts_local_str, day_change_pct,
-        reasons_line, theme, as_document,
-        decision_main, sec_signal
-    )
+    if time.monotonic() >= data["until"]:
+        job.schedule_removal()
+        try:
+            await ctx.bot.edit_message_reply_markup(chat_id=chat_id, message_id=message_id, reply_markup=_kb_estado())
+        except Exception:
+            pass
+        return
 
-    # Envío con botones
-    if as_document:
-        await ctx.bot.send_document(
-            chat_id=chat_id,
-            document=_fresh_inputfile(buf, filename),
-            caption=caption,
-            parse_mode=ParseMode.HTML,
-            reply_markup=_kb_estado(),
-            disable_content_type_detection=True,
-        )
-    else:
-        await ctx.bot.send_photo(
-            chat_id=chat_id,
-            photo=_fresh_inputfile(buf, filename),
-            caption=caption,
-            parse_mode=ParseMode.HTML,
-            reply_markup=_kb_estado(),
+    st = await repo.get_chat(cfg.db_path, chat_id) or ChatState(chat_id=chat_id)
+    inputs = await _estado_inputs(st)
+    if inputs is None or not _live_needs_update(data, inputs):
+        return
+
+    theme = "dark" if bool(st.dark_mode) else "light"
+    as_document = data["as_document"]
+    buf, filename, caption = await _build_estado_payload(st, theme=theme, as_document=as_document, **inputs)
+    try:
+        await file_ids.edit_media(
+            ctx.bot.edit_message_media, "document" if as_document else "photo", buf, filename,
+            caption=caption, parse_mode=ParseMode.HTML, reply_markup=_kb_estado(live=True),
+            chat_id=chat_id, message_id=message_id,
         )
+    except BadRequest as e:
+        if "not modified" not in str(e).lower():
+            # el mensaje ya no existe / no es editable: no tiene sentido seguir
+            job.schedule_removal()
+            return
+    data["sig"], data["price"] = _live_sig(inputs), float(inputs["op15"]["price"])
 
 
-# ============== callbacks (refresh / close) ==============
+# ============== callbacks (refresh / live / close) ==============
 async def estado_cb(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
     """Edita la MISMA imagen/documento de /estado (o borra y reenvía si falla)."""
     query = update.callback_query
     await query.answer()
-    cfg: Config = ctx.application.bot_data["config"]
+    app = ctx.application
+    cfg: Config = app.bot_data["config"]
     chat_id = query.message.chat_id
+    message_id = query.message.message_id
 
     data = (query.data or "").strip()
     action = data.split(":")[1].lower() if ":" in data else ""
@@ -625,6 +696,7 @@ async def estado_cb(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
     st = await repo.get_chat(cfg.db_path, chat_id) or ChatState(chat_id=chat_id)
 
     if action == "close":
+        stop_live(app, chat_id, message_id)
         try:
             await query.message.delete()
             await query.answer("Cerrado ✅", show_alert=False)
@@ -636,156 +708,61 @@ async def estado_cb(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
                 pass
         return
 
-    if action != "refresh":
+    if action == "stop":
+        stop_live(app, chat_id, message_id)
+        try:
+            await query.edit_message_reply_markup(reply_markup=_kb_estado())
+        except Exception:
+            pass
         return
 
-    # Recalcular datasets
-    ctx4, op15, ex5 = await asyncio.gather(
-        get_4h_context(st.coin_id, st.symbol_okx),
-        get_15m_oper(st.coin_id, st.symbol_okx),
-        get_5m_execution(st.coin_id, st.symbol_okx),
-    )
-    if None in (ctx4, op15, ex5):
-        await query.answer("Sin datos. Intenta en un minuto.", show_alert=False)
+    if action not in ("refresh", "live"):
         return
 
-    # Hora local (como en /estado)
-    try:
-        ts = op15["df"]["time"].iloc[-1]
-        ts_utc = pytz.UTC.localize(ts.to_pydatetime()) if getattr(ts, "tzinfo", None) is None else ts.astimezone(pytz.UTC)
-        tz_env = os.getenv("BOT_TZ", None)
-        tz_local = pytz.timezone(tz_env) if tz_env else get_localzone()
-        ts_local = ts_utc.astimezone(tz_local)
-        last_ts_local_str = f"{ts_local.strftime('%Y-%m-%d %H:%M %Z')}"
-    except Exception:
-        last_ts_local_str = "—"
-        tz_local = get_localzone()
-
-    # Var. diaria
-    day_change_pct = None
-    try:
-        midnight_local = ts_local.replace(hour=0, minute=0, second=0, microsecond=0)  # type: ignore[name-defined]
-        df = op15["df"].copy()
-        df["time"] = pd.to_datetime(df["time"])
-        if df["time"].dt.tz is None:
-            df["time"] = df["time"].dt.tz_localize("UTC")
-        df["time_local"] = df["time"].dt.tz_convert(str(tz_local))
-        ref = df.iloc[(df["time_local"] - midnight_local).abs().argsort()[:1]]
-        if not ref.empty:
-            p0 = float(ref["close"].iloc[0])
-            day_change_pct = _perc(float(op15["price"]), p0)
-    except Exception:
-        pass
-
-    # Señales auxiliares (como en /estado)
-    closes15 = op15["df"]["close"]
-    try:
-        rsi_series = rsi_func(closes15.astype(float), 14).dropna()
-        rsi15 = float(op15["rsi"])
-        rsi5 = float(ex5["rsi"])
-        rsi15_prev = float(rsi_series.iloc[-2]) if len(rsi_series) >= 2 else rsi15
-        rsi15_cross_up = (rsi15_prev < 50 <= rsi15)
-    except Exception:
-        rsi15_cross_up = False
-        rsi15 = float(op15["rsi"])
-        rsi5 = float(ex5["rsi"])
-
-    try:
-        m, s, h = macd_func(closes15.astype(float))
-        macd_hist_up = len(h.dropna()) >= 2 and (float(h.iloc[-1]) > float(h.iloc[-2]))
-    except Exception:
-        macd_hist_up = False
-
-    # Niveles (para F618)
-    try:
-        levels = await get_levels(st.coin_id, st.symbol_okx)
-        f618 = levels.get("F618") if levels else None
-        f618_confirmed = (f618 is not None) and (float(op15["price"]) >= f618 * 1.001)
-    except Exception:
-        f618 = None
-        f618_confirmed = False
+    inputs = await _estado_inputs(st)
+    if inputs is None:
+        await query.answer("Sin datos. Intenta en un minuto.", show_alert=False)
+        return
 
-    # Señal y razones (igual que /estado)
     theme = "dark" if bool(st.dark_mode) else "light"
-    trend_up, trend_down = bool(ctx4["trend_up"]), bool(ctx4["trend_down"])
-    macd15u, macd5u = bool(op15["macd_up"]), bool(ex5["macd_up"])
-    sec_signal = _strong_signal(
-        trend_up, trend_down, rsi15, rsi5, macd15u, macd5u, macd_hist_up,
-        float(op15["price"]), float(op15["ema20"]), float(op15["ema50"]), float(op15["ema200"]), f618
-    )
-    if sec_signal is None:
-        sec_signal = _moderate_signal(
-            trend_up, trend_down, rsi15, rsi5, macd15u, macd5u,
-            float(op15["price"]), float(op15["ema20"]), float(op15["ema50"]), float(op15["ema200"])
-        )
-    decision_main = "ENTRAR YA" if sec_signal in ("STRONG BUY", "BUY") else "ESPERAR"
-    reasons_line = _reasons_text(
-        decision=decision_main,
-        trend_up=trend_up, trend_down=trend_down,
-        price=float(op15["price"]), ema20=float(op15["ema20"]), ema50=float(op15["ema50"]),
-        rsi15=rsi15, rsi5=rsi5,
-        macd15u=macd15u, macd5u=macd5u,
-        rsi15_series_ok_cross=rsi15_cross_up,
-        macd_hist_up=macd_hist_up,
-        f618_confirmed=f618_confirmed,
-    )
-
     as_document = bool(query.message.document) and not query.message.photo
-    buf, filename, caption = await _build_estado_payload(
-        st, ctx4, op15, ex5, tz_local, last_ts_local_str, day_change_pct,
-        reasons_line, theme, as_document,
-        decision_main, sec_signal
-    )
+    live = action == "live" or _touch_live(app, chat_id, message_id)
+    buf, filename, caption = await _build_estado_payload(st, theme=theme, as_document=as_document, **inputs)
 
     try:
-        if as_document:
-            media = InputMediaDocument(
-                media=_fresh_inputfile(buf, filename),
-                caption=caption,
-                parse_mode=ParseMode.HTML
-            )
-        else:
-            media = InputMediaPhoto(
-                media=_fresh_inputfile(buf, filename),
-                caption=caption,
-                parse_mode=ParseMode.HTML
-            )
-
-        await query.edit_message_media(media=media, reply_markup=_kb_estado())
+        await file_ids.edit_media(
+            query.edit_message_media, "document" if as_document else "photo", buf, filename,
+            caption=caption, parse_mode=ParseMode.HTML, reply_markup=_kb_estado(live=live),
+        )
 
     except BadRequest as e:
         # Fallback/ignorables: variantes comunes + buffers agotados
         msg = str(e).lower()
-        harmless = any(s in msg for s in [
-            "message is not modified",
-            "message content is not modified",
+        if "not modified" in msg:
+            # misma imagen (snapshot aún vigente): solo falta reflejar el botón live
+            if action == "live":
+                try:
+                    await query.edit_message_reply_markup(reply_markup=_kb_estado(live=True))
+                except Exception:
+                    pass
+        elif any(s in msg for s in [
             "message to edit not found",
             "message can't be edited",
             "can't parse inputmedia",
             "media not found",
             "file must be non-empty",
-        ])
-        if harmless:
+        ]):
+            stop_live(app, chat_id, message_id)
             try:
                 await query.message.delete()
             except Exception:
                 pass
-            if as_document:
-                await ctx.bot.send_document(
-                    chat_id=chat_id,
-                    document=_fresh_inputfile(buf, filename),
-                    caption=caption,
-                    parse_mode=ParseMode.HTML,
-                    reply_markup=_kb_estado(),
-                    disable_content_type_detection=True,
-                )
-            else:
-                await ctx.bot.send_photo(
-                    chat_id=chat_id,
-                    photo=_fresh_inputfile(buf, filename),
-                    caption=caption,
-                    parse_mode=ParseMode.HTML,
-                    reply_markup=_kb_estado(),
-                )
+            sent = await _send_estado(ctx.bot, chat_id, buf, filename, caption, as_document, live=live)
+            if live and sent is not None:
+                start_live(app, chat_id, sent.message_id, as_document, inputs)
+            return
         else:
             raise
+
+    if action == "live":
+        start_live(app, chat_id, message_id, as_document, inputs)
@@ -2,18 +2,16 @@
 from __future__ import annotations
 import asyncio
 import io
-from typing import Dict, Optional
+import threading
+from typing import Dict, Optional, Tuple
 
 import numpy as np
 import pandas as pd
-import matplotlib
-matplotlib.use("Agg")
-import matplotlib.pyplot as plt
 import matplotlib.dates as mdates
-from matplotlib.patches import Rectangle
+from matplotlib.collections import LineCollection, PolyCollection
 from matplotlib.ticker import FuncFormatter
 
-from telegram import Update, InputFile
+from telegram import Update
 from telegram.ext import ContextTypes
 from telegram.constants import ParseMode
 
@@ -23,6 +21,9 @@ from ...db.models import ChatState
 from ...services.indicators import ema
 from ...services.levels import get_levels
 from ...services.formatting import fmt_price, get_symbol_decimals
+from ...services import render_pool
+from ...services import encoding, file_ids
+from ...services.canvas import new_figure, to_image
 from ..jobs import get_4h_context, get_15m_oper, get_5m_execution
 
 
@@ -47,69 +48,210 @@ C_F618  = "#166534"   # verde oscuro (destacado)
 C_F786  = "#14b8a6"   # teal
 
 
-# ---------- helpers de pintado ----------
-def _plot_candles(ax, df, color_up="#16a34a", color_down="#dc2626") -> None:
-    """
-    Dibuja velas OHLC sobre ax.
-    df: DataFrame con columnas ['time','open','high','low','close'].
-    """
-    ts = pd.to_datetime(df["time"], errors="coerce")
+# ---------- geometría ----------
+C_UP   = "#16a34a"
+C_DOWN = "#dc2626"
+_CANDLE_HALF = (15.0 / 1440.0) * 0.7 / 2   # ancho de vela ~ 70% de 15 minutos (en días)
+
+# (clave, color, lw, ls) en el orden de pintado original
+_LEVEL_STYLES = (
+    ("S3", C_S3, 0.95, "--"), ("S2", C_S2, 0.95, "--"), ("S1", C_S1, 0.95, "--"),
+    ("P", C_P, 0.8, ":"),
+    ("R1", C_R1R2, 0.95, "--"), ("R2", C_R1R2, 0.95, "--"), ("R3", C_R3, 0.95, "--"),
+    ("F618", C_F618, 1.8, "-."),
+    ("F236", C_F236, 1.2, "-."), ("F382", C_F382, 1.2, "-."),
+    ("F500", C_F500, 1.2, "-."), ("F786", C_F786, 1.2, "-."),
+)
+_FULL_FIBO = ("F236", "F382", "F500", "F786")
+
+
+def _time_num(times) -> np.ndarray:
+    """Tiempos → números de mdates (sin tz)."""
+    ts = pd.to_datetime(times, errors="coerce")
     # Si trae tz, quitar tz para mdates
     try:
         if getattr(ts.dt, "tz", None) is not None:
             ts = ts.dt.tz_localize(None)
     except Exception:
         pass
-
     # Evitar FutureWarning: usar lista de Timestamps
-    t = mdates.date2num(ts.tolist())
-
-    o = df["open"].astype(float).to_numpy()
-    h = df["high"].astype(float).to_numpy()
-    l = df["low"].astype(float).to_numpy()
-    c = df["close"].astype(float).to_numpy()
-
-    # ancho de vela ~ 70% de 15 minutos (en días)
-    width = (15.0 / 1440.0) * 0.7
-    for x, open_, high_, low_, close_ in zip(t, o, h, l, c):
-        up = close_ >= open_
-        col = color_up if up else color_down
-        # mecha
-        ax.vlines(x, low_, high_, color=col, linewidth=1.0, alpha=0.9)
-        # cuerpo
-        y = min(open_, close_)
-        height = abs(close_ - open_)
-        if height == 0:
-            # doji
-            ax.hlines(y, x - width/2, x + width/2, color=col, linewidth=1.2)
-        else:
-            rect = Rectangle((x - width/2, y), width, height, facecolor=col, edgecolor=col, alpha=0.9)
-            ax.add_patch(rect)
-
-    ax.xaxis_date()
-    ax.xaxis.set_major_locator(mdates.AutoDateLocator(minticks=4, maxticks=8))
-    ax.xaxis.set_major_formatter(mdates.ConciseDateFormatter(ax.xaxis.get_major_locator()))
+    return np.asarray(mdates.date2num(ts.tolist()), dtype=float)
 
 
-def _hline_labeled(ax, y: Optional[float], text: str, color: str, lw=0.95, ls="--",
-                   box_fc="#ffffff", box_alpha=0.92, text_color="#111111") -> None:
+def _candle_geometry(t, o, h, l, c):
     """
-    Dibuja una línea horizontal y coloca una etiqueta con el texto (p.ej. 'R1 1.2345')
-    pegada al borde derecho del gráfico (x en coords de ejes, y en coords de datos).
+    Segmentos/polígonos de las velas por color:
+    {color: (mechas, cuerpos, dojis)} listos para set_segments/set_verts.
+    """
+    half = _CANDLE_HALF
+    lo_body = np.minimum(o, c)
+    hi_body = np.maximum(o, c)
+    empty = np.empty((0, 2, 2))
+    out = {}
+    up = c >= o
+    for mask, col in ((up, C_UP), (~up, C_DOWN)):
+        x = t[mask]
+        # mechas: segmentos verticales (x, low) → (x, high)
+        wicks = np.stack([np.column_stack([x, l[mask]]), np.column_stack([x, h[mask]])], axis=1) if mask.any() else empty
+        y0, y1 = lo_body[mask], hi_body[mask]
+        body = y1 > y0
+        xl, xr, b0, b1 = x[body] - half, x[body] + half, y0[body], y1[body]
+        bodies = np.stack([
+            np.column_stack([xl, b0]), np.column_stack([xr, b0]),
+            np.column_stack([xr, b1]), np.column_stack([xl, b1]),
+        ], axis=1) if body.any() else np.empty((0, 4, 2))
+        doji = ~body
+        # doji: trazo horizontal del ancho de la vela
+        xd, yd = x[doji], y0[doji]
+        dojis = np.stack([np.column_stack([xd - half, yd]), np.column_stack([xd + half, yd])], axis=1) if doji.any() else empty
+        out[col] = (wicks, bodies, dojis)
+    return out
+
+
+# ---------- plantilla persistente ----------
+class _ChartTemplate:
+    """
+    Figura/ejes/artistas creados una sola vez por (tema, tamaño).
+    Cada render sólo actualiza datos (set_data/set_segments/set_verts, niveles, título)
+    y redibuja el canvas. Cada hilo tiene las suyas (ver _template).
     """
-    if y is None or not np.isfinite(y):
-        return
-    ax.axhline(y, color=color, linewidth=lw, linestyle=ls)
-    trans = ax.get_yaxis_transform()  # x:[0..1], y:datos
-    ax.text(
-        0.99, y, text,
-        transform=trans,
-        ha="right", va="center",
-        color=text_color,
-        fontsize=9,
-        bbox=dict(boxstyle="round,pad=0.25", fc=box_fc, ec=color, lw=0.8, alpha=box_alpha),
-        clip_on=False,
-    )
+
+    def __init__(self, dark: bool, figsize=(10.6, 6.2), dpi=140):
+        self.dp = 4
+        fig = self.fig = new_figure(figsize, dpi)
+        ax = self.ax = fig.add_subplot()
+        sp = fig.subplotpars
+        self._margins = dict(left=sp.left, right=sp.right, bottom=sp.bottom, top=sp.top)
+
+        # tema
+        if dark:
+            fig.patch.set_facecolor("#0f172a")  # slate-900
+            ax.set_facecolor("#0b1220")         # casi negro
+            grid_c = (1, 1, 1, 0.08)
+            tick_c = "#e5e7eb"
+            self.text_c = "#e5e7eb"
+            label_box_fc = "#111827"
+            label_text_c = "#ffffff"
+            box_alpha = 0.9
+        else:
+            grid_c = (0, 0, 0, 0.1)
+            tick_c = "#111827"
+            self.text_c = "#111827"
+            label_box_fc = "#ffffff"
+            label_text_c = "#111111"
+            box_alpha = 0.92
+
+        for spine in ax.spines.values():
+            spine.set_color(tick_c)
+        ax.tick_params(colors=tick_c)
+        ax.yaxis.label.set_color(tick_c)
+        ax.xaxis.label.set_color(tick_c)
+
+        # velas: 3 colecciones por color (mechas, cuerpos, dojis)
+        self.candles = {}
+        for col in (C_UP, C_DOWN):
+            wicks = ax.add_collection(LineCollection([], colors=col, linewidths=1.0, alpha=0.9), autolim=False)
+            bodies = ax.add_collection(PolyCollection([], facecolors=col, edgecolors=col, linewidths=1.0, alpha=0.9, zorder=1), autolim=False)
+            dojis = ax.add_collection(LineCollection([], colors=col, linewidths=1.2), autolim=False)
+            self.candles[col] = (wicks, bodies, dojis)
+
+        # fallback sin OHLC + EMAs
+        self.price_line, = ax.plot([], [], label="Precio", linewidth=1.4, color=C_PRICE)
+        self.ema_lines = (
+            ax.plot([], [], label="EMA20", linewidth=1.2, color=C_EMA20)[0],
+            ax.plot([], [], label="EMA50", linewidth=1.1, color=C_EMA50)[0],
+            ax.plot([], [], label="EMA200", linewidth=1.0, color=C_EMA200)[0],
+        )
+
+        # niveles: línea + etiqueta pegada al borde derecho (x en coords de ejes, y en datos)
+        trans = ax.get_yaxis_transform()
+        self.levels = {}
+        for key, color, lw, ls in _LEVEL_STYLES:
+            line = ax.axhline(0.0, color=color, linewidth=lw, linestyle=ls, visible=False)
+            text = ax.text(
+                0.99, 0.0, "",
+                transform=trans,
+                ha="right", va="center",
+                color=label_text_c,
+                fontsize=9,
+                bbox=dict(boxstyle="round,pad=0.25", fc=label_box_fc, ec=color, lw=0.8, alpha=box_alpha),
+                clip_on=False, visible=False,
+            )
+            self.levels[key] = (line, text)
+
+        ax.set_xlabel("Tiempo"); ax.set_ylabel("USD")
+        ax.yaxis.set_major_formatter(FuncFormatter(lambda v, pos: f"{v:.{self.dp}f}"))
+        ax.grid(True, alpha=0.25, color=grid_c)
+        ax.xaxis_date()
+        ax.xaxis.set_major_locator(mdates.AutoDateLocator(minticks=4, maxticks=8))
+        ax.xaxis.set_major_formatter(mdates.ConciseDateFormatter(ax.xaxis.get_major_locator()))
+
+    def render(self, df, levels, emas, title: str, dp: int, fmtv, show_full_fibo: bool) -> io.BytesIO:
+        ax = self.ax
+        t = _time_num(df["time"])
+        pts_x, pts_y = [t], []
+
+        has_ohlc = {"open", "high", "low", "close"}.issubset(df.columns)
+        if has_ohlc:
+            o, h, l, c = (df[k].astype(float).to_numpy() for k in ("open", "high", "low", "close"))
+            for col, (wicks, bodies, dojis) in _candle_geometry(t, o, h, l, c).items():
+                w, b, d = self.candles[col]
+                w.set_segments(wicks); b.set_verts(bodies); d.set_segments(dojis)
+            pts_x += [t - _CANDLE_HALF, t + _CANDLE_HALF]   # cuerpos/dojis ocupan ±medio ancho
+            pts_y += [l, h]
+        else:
+            for w, b, d in self.candles.values():
+                w.set_segments([]); b.set_verts([]); d.set_segments([])
+            pts_y.append(df["close"].astype(float).to_numpy())
+        self.price_line.set_data(([], []) if has_ohlc else (t, pts_y[-1]))
+        self.price_line.set_visible(not has_ohlc)
+
+        for line, s in zip(self.ema_lines, emas):
+            y = np.asarray(s.tail(len(df)), dtype=float)
+            line.set_data(t[-len(y):] if len(y) else [], y)
+            pts_y.append(y)
+
+        # Pivotes + Fibo (sólo los presentes y finitos; fibo completo a demanda)
+        for key, (line, text) in self.levels.items():
+            v = (levels or {}).get(key)
+            show = v is not None and np.isfinite(v) and (key not in _FULL_FIBO or show_full_fibo)
+            line.set_visible(show); text.set_visible(show)
+            if show:
+                v = float(v)
+                line.set_ydata([v, v])
+                text.set_y(v)
+                text.set_text(f"{key} {fmtv(v)}")
+                pts_y.append(np.array([v]))
+
+        # límites: mismo cálculo que autoscale (datos + márgenes) sin recorrer artistas
+        xs = np.concatenate(pts_x); ys = np.concatenate(pts_y)
+        xs, ys = xs[np.isfinite(xs)], ys[np.isfinite(ys)]
+        ax.ignore_existing_data_limits = True
+        if len(xs) and len(ys):
+            ax.update_datalim([(xs.min(), ys.min()), (xs.max(), ys.max())])
+        ax.autoscale_view()
+
+        self.dp = dp
+        ax.set_title(title, color=self.text_c)
+
+        # tight_layout parte siempre de los márgenes iniciales (idempotente entre renders)
+        self.fig.subplots_adjust(**self._margins)
+        self.fig.tight_layout()
+        return io.BytesIO(encoding.encode(to_image(self.fig), kind="grafica"))
+
+
+# Plantillas por hilo (threading.local), como en services/plotting.
+_LOCAL = threading.local()
+
+def _template(dark: bool, figsize=(10.6, 6.2), dpi=140) -> _ChartTemplate:
+    key = (bool(dark), tuple(figsize), int(dpi))
+    templates = getattr(_LOCAL, "templates", None)
+    if templates is None:
+        templates = _LOCAL.templates = {}
+    tpl = templates.get(key)
+    if tpl is None:
+        tpl = templates[key] = _ChartTemplate(bool(dark), figsize, dpi)
+    return tpl
 
 
 # ---------- plot principal ----------
@@ -121,114 +263,32 @@ def plot_chart(
     show_full_fibo: bool = False,
     mark_idx: Optional[int] = None,   # (reservado; no dibujamos punto)
     dark: bool = False,
+    dp: Optional[int] = None,         # decimales ya resueltos (workers sin catálogo OKX)
 ) -> io.BytesIO:
     """
     Dibuja 15m con:
       - Velas OHLC + EMA20/50/200
       - Pivotes P/S1/S2/S3/R1/R2/R3 con etiquetas de precio
       - F618 (y opcionalmente F236/F382/F500/F786) etiquetados
+    Reutiliza la plantilla del tema: sólo se actualizan datos, no se recrea la figura.
     """
     # recorta a últimas ~320 velas (≈ 3.3 días en 15m)
-    df = df_price.tail(320).copy()
-
-    fig = plt.figure(figsize=(10.6, 6.2), dpi=140)
-    ax = plt.gca()
-
-    # tema
-    if dark:
-        fig.patch.set_facecolor("#0f172a")  # slate-900
-        ax.set_facecolor("#0b1220")         # casi negro
-        grid_c = (1, 1, 1, 0.08)
-        tick_c = "#e5e7eb"
-        text_c = "#e5e7eb"
-        label_box_fc = "#111827"
-        label_text_c = "#ffffff"
-        box_alpha = 0.9
-    else:
-        grid_c = (0, 0, 0, 0.1)
-        tick_c = "#111827"
-        text_c = "#111827"
-        label_box_fc = "#ffffff"
-        label_text_c = "#111111"
-        box_alpha = 0.92
-
-    for spine in ax.spines.values():
-        spine.set_color(tick_c)
-    ax.tick_params(colors=tick_c)
-    ax.yaxis.label.set_color(tick_c)
-    ax.xaxis.label.set_color(tick_c)
-
-    # Candles o fallback
-    if {"open","high","low","close"}.issubset(df.columns):
-        _plot_candles(ax, df)
-    else:
-        ax.plot(pd.to_datetime(df["time"]), df["close"], label="Precio", linewidth=1.4, color=C_PRICE)
-
-    # EMAs
-    t = pd.to_datetime(df["time"])
-    ax.plot(t, ema20.tail(len(df)), label="EMA20", linewidth=1.2, color=C_EMA20)
-    ax.plot(t, ema50.tail(len(df)), label="EMA50", linewidth=1.1, color=C_EMA50)
-    ax.plot(t, ema200.tail(len(df)), label="EMA200", linewidth=1.0, color=C_EMA200)
+    df = df_price.tail(320)
 
     # Formato de decimales según símbolo
     c_last = float(df["close"].iloc[-1])
-    dp = 4
-    if inst_id:
-        try:
-            dp = get_symbol_decimals(inst_id, c_last)
-        except Exception:
-            dp = 4
-    fmtv = lambda v: fmt_price(inst_id or "", v)
-
-    # Pivotes + etiquetas
-    if levels:
-        # Soportes (abajo)
-        _hline_labeled(ax, levels.get("S3"), f"S3 {fmtv(levels.get('S3'))}", C_S3,
-                       box_fc=label_box_fc, text_color=label_text_c, box_alpha=box_alpha)
-        _hline_labeled(ax, levels.get("S2"), f"S2 {fmtv(levels.get('S2'))}", C_S2,
-                       box_fc=label_box_fc, text_color=label_text_c, box_alpha=box_alpha)
-        _hline_labeled(ax, levels.get("S1"), f"S1 {fmtv(levels.get('S1'))}", C_S1,
-                       box_fc=label_box_fc, text_color=label_text_c, box_alpha=box_alpha)
-
-        # Punto pivote (gris)
-        _hline_labeled(ax, levels.get("P"), f"P {fmtv(levels.get('P'))}", C_P,
-                       lw=0.8, ls=":", box_fc=label_box_fc, text_color=label_text_c, box_alpha=box_alpha)
-
-        # Resistencias (arriba)
-        _hline_labeled(ax, levels.get("R1"), f"R1 {fmtv(levels.get('R1'))}", C_R1R2,
-                       box_fc=label_box_fc, text_color=label_text_c, box_alpha=box_alpha)
-        _hline_labeled(ax, levels.get("R2"), f"R2 {fmtv(levels.get('R2'))}", C_R1R2,
-                       box_fc=label_box_fc, text_color=label_text_c, box_alpha=box_alpha)
-        _hline_labeled(ax, levels.get("R3"), f"R3 {fmtv(levels.get('R3'))}", C_R3,
-                       box_fc=label_box_fc, text_color=label_text_c, box_alpha=box_alpha)
-
-        # Fibonacci
-        if "F618" in levels and levels["F618"] is not None:
-            _hline_labeled(ax, levels["F618"], f"F618 {fmtv(levels['F618'])}", C_F618,
-                           lw=1.8, ls="-.", box_fc=label_box_fc, text_color=label_text_c, box_alpha=box_alpha)
-
-        if show_full_fibo:
-            for key, color in (
-                ("F236", C_F236),
-                ("F382", C_F382),
-                ("F500", C_F500),
-                ("F786", C_F786),
-            ):
-                if key in levels and levels[key] is not None:
-                    _hline_labeled(ax, levels[key], f"{key} {fmtv(levels[key])}", color,
-                                   lw=1.2, ls="-.", box_fc=label_box_fc, text_color=label_text_c, box_alpha=box_alpha)
-
-    ax.set_title(title, color=text_c)
-    ax.set_xlabel("Tiempo"); ax.set_ylabel("USD")
-    ax.yaxis.set_major_formatter(FuncFormatter(lambda v, pos: f"{v:.{dp}f}"))
-    ax.grid(True, alpha=0.25, color=grid_c)
-
-    fig.tight_layout()
-    buf = io.BytesIO()
-    plt.savefig(buf, format="png")
-    plt.close(fig)
-    buf.seek(0)
-    return buf
+    fixed_dp = dp
+    if dp is None:
+        dp = 4
+        if inst_id:
+            try:
+                dp = get_symbol_decimals(inst_id, c_last)
+            except Exception:
+                dp = 4
+    fmtv = lambda v: fmt_price(inst_id or "", v, fixed_dp)
+
+    tpl = _template(dark)
+    return tpl.render(df, levels, (ema20, ema50, ema200), title, dp, fmtv, show_full_fibo)
 
 
 # ---------- /grafica ----------
@@ -268,9 +328,8 @@ async def grafica_cmd(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
 
     ema20s = ema(df["close"], 20); ema50s = ema(df["close"], 50); ema200s = ema(df["close"], 200)
 
-    # Render en hilo (no bloquea loop)
-    buf = await asyncio.to_thread(
-        plot_chart,
+    # Render en un worker del pool (no bloquea loop); reutiliza PNG si otro chat ya pidió lo mismo
+    buf = await render_pool.render_grafica(
         df,                      # <- usar df ya recortado si precisión ON
         (levels or {}),
         ema20s, ema50s, ema200s,
@@ -306,9 +365,9 @@ async def grafica_cmd(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
         f"ℹ️ Usa /niveles para ver Pivotes y Fibonacci con valores"
     )
 
-    await ctx.bot.send_photo(
-        chat_id=chat_id,
-        photo=InputFile(buf, filename=f"grafica_{st.coin_id.lower()}_15m.png"),
+    await file_ids.send_photo(
+        ctx.bot, chat_id, buf,
+        filename=encoding.filename(f"grafica_{st.coin_id.lower()}_15m", buf.getvalue()),
         caption=caption,
         parse_mode=ParseMode.HTML,
     )
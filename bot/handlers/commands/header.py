@@ -1,17 +1,20 @@
 # bot/handlers/commands/header.py
 from __future__ import annotations
 import io
+import time
 from typing import Tuple, Optional
 
 import pandas as pd
-from telegram import Update, InputFile
+from telegram import Update
 from telegram.ext import ContextTypes, Application
 from telegram.constants import ChatMemberStatus
+from telegram.error import BadRequest
 
 from ...db import repo
 from ...db.models import ChatState
 from ...config import Config
 from ..jobs import get_4h_context, get_15m_oper  # funciones ya existentes
+from ...services import file_ids, render_cache
 
 try:
     from PIL import Image, ImageDraw, ImageFont
@@ -51,16 +54,16 @@ def _day_change_from_15m(df15: pd.DataFrame, latest_price: float, tz_str: str =
     return (last - open_val) / open_val * 100.0
 
 def _render_header(label: str, bg: str, badge_text: Optional[str] = None) -> io.BytesIO:
+    """Header cacheado por contenido (mismo label/color/badge → mismos bytes)."""
+    return render_cache.cached("header", _draw_header, label, bg, badge_text=badge_text)
+
+def _draw_header(label: str, bg: str, badge_text: Optional[str] = None) -> io.BytesIO:
     """1200x220, color sólido, texto centrado y badge en esquina sup. derecha."""
-    buf = io.BytesIO()
     if Image is None:
-        from matplotlib import pyplot as plt
-        import matplotlib
-        matplotlib.use("Agg")
-        fig = plt.figure(figsize=(12, 2.2), dpi=100)
-        plt.axis("off"); plt.text(0.5, 0.5, label, ha="center", va="center")
-        plt.savefig(buf, format="png"); plt.close(fig); buf.seek(0)
-        return buf
+        from ...services.canvas import new_figure, to_png
+        fig = new_figure((12, 2.2), dpi=100)
+        fig.text(0.5, 0.5, label, ha="center", va="center")
+        return to_png(fig)
 
     W, H = 1200, 220
     img = Image.new("RGB", (W, H), color=bg)
@@ -86,32 +89,21 @@ def _render_header(label: str, bg: str, badge_text: Optional[str] = None) -> io.
         draw.rounded_rectangle([x0, y0, x1, y1], radius=14, fill="#111111")
         draw.text((x0 + pad_x, y0 + pad_y), badge_text, fill="#ffffff", font=badge_font)
 
-    img.save(buf, format="PNG"); buf.seek(0)
-    return buf
-
+    from ...services.encoding import encode
+    return io.BytesIO(encode(img, lossless=True, kind="header"))
 
-# ---------- job automático ----------
-async def header_sync_job(ctx: ContextTypes.DEFAULT_TYPE):
-    """
-    Se ejecuta periódicamente por chat.
-    Si la tendencia 4H cambió (o el % diario varió ≥ 0.3 pp), publica y fija un header silencioso.
-    """
-    app = ctx.application
-    chat_id = ctx.job.chat_id if getattr(ctx, "job", None) else None
-    if chat_id is None and getattr(ctx, "job", None) and ctx.job.data:
-        chat_id = ctx.job.data.get("chat_id")
-    if chat_id is None:
-        return
 
-    cfg = app.bot_data["config"]
-    st = await repo.get_chat(cfg.db_path, chat_id) or ChatState(chat_id=chat_id)
+# ---------- publicación (edición in-place) ----------
+_PIN_TTL = 6 * 3600  # permiso de fijado cacheado por chat (get_chat_member es caro y casi nunca cambia)
 
-    # Tendencia
+async def _header_inputs(st: ChatState) -> Optional[Tuple[str, str, str, Optional[str]]]:
+    """(state, color, label, badge_text) o None si no hay contexto 4H."""
     ctx4 = await get_4h_context(st.coin_id, st.symbol_okx)
     if not ctx4:
-        return
+        return None
     trend_up, trend_down = bool(ctx4["trend_up"]), bool(ctx4["trend_down"])
     state = "up" if trend_up else ("down" if trend_down else "side")
+    color, label = _trend_color_and_label(trend_up, trend_down)
 
     # % diario (badge)
     badge_text = None
@@ -123,37 +115,95 @@ async def header_sync_job(ctx: ContextTypes.DEFAULT_TYPE):
                 badge_text = f"{day_chg:+.2f}% hoy"
         except Exception:
             pass
+    return state, color, label, badge_text
 
-    # Evitar publicar si no cambió (tendencia) o badge similar
+def _sig(state: str, badge_text: Optional[str]) -> str:
+    return f"{state}|{badge_text or ''}"
+
+def _badge_val(badge: Optional[str]) -> Optional[float]:
+    try:
+        return float(str(badge).replace("% hoy", "").replace("+", "").strip()) if badge else None
+    except ValueError:
+        return None
+
+def _needs_update(prev_sig: Optional[str], state: str, badge_text: Optional[str]) -> bool:
+    """Cambió la tendencia o el % diario se movió ≥ 0.3 pp respecto al header publicado."""
+    if not prev_sig:
+        return True
+    prev_state, _, prev_badge = prev_sig.partition("|")
+    if prev_state != state:
+        return True
+    last_val, now_val = _badge_val(prev_badge), _badge_val(badge_text)
+    return last_val is not None and now_val is not None and abs(now_val - last_val) >= 0.3
+
+async def _can_pin(app: Application, bot, chat_id: int) -> bool:
     rt = app.bot_data.setdefault("runtime", {})
-    key = ("header_state", chat_id)
-    last = rt.get(key, {"state": None, "badge": None})
-    need_update = (last["state"] != state)
-    if (not need_update) and (badge_text is not None) and (last["badge"] is not None):
+    key = ("header_can_pin", chat_id)
+    hit = rt.get(key)
+    now = time.time()
+    if hit and now - hit[0] < _PIN_TTL:
+        return hit[1]
+    try:
+        me = await bot.get_chat_member(chat_id, bot.id)
+        ok = me.status in (ChatMemberStatus.ADMINISTRATOR, ChatMemberStatus.OWNER)
+    except Exception:
+        ok = False
+    rt[key] = (now, ok)
+    return ok
+
+async def _publish_header(app: Application, bot, chat_id: int, msg_id: Optional[int],
+                          color: str, label: str, badge_text: Optional[str]) -> Optional[int]:
+    """
+    Edita la imagen del header ya fijado (msg_id); si no existe o no se puede editar,
+    envía uno nuevo y lo fija (si hay permisos). Devuelve el message_id vigente.
+    """
+    buf = _render_header(label, color, badge_text=badge_text)
+    if msg_id:
+        try:
+            await file_ids.edit_media(bot.edit_message_media, "document", buf, "header.png",
+                                      chat_id=chat_id, message_id=msg_id)
+            return msg_id
+        except BadRequest as e:
+            if "not modified" in str(e).lower():
+                return msg_id
+            # borrado / demasiado antiguo / no editable → publicar de nuevo
+
+    msg = await file_ids.send_document(bot, chat_id, buf, "header.png", disable_notification=True)
+    if await _can_pin(app, bot, chat_id):
         try:
-            last_val = float(str(last["badge"]).replace("% hoy", "").replace("+", "").strip())
-            now_val = float(str(badge_text).replace("% hoy", "").replace("+", "").strip())
-            if abs(now_val - last_val) >= 0.3:
-                need_update = True
+            await bot.pin_chat_message(chat_id=chat_id, message_id=msg.message_id, disable_notification=True)
         except Exception:
-            pass
+            app.bot_data.setdefault("runtime", {}).pop(("header_can_pin", chat_id), None)
+    return msg.message_id
 
-    if not need_update:
+
+# ---------- job automático ----------
+async def header_sync_job(ctx: ContextTypes.DEFAULT_TYPE):
+    """
+    Se ejecuta periódicamente por chat.
+    Si la tendencia 4H cambió (o el % diario varió ≥ 0.3 pp) edita in-place el header fijado;
+    sin cambios no hace nada (ni render ni llamadas a Telegram).
+    """
+    app = ctx.application
+    chat_id = ctx.job.chat_id if getattr(ctx, "job", None) else None
+    if chat_id is None and getattr(ctx, "job", None) and ctx.job.data:
+        chat_id = ctx.job.data.get("chat_id")
+    if chat_id is None:
         return
 
-    color, label = _trend_color_and_label(trend_up, trend_down)
-    buf = _render_header(label, color, badge_text=badge_text)
-    msg = await ctx.bot.send_document(chat_id=chat_id, document=InputFile(buf, filename="header.png"), disable_notification=True)
+    cfg = app.bot_data["config"]
+    st = await repo.get_chat(cfg.db_path, chat_id) or ChatState(chat_id=chat_id)
 
-    # Fijar si hay permisos
-    try:
-        me = await ctx.bot.get_chat_member(chat_id, ctx.bot.id)
-        if me.status in (ChatMemberStatus.ADMINISTRATOR, ChatMemberStatus.OWNER):
-            await ctx.bot.pin_chat_message(chat_id=chat_id, message_id=msg.message_id, disable_notification=True)
-    except Exception:
-        pass
+    inputs = await _header_inputs(st)
+    if inputs is None:
+        return
+    state, color, label, badge_text = inputs
 
-    rt[key] = {"state": state, "badge": badge_text}
+    if st.header_msg_id and not _needs_update(st.header_sig, state, badge_text):
+        return
+
+    msg_id = await _publish_header(app, ctx.bot, chat_id, st.header_msg_id, color, label, badge_text)
+    await repo.queue_update(cfg.db_path, chat_id, header_msg_id=msg_id, header_sig=_sig(state, badge_text))
 
 def _job_name(chat_id: int) -> str:
     return f"header:{chat_id}"
@@ -187,10 +237,26 @@ def cancel_header_job(app: Application, chat_id: int):
         j.schedule_removal()
     # limpiar estado runtime
     rt = app.bot_data.setdefault("runtime", {})
-    rt.pop(("header_state", chat_id), None)
+    rt.pop(("header_can_pin", chat_id), None)
 
 
 # ---------- comando /header ----------
+async def _post_header_now(update: Update, ctx: ContextTypes.DEFAULT_TYPE, cfg: Config, st: ChatState) -> bool:
+    """Publica un header nuevo (respuesta al comando), lo fija y lo registra para las ediciones del job."""
+    inputs = await _header_inputs(st)
+    if inputs is None:
+        await update.message.reply_text("No pude calcular tendencia ahora.")
+        return False
+    state, color, label, badge_text = inputs
+    buf = _render_header(label, color, badge_text=badge_text)
+    msg = await file_ids.reply_document(update.message, buf, "header.png", disable_notification=True)
+    try:
+        await ctx.bot.pin_chat_message(chat_id=st.chat_id, message_id=msg.message_id, disable_notification=True)
+    except Exception:
+        pass
+    await repo.queue_update(cfg.db_path, st.chat_id, header_msg_id=msg.message_id, header_sig=_sig(state, badge_text))
+    return True
+
 async def header_cmd(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
     """
     /header           → publica una vez y (si puede) fija silencioso.
@@ -210,25 +276,8 @@ async def header_cmd(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
     if arg in ("on", "start", "auto"):
         ensure_header_job(app, chat_id, interval_sec=300)
         # Publicación inmediata
-        ctx4 = await get_4h_context(st.coin_id, st.symbol_okx)
-        if not ctx4:
-            await update.message.reply_text("No pude calcular tendencia ahora.")
+        if not await _post_header_now(update, ctx, cfg, st):
             return
-        trend_up, trend_down = bool(ctx4["trend_up"]), bool(ctx4["trend_down"])
-        color, label = _trend_color_and_label(trend_up, trend_down)
-        # badge
-        badge_text = None
-        op15 = await get_15m_oper(st.coin_id, st.symbol_okx)
-        if op15 and "df" in op15:
-            dc = _day_change_from_15m(op15["df"], latest_price=op15["price"])
-            if dc is not None:
-                badge_text = f"{dc:+.2f}% hoy"
-        buf = _render_header(label, color, badge_text=badge_text)
-        msg = await update.message.reply_document(document=InputFile(buf, filename="header.png"), disable_notification=True)
-        try:
-            await ctx.bot.pin_chat_message(chat_id=chat_id, message_id=msg.message_id, disable_notification=True)
-        except Exception:
-            pass
         await update.message.reply_text("✅ Header auto-sync: <b>ACTIVADO</b>.", parse_mode="HTML")
         return
 
@@ -248,24 +297,8 @@ async def header_cmd(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
         return
 
     # Sin argumentos: publicar una sola vez (no programa auto-sync)
-    ctx4 = await get_4h_context(st.coin_id, st.symbol_okx)
-    if not ctx4:
-        await update.message.reply_text("No pude calcular tendencia ahora.")
+    if not await _post_header_now(update, ctx, cfg, st):
         return
-    trend_up, trend_down = bool(ctx4["trend_up"]), bool(ctx4["trend_down"])
-    color, label = _trend_color_and_label(trend_up, trend_down)
-    badge_text = None
-    op15 = await get_15m_oper(st.coin_id, st.symbol_okx)
-    if op15 and "df" in op15:
-        dc = _day_change_from_15m(op15["df"], latest_price=op15["price"])
-        if dc is not None:
-            badge_text = f"{dc:+.2f}% hoy"
-    buf = _render_header(label, color, badge_text=badge_text)
-    msg = await update.message.reply_document(document=InputFile(buf, filename="header.png"), disable_notification=True)
-    try:
-        await ctx.bot.pin_chat_message(chat_id=chat_id, message_id=msg.message_id, disable_notification=True)
-    except Exception:
-        pass
     await update.message.reply_text("✅ Header actualizado (una vez).", parse_mode="HTML")
 
 
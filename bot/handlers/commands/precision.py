@@ -8,8 +8,6 @@ async def precision_cmd(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
     cfg: Config = ctx.application.bot_data["config"]
     chat_id = update.effective_chat.id
 
-    await repo.ensure_schema(cfg.db_path)
-
     if not ctx.args:
         st = await repo.get_chat(cfg.db_path, chat_id)
         status = "ON" if (st and int(st.precision_on) == 1) else "OFF"
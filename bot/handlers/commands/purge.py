@@ -1,9 +1,10 @@
 from __future__ import annotations
-import asyncio
 from telegram import Update
 from telegram.constants import ParseMode
 from telegram.ext import ContextTypes
 
+from ...services import bulk_delete
+
 async def purge_cmd(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
     chat = update.effective_chat
     msg = update.message
@@ -22,22 +23,32 @@ async def purge_cmd(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
             await msg.reply_text("Necesito permiso de <b>borrar mensajes</b> para usar /purge.", parse_mode=ParseMode.HTML)
             return
 
+    runtime = ctx.application.bot_data.setdefault("runtime", {})
+    if not bulk_delete.begin(runtime, chat.id):
+        await msg.reply_text("Ya hay una limpieza en curso en este chat.")
+        return
+
     start_id = msg.reply_to_message.message_id
-    end_id = msg.message_id
-
-    deleted = 0
-    for mid in range(start_id, end_id + 1):
-        try:
-            await ctx.bot.delete_message(chat.id, mid)
-            deleted += 1
-        except Exception:
-            pass
-        if (mid - start_id) % 25 == 0:
-            await asyncio.sleep(0.08)
-
-    try:
-        await ctx.bot.delete_message(chat.id, msg.message_id)
-    except Exception:
-        pass
-
-    await ctx.bot.send_message(chat.id, f"🧹 Purge: eliminados {deleted} mensajes.")
+    end_id = msg.message_id  # incluye el propio /purge
+
+    def summary(res: bulk_delete.DeleteResult) -> str:
+        head = "🧹 Purge cancelado" if res.cancelled else "🧹 Purge"
+        tail = f" · no permitidos: {res.failed}" if res.failed else ""
+        return f"{head}: {res.processed} ids procesados (los que ya no existían se omiten){tail}."
+
+    # en segundo plano: así el botón de cancelar se atiende mientras borra
+    ctx.application.create_task(
+        bulk_delete.run_with_status(ctx.application, chat.id, range(start_id, end_id + 1),
+                                    "🧹 <b>Purge</b>", summary),
+        update=update,
+    )
+
+
+async def purge_cb(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
+    """Botón ✖️ Cancelar de /purge y /clearchat (/clearbot borra ≤ 5 lotes en línea, sin botón)."""
+    query = update.callback_query
+    runtime = ctx.application.bot_data.setdefault("runtime", {})
+    if (query.data or "") == bulk_delete.CANCEL_DATA and bulk_delete.cancel(runtime, query.message.chat_id):
+        await query.answer("Cancelando…")
+    else:
+        await query.answer("No hay limpieza en curso.")
@@ -1,9 +1,11 @@
 from __future__ import annotations
+import html
 from telegram import Update
 from telegram.ext import ContextTypes
 from ...config import Config
 from ...db import repo
-from ...services.symbols import resolve_okx_symbol_from_cg_id
+from ...services import coinlist, instruments
+from ...services.symbols import resolve_okx_symbol
 
 async def setcoin_cmd(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
     cfg: Config = ctx.application.bot_data["config"]
@@ -14,14 +16,28 @@ async def setcoin_cmd(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
         return
 
     cid = ctx.args[0].strip().lower()
+
+    # 0) validación local (lista de CoinGecko en memoria; sin red). Solo se rechaza con sugerencias
+    #    y lista al día: sin sugerencias (o lista vieja) puede ser un listado reciente → se resuelve en red.
+    idx = coinlist.index()
+    if idx.loaded and not idx.stale and idx.get(cid) is None:
+        options = idx.suggest(cid)
+        if options:
+            lines = "\n".join(f"• <code>/setcoin {c.id}</code> — {html.escape(c.name)} ({html.escape(c.symbol.upper())})" for c in options)
+            text = f"❓ <b>{html.escape(cid)}</b> no es un ID de CoinGecko. ¿Quisiste decir…?\n{lines}"
+            await update.message.reply_text(text, parse_mode="HTML")
+            return
+
     # 1) guardamos el coin_id y reseteamos entrada virtual
-    await repo.update_fields(cfg.db_path, chat_id, coin_id=cid, position_entry=None)
+    await repo.update_fields(cfg.db_path, chat_id, coin_id=cid)
+    await repo.close_position(cfg.db_path, chat_id, None, "reset")
 
     # 2) intentar resolver símbolo OKX automáticamente
-    sym = resolve_okx_symbol_from_cg_id(cid)
+    sym = await resolve_okx_symbol(cid, cfg.db_path)
 
     if sym:
         await repo.update_fields(cfg.db_path, chat_id, symbol_okx=sym)
+        instruments.prefetch_soon(sym)  # tickSz listo antes de la primera gráfica/alerta
         await update.message.reply_text(
             f"✅ CoinGecko ID cambiado a: {cid}\n"
             f"🔎 Símbolo OKX detectado automáticamente: <b>{sym}</b>\n"
@@ -4,7 +4,8 @@ from telegram.ext import ContextTypes
 from ...config import Config
 from ...db import repo
 from ...db.models import ChatState
-from ...services.symbols import resolve_okx_symbol_from_cg_id
+from ...services import instruments
+from ...services.symbols import resolve_okx_symbol
 
 async def setsymbol_cmd(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
     cfg: Config = ctx.application.bot_data["config"]
@@ -19,9 +20,11 @@ async def setsymbol_cmd(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
     if arg.lower() == "auto":
         # reintenta resolver usando el coin_id actual del chat
         st = await repo.get_chat(cfg.db_path, chat_id) or ChatState(chat_id=chat_id)
-        sym = resolve_okx_symbol_from_cg_id(st.coin_id)
+        sym = await resolve_okx_symbol(st.coin_id, cfg.db_path, refresh=True)
         if sym:
-            await repo.update_fields(cfg.db_path, chat_id, symbol_okx=sym, position_entry=None)
+            await repo.update_fields(cfg.db_path, chat_id, symbol_okx=sym)
+            instruments.prefetch_soon(sym)
+            await repo.close_position(cfg.db_path, chat_id, None, "reset")
             await update.message.reply_text(
                 f"🔎 Símbolo OKX detectado: <b>{sym}</b> (posición virtual reiniciada)",
                 parse_mode="HTML",
@@ -36,5 +39,7 @@ async def setsymbol_cmd(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
 
     # set manual
     sym = arg.upper()
-    await repo.update_fields(cfg.db_path, chat_id, symbol_okx=sym, position_entry=None)
+    await repo.update_fields(cfg.db_path, chat_id, symbol_okx=sym)
+    instruments.prefetch_soon(sym)  # tickSz listo antes de la primera gráfica/alerta
+    await repo.close_position(cfg.db_path, chat_id, None, "reset")
     await update.message.reply_text(f"✅ Símbolo OKX cambiado a: {sym} (posición virtual reiniciada)")
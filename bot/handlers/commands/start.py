@@ -46,7 +46,7 @@ async def start_cmd(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
         f"• Tema actual: <b>{theme_txt}</b>  → cambia con <code>/darkmode</code>\n\n"
 
         "🧭 <b>Comandos rápidos</b>\n"
-        "• <code>/estado</code> — panel técnico (imagen)\n"
+        "• <code>/estado</code> — panel técnico (imagen) · <code>/estado live</code> se actualiza solo\n"
         "• <code>/grafica</code> — 15m con Pivotes + F618\n"
         "• <code>/niveles</code> — Pivotes + Fibonacci\n\n"
 
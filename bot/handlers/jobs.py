@@ -5,7 +5,6 @@ import logging
 import time
 from typing import Optional, Dict
 
-import numpy as np
 import pandas as pd
 from telegram.ext import ContextTypes, Application
 
@@ -16,23 +15,28 @@ from ..db.models import ChatState
 from ..services.market import okx_klines, cg_prices_df
 from ..services.indicators import ema, rsi, macd
 from ..services.levels import get_levels
-from ..services.plotting import plot_chart
 from ..services.formatting import fmt_price
+from ..services import file_ids, render_pool, signals
+from ..services.signals import Settings, SignalState
+from ..services.outbox import ALERT, TEXT, IMAGE
 
 log = logging.getLogger("jobs")
 
-async def send_text(ctx: ContextTypes.DEFAULT_TYPE, chat_id: int, text: str):
+# Con la cola de salida activa (app.bot_data["outbox"]) solo se encola: el heartbeat no espera a Telegram.
+# `key`: un aviso pendiente con la misma clave en ese chat se reemplaza por el nuevo.
+async def send_text(ctx: ContextTypes.DEFAULT_TYPE, chat_id: int, text: str, prio: int = TEXT, key: Optional[str] = None):
+    outbox = ctx.application.bot_data.get("outbox")
+    if outbox is not None:
+        outbox.text(chat_id, text, prio=prio, key=key)
+        return
     await ctx.bot.send_message(chat_id=chat_id, text=text)
 
-async def send_photo(ctx: ContextTypes.DEFAULT_TYPE, chat_id: int, buf: io.BytesIO, caption: str):
-    await ctx.bot.send_photo(chat_id=chat_id, photo=buf, caption=caption)
-
-def modo_params(modo: str) -> Dict[str, float]:
-    if modo == "agresivo":
-        return {"pre_break_buffer": 0.006, "rsi_buy": 35, "rsi_sell": 65}
-    if modo == "conservador":
-        return {"pre_break_buffer": 0.003, "rsi_buy": 30, "rsi_sell": 70}
-    return {"pre_break_buffer": 0.004, "rsi_buy": 33, "rsi_sell": 67}
+async def send_photo(ctx: ContextTypes.DEFAULT_TYPE, chat_id: int, buf: io.BytesIO, caption: str, key: Optional[str] = "plot"):
+    outbox = ctx.application.bot_data.get("outbox")
+    if outbox is not None:
+        outbox.photo(chat_id, buf, caption=caption, prio=IMAGE, key=key)
+        return
+    await file_ids.send_photo(ctx.bot, chat_id, buf, caption=caption)
 
 async def get_4h_context(coin_id: str, symbol_okx: str) -> Optional[Dict]:
     df_15 = await okx_klines(symbol_okx, "15m", 400)
@@ -139,146 +143,53 @@ async def heartbeat_job(ctx: ContextTypes.DEFAULT_TYPE):
     # Precision desde BD (NO desde bot_data)
     precision_on: bool = bool(getattr(st, "precision_on", 0))
 
-    # ===== Indicadores (15m) =====
+    # ===== Señales (motor puro: services/signals) =====
     df15 = op15["df"]
-    close15 = df15["close"]
-    idx_c = -2 if len(close15) >= 2 and precision_on else -1
-
-    price15_c = float(close15.iloc[idx_c])
-    rsi15_series = rsi(close15, 14)
-    rsi15_c = float(rsi15_series.iloc[idx_c])
-    rsi15_prev = float(rsi15_series.iloc[idx_c - 1]) if len(rsi15_series) >= 2 else rsi15_c
-    m15, s15, h15 = macd(close15)
-    macd15_up_c = bool(m15.iloc[idx_c] > s15.iloc[idx_c])
-    hist15_grows = bool(h15.iloc[idx_c] > h15.iloc[idx_c - 1]) if len(h15) >= 2 else False
-    ema20_series = ema(close15, 20); ema50_series = ema(close15, 50); ema200_series = ema(close15, 200)
-    ema20_c = float(ema20_series.iloc[idx_c]); ema50_c = float(ema50_series.iloc[idx_c]); ema200_c = float(ema200_series.iloc[idx_c])
-
-    # 5m
-    df5 = ex5["df"]
-    close5 = df5["close"] if "close" in df5 else df5.iloc[:, -1]
-    idx5_c = -2 if len(close5) >= 2 and precision_on else -1
-    m5, s5, h5 = macd(close5)
-    macd5_up_c = bool(m5.iloc[idx5_c] > s5.iloc[idx5_c])
-    rsi5_series = rsi(close5, 14); rsi5_c = float(rsi5_series.iloc[idx5_c])
-
-    # 4H filtro extra si precisión
-    rsi4 = float(ctx4["rsi"])
-    e4_20 = float(ctx4.get("ema20", 0.0)); e4_50 = float(ctx4.get("ema50", 0.0)); e4_200 = float(ctx4.get("ema200", 0.0))
-    trend_up_strict = (rsi4 > 52.0) and (e4_20 > e4_50 > e4_200)
-
-    # Fibo 0.618
-    f618 = levels.get("F618") if levels else None
-    fib_ok = True
-    if precision_on and f618:
-        low15_c = float(df15["low"].iloc[idx_c]) if "low" in df15.columns else price15_c
-        prev_close = float(close15.iloc[idx_c - 1]) if len(close15) >= 2 else price15_c
-        breakout = (prev_close < f618) and (price15_c >= f618 * (1 + 0.0005))
-        retest   = (price15_c >= f618) and (low15_c <= f618 * (1 + 0.0010))
-        fib_ok = bool(breakout or retest)
-
-    # Cooldown por velas 15m
-    rt = app.bot_data.setdefault("runtime", {})
-    last_entry_bar = rt.get(("last_entry_bar15", chat_id))
-    enough_cooldown = True
-    if precision_on and last_entry_bar is not None:
-        try:
-            idx_last = df15.index[df15["time"] == last_entry_bar][0]
-            idx_now  = df15.index[-1 if idx_c == -1 else -2]
-            enough_cooldown = (idx_now - idx_last) >= 6  # ~90 min
-        except Exception:
-            enough_cooldown = True
-
-    # ===== Entrada =====
-    mp = modo_params(st.modo)
-    if precision_on:
-        thresh = max(40.0, mp["rsi_buy"])
-        rsi_cross_up = (rsi15_prev < thresh) and (rsi15_c >= (thresh + 0.8))
-        entry_signal = (
-            trend_up_strict
-            and (price15_c > ema20_c) and (ema20_c > ema50_c)
-            and macd15_up_c and hist15_grows
-            and rsi15_c > 45.0 and rsi_cross_up
-            and macd5_up_c and (rsi5_c > 50.0)
-            and fib_ok and enough_cooldown
-        )
-    else:
-        trend_up = bool(ctx4["trend_up"])
-        rsi15_now = float(op15["rsi"]); macd15u = bool(op15["macd_up"])
-        rsi5_now = float(ex5["rsi"]); macd5u = bool(ex5["macd_up"])
-        ema20_val = float(op15["ema20"]); price_now = float(op15["price"])
-        entry_signal = trend_up and (rsi15_now < max(40, mp["rsi_buy"])) and macd15u and (price_now > ema20_val) and macd5u and (rsi5_now > 45)
-
-    if st.position_entry is None and entry_signal:
-        st.position_entry = price15_c if precision_on else float(op15["price"])
-        await repo.update_fields(cfg.db_path, chat_id, position_entry=st.position_entry)
-        try:
-            rt[("last_entry_bar15", chat_id)] = df15["time"].iloc[idx_c]
-        except Exception:
-            pass
-        await send_text(
-            ctx, chat_id,
-            (f"🟢 ENTRADA (virtual) {st.coin_id.upper()} — TF 4H/15M/5M\n"
-             f"Precio: ${fmt_price(st.symbol_okx, st.position_entry)}\n"
-             f"Confluencias: "
-             f"{'4H EMA20>50>200 · ' if precision_on else ''}"
-             f"15M MACD↑{' hist↑ ·' if precision_on else ' ·'} RSI ok · 5M MACD↑ "
-             f"{'· F618 OK' if precision_on else ''}")
-        )
-
-    # ===== Gestión TP/SL/Trailing =====
-    peak_map = rt.setdefault(("peak",), {})
-    peak = peak_map.get(chat_id)
-
-    if st.position_entry is not None:
-        price_now = price15_c if precision_on else float(op15["price"])
-        pe = st.position_entry
-        if peak is None or price_now > peak:
-            peak = price_now; peak_map[chat_id] = peak
-
-        gain = (price_now - pe) / max(pe, 1e-12)
-        tp = st.tp_pct / 100.0; sl = st.sl_pct / 100.0
-
-        if gain >= tp:
-            await send_text(ctx, chat_id, f"🏆 TP +{gain*100:.2f}% — VENDER {st.coin_id.upper()} ahora. Precio ${fmt_price(st.symbol_okx, price_now)}")
-            st.position_entry = None; peak_map.pop(chat_id, None)
-            await repo.update_fields(cfg.db_path, chat_id, position_entry=None)
-        elif gain <= -sl:
-            await send_text(ctx, chat_id, f"🔻 SL {gain*100:.2f}% — SALIR YA de {st.coin_id.upper()}. Precio ${fmt_price(st.symbol_okx, price_now)}")
-            st.position_entry = None; peak_map.pop(chat_id, None)
-            await repo.update_fields(cfg.db_path, chat_id, position_entry=None)
-        else:
-            if gain >= 0.01 and peak:
-                dd = (peak - price_now) / peak
-                if dd >= 0.008:
-                    await send_text(ctx, chat_id, f"🛡️ Trailing activado (drawdown {dd*100:.2f}%) — salir de {st.coin_id.upper()}. Precio ${fmt_price(st.symbol_okx, price_now)}")
-                    st.position_entry = None; peak_map.pop(chat_id, None)
-                    await repo.update_fields(cfg.db_path, chat_id, position_entry=None)
-
-            weak_exit = (not macd5_up_c) and (price15_c < ema20_c) if precision_on else (not bool(ex5["macd_up"])) and (float(op15["price"]) < float(op15["ema20"]))
-            if weak_exit and gain > 0:
-                await send_text(ctx, chat_id, f"⚠️ Debilidad intradía — MACD 5m↓ y precio < EMA20 15m. Considera salir (+{gain*100:.2f}%).")
-
-    # ===== Peligro (S1/S2) =====
-    danger_condition = False
-    if levels:
-        pre_buf = modo_params(st.modo)["pre_break_buffer"]
-        price_chk = price15_c if precision_on else float(op15["price"])
-        def near(level: float) -> bool:
-            return abs(price_chk - level) / max(level, 1e-9) <= pre_buf and price_chk <= level * (1 + pre_buf)
-        rsi15_now = rsi15_c if precision_on else float(op15["rsi"])
-        macd15_now_up = macd15_up_c if precision_on else bool(op15["macd_up"])
-        macd5_now_up  = macd5_up_c if precision_on else bool(ex5["macd_up"])
-        ema20_now = ema20_c if precision_on else float(op15["ema20"])
-        bearish_confluence = (rsi15_now < 45) and (not macd15_now_up) and (price_chk < ema20_now) and (not macd5_now_up)
-        near_s = any((k in levels) and np.isfinite(levels[k]) and near(levels[k]) for k in ("S1","S2"))
-        danger_condition = bearish_confluence and near_s
-        if danger_condition:
-            try:
-                tgt = min(("S1","S2"), key=lambda k: abs(price_chk - levels[k]) if k in levels and np.isfinite(levels[k]) else float("inf"))
-            except Exception:
-                tgt = "S1"
-            await send_text(ctx, chat_id, f"⚠️ PELIGRO: {st.coin_id.upper()} muy cerca de {tgt} ${fmt_price(st.symbol_okx, levels.get(tgt))} (15M bajista y 5M sin confirmación). ➡️ SELL NOW.")
+    state = SignalState(
+        position_entry=st.position_entry,
+        peak=st.peak,
+        last_entry_bar=None if st.last_entry_bar is None else pd.Timestamp(st.last_entry_bar, unit="s"),
+    )
+    feats = signals.snapshot(df15, ex5["df"], ctx4, levels, precision_on)
+    ev = signals.evaluate(feats, Settings.from_chat(st), state, bar=signals.bar_time(df15, precision_on))
+    coin = st.coin_id.upper()
+
+    for d in ev.decisions:
+        if d.kind == "entry":
+            await repo.open_position(cfg.db_path, chat_id, st.coin_id, st.symbol_okx, d.price)
+            await send_text(
+                ctx, chat_id,
+                (f"🟢 ENTRADA (virtual) {coin} — TF 4H/15M/5M\n"
+                 f"Precio: ${fmt_price(st.symbol_okx, d.price)}\n"
+                 f"Confluencias: "
+                 f"{'4H EMA20>50>200 · ' if precision_on else ''}"
+                 f"15M MACD↑{' hist↑ ·' if precision_on else ' ·'} RSI ok · 5M MACD↑ "
+                 f"{'· F618 OK' if precision_on else ''}"),
+                prio=ALERT,
+            )
+        elif d.kind == "tp":
+            await send_text(ctx, chat_id, f"🏆 TP +{d.gain*100:.2f}% — VENDER {coin} ahora. Precio ${fmt_price(st.symbol_okx, d.price)}", prio=ALERT)
+        elif d.kind == "sl":
+            await send_text(ctx, chat_id, f"🔻 SL {d.gain*100:.2f}% — SALIR YA de {coin}. Precio ${fmt_price(st.symbol_okx, d.price)}", prio=ALERT)
+        elif d.kind == "trailing":
+            await send_text(ctx, chat_id, f"🛡️ Trailing activado (drawdown {d.drawdown*100:.2f}%) — salir de {coin}. Precio ${fmt_price(st.symbol_okx, d.price)}", prio=ALERT)
+        elif d.kind == "weak":
+            await send_text(ctx, chat_id, f"⚠️ Debilidad intradía — MACD 5m↓ y precio < EMA20 15m. Considera salir (+{d.gain*100:.2f}%).", key="weak")
+        elif d.kind == "danger":
+            await send_text(ctx, chat_id, f"⚠️ PELIGRO: {coin} muy cerca de {d.level} ${fmt_price(st.symbol_okx, levels.get(d.level))} (15M bajista y 5M sin confirmación). ➡️ SELL NOW.", prio=ALERT, key="danger")
+        if d.closes:
+            await repo.close_position(cfg.db_path, chat_id, d.price, d.kind)
+
+    # estado siguiente: pico y última entrada por la cola write-behind (coalescido; sobrevive a reinicios)
+    st.position_entry = ev.state.position_entry
+    nxt = {
+        "peak": ev.state.peak,
+        "last_entry_bar": None if ev.state.last_entry_bar is None else ev.state.last_entry_bar.timestamp(),
+    }
+    changed = {k: v for k, v in nxt.items() if getattr(st, k) != v}
+    if changed:
+        await repo.queue_update(cfg.db_path, chat_id, **changed)
+    danger_condition = ev.danger
 
     # ===== Imagen con cooldown =====
     ps = app.bot_data.setdefault("runtime", {}).setdefault(("plot_state", chat_id), {"last_plot_ts": 0})
@@ -292,8 +203,8 @@ async def heartbeat_job(ctx: ContextTypes.DEFAULT_TYPE):
         try:
             df = op15["df"]
             ema20s = ema(df["close"],20); ema50s=ema(df["close"],50); ema200s=ema(df["close"],200)
-            buf = await asyncio.to_thread(
-                plot_chart, df, (levels or {}), ema20s, ema50s, ema200s,
+            buf = await render_pool.render_plot15(
+                df, (levels or {}), ema20s, ema50s, ema200s,
                 title=f"{st.coin_id.upper()} — 15M con Niveles & EMAs",
                 inst_id=st.symbol_okx,
             )
@@ -306,8 +217,8 @@ async def heartbeat_job(ctx: ContextTypes.DEFAULT_TYPE):
         try:
             df = op15["df"]
             ema20s = ema(df["close"],20); ema50s=ema(df["close"],50); ema200s=ema(df["close"],200)
-            buf = await asyncio.to_thread(
-                plot_chart, df, (levels or {}), ema20s, ema50s, ema200s,
+            buf = await render_pool.render_plot15(
+                df, (levels or {}), ema20s, ema50s, ema200s,
                 title=f"{st.coin_id.upper()} — 15M con Niveles & EMAs",
                 inst_id=st.symbol_okx,
             )
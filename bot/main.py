@@ -10,7 +10,7 @@ from .utils.warnings import silence_pkg_resources_warning
 from .config import Config
 from .tz_guard import ensure_apscheduler_tz_compat
 from .db import repo
-from .app import build_app
+from .app import build_app, webhook_params
 
 def main() -> None:
     # Logging + env
@@ -24,7 +24,7 @@ def main() -> None:
     # Config
     cfg = Config.from_env()
 
-    # Esquema/migración de BD (incluye precision_on)
+    # Esquema/migración de BD (versionada; una sola vez al arrancar)
     asyncio.run(repo.ensure_schema(cfg.db_path))
 
     # Construir app
@@ -35,8 +35,11 @@ def main() -> None:
     if sys.platform.startswith("win") and hasattr(asyncio, "WindowsSelectorEventLoopPolicy"):
         asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
 
-    # Ejecutar (bloqueante)
-    app.run_polling(drop_pending_updates=True)
+    # Ejecutar (bloqueante): webhook si hay WEBHOOK_URL, si no long-polling
+    if cfg.use_webhook:
+        app.run_webhook(**webhook_params(cfg))
+    else:
+        app.run_polling(drop_pending_updates=True)
 
 if __name__ == "__main__":
     main()
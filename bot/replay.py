@@ -0,0 +1,503 @@
+# bot/replay.py
+"""
+Replay acelerado de mercado para pruebas de carga y de regresión.
+
+Reproduce velas grabadas (CSV time,open,high,low,close, p.ej. de `bot.services.backtest --cache`)
+a través de los jobs reales (heartbeat_job y header_sync_job) a N× velocidad:
+  - market/levels → ReplaySource (velas hasta el instante simulado, la última en formación)
+  - Telegram → RecordingBot (registra cada llamada, sin red)
+  - time.time() de los jobs → reloj simulado (cooldowns de imágenes/permiso en tiempo de mercado)
+
+    python -m bot.replay WIF-USDT=wif5m.csv BTC-USDT=btc5m.csv --chats 200 --hours 24 --speed 0 --record run.jsonl
+
+Informa de alertas emitidas, latencia por tick/job, throughput y una huella (sha256) del log de
+mensajes: dos ejecuciones con el mismo input deben dar la misma huella (comprobar que un cambio de
+rendimiento no altera el comportamiento).
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import contextlib
+import hashlib
+import io
+import json
+import logging
+import os
+import statistics
+import tempfile
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .db import repo
+from .db.models import ChatState
+from .handlers import jobs
+from .handlers.commands import header
+from .services import levels as levels_mod, render_pool
+from .services.outbox import Outbox
+
+log = logging.getLogger("replay")
+
+OHLC = {"open": "first", "high": "max", "low": "min", "close": "last"}
+BARS = {"1m": "1min", "3m": "3min", "5m": "5min", "15m": "15min", "30m": "30min",
+        "1H": "1h", "2H": "2h", "4H": "4h", "1D": "1D"}
+OKX_MAX = 300  # velas por petición en /market/candles
+
+# prefijo del texto → tipo de alerta (mensajes de jobs.heartbeat_job)
+ALERT_KINDS = (
+    ("🟢 ENTRADA", "entry"), ("🏆 TP", "tp"), ("🔻 SL", "sl"), ("🛡️ Trailing", "trailing"),
+    ("⚠️ Debilidad", "weak"), ("⚠️ PELIGRO", "danger"),
+)
+
+
+def _pct(xs: Sequence[float], q: float) -> float:
+    return float(np.percentile(xs, q)) if len(xs) else 0.0
+
+
+# ---------------- fuente de mercado ----------------
+class ReplaySource:
+    """
+    Velas grabadas por símbolo, servidas como si fuera `now`: solo velas base ya cerradas
+    (open + paso ≤ now) y, por encima, la vela del timeframe pedido en formación.
+    Resultados memorizados por tick (muchos chats comparten símbolo); tratarlos como solo lectura.
+    """
+
+    def __init__(self, frames: Dict[str, pd.DataFrame]):
+        self._base: Dict[str, Tuple[np.ndarray, ...]] = {}
+        self._step: Dict[str, int] = {}
+        for sym, df in frames.items():
+            df = df.sort_values("time").drop_duplicates("time")
+            t = pd.to_datetime(df["time"]).to_numpy(dtype="datetime64[ns]").view("int64")
+            self._base[sym.upper()] = (t,) + tuple(df[c].to_numpy(dtype=float) for c in ("open", "high", "low", "close"))
+            self._step[sym.upper()] = int(np.median(np.diff(t))) if len(t) > 1 else 60_000_000_000
+        self._agg: Dict[Tuple[str, str], Tuple[np.ndarray, ...]] = {}
+        self._memo: Dict[Tuple, Any] = {}
+        self.now = pd.Timestamp(min(v[0][0] for v in self._base.values()))
+        self.calls: Counter = Counter()
+
+    @property
+    def symbols(self) -> List[str]:
+        return list(self._base)
+
+    def span(self) -> Tuple[pd.Timestamp, pd.Timestamp]:
+        """Intervalo común a todos los símbolos."""
+        lo = max(v[0][0] for v in self._base.values())
+        hi = min(v[0][-1] + self._step[s] for s, v in self._base.items())
+        return pd.Timestamp(lo), pd.Timestamp(hi)
+
+    def set_time(self, now: pd.Timestamp) -> None:
+        self.now = pd.Timestamp(now)
+        self._memo.clear()
+
+    def _aggregate(self, sym: str, bar: str) -> Tuple[np.ndarray, ...]:
+        key = (sym, bar)
+        if key not in self._agg:
+            t, o, h, l, c = self._base[sym]
+            df = pd.DataFrame({"open": o, "high": h, "low": l, "close": c}, index=pd.to_datetime(t))
+            a = df.resample(BARS[bar]).agg(OHLC).dropna()
+            self._agg[key] = (a.index.to_numpy(dtype="datetime64[ns]").view("int64"),) + \
+                tuple(a[k].to_numpy() for k in ("open", "high", "low", "close"))
+        return self._agg[key]
+
+    def candles(self, symbol: str, bar: str = "15m", limit: int = 200) -> Optional[pd.DataFrame]:
+        sym = (symbol or "").upper()
+        key = (sym, bar, limit)
+        if key in self._memo:
+            return self._memo[key]
+        self.calls[bar] += 1
+        out = None
+        if sym in self._base and bar in BARS:
+            out = self._candles(sym, bar, min(int(limit), OKX_MAX))
+        self._memo[key] = out
+        return out
+
+    def _candles(self, sym: str, bar: str, limit: int) -> Optional[pd.DataFrame]:
+        t, o, h, l, c = self._base[sym]
+        step = self._step[sym]
+        bar_ns = pd.Timedelta(BARS[bar]).value
+        if bar_ns < step:
+            return None
+        known = int(np.searchsorted(t, self.now.value - step, side="right"))
+        if known == 0:
+            return None
+        last = t[known - 1]
+        cur = last - (last % bar_ns)
+        i0 = int(np.searchsorted(t, cur, side="left"))
+        at, ao, ah, al, ac = self._aggregate(sym, bar)
+        j = int(np.searchsorted(at, cur, side="left"))
+        j0 = max(0, j - (limit - 1))
+        return pd.DataFrame({
+            "time": pd.to_datetime(np.append(at[j0:j], cur)),
+            "open": np.append(ao[j0:j], o[i0]),
+            "high": np.append(ah[j0:j], h[i0:known].max()),
+            "low": np.append(al[j0:j], l[i0:known].min()),
+            "close": np.append(ac[j0:j], c[known - 1]),
+        })
+
+    def levels(self, symbol: str) -> Optional[Dict[str, float]]:
+        """Pivotes + Fibonacci del último día UTC cerrado (como levels.get_levels, con las velas grabadas)."""
+        sym = (symbol or "").upper()
+        key = ("levels", sym, self.now.normalize())
+        if key in self._memo:
+            return self._memo[key]
+        out = None
+        if sym in self._base:
+            at, ao, ah, al, ac = self._aggregate(sym, "1D")
+            j = int(np.searchsorted(at, self.now.normalize().value, side="left")) - 1
+            if j >= 0:
+                row = SimpleNamespace(high=ah[j], low=al[j], close=ac[j])
+                out = levels_mod._pivots_from_row(row)
+                diff = max(ah[j] - al[j], 1e-12)
+                out.update({f"F{int(r * 1000)}": ah[j] - r * diff for r in (0.236, 0.382, 0.5, 0.618, 0.786)})
+        self._memo[key] = out
+        return out
+
+    # --- mismas firmas que los servicios reales ---
+    async def okx_klines(self, symbol: str, bar: str = "15m", limit: int = 200) -> Optional[pd.DataFrame]:
+        return self.candles(symbol, bar, limit)
+
+    async def cg_prices_df(self, coin_id: str, days: int) -> Optional[pd.DataFrame]:
+        return None  # en replay no hay CoinGecko: los jobs usan siempre las velas OKX grabadas
+
+    async def get_levels(self, coin_id: str, symbol_okx: Optional[str] = None) -> Optional[Dict[str, float]]:
+        return self.levels(symbol_okx or "")
+
+
+# ---------------- Telegram falso ----------------
+@dataclass
+class Sent:
+    at: pd.Timestamp
+    chat_id: Optional[int]
+    method: str
+    text: Optional[str] = None
+
+    def line(self) -> str:
+        return json.dumps({"t": str(self.at), "chat": self.chat_id, "m": self.method, "text": self.text},
+                          ensure_ascii=False, sort_keys=True)
+
+class RecordingBot:
+    """Bot de Telegram en memoria: registra cada llamada y responde como la API (message_id, file_id)."""
+    id = 0
+
+    def __init__(self, clock: Callable[[], pd.Timestamp], latency: float = 0.0):
+        self.clock = clock
+        self.latency = float(latency)
+        self.log: List[Sent] = []
+        self.calls: Counter = Counter()
+        self._ids = 1000
+
+    async def _rec(self, method: str, chat_id: Optional[int], text: Optional[str] = None) -> int:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        self.calls[method] += 1
+        self.log.append(Sent(self.clock(), chat_id, method, text))
+        self._ids += 1
+        return self._ids
+
+    async def send_message(self, chat_id: int, text: str, **kw):
+        return SimpleNamespace(message_id=await self._rec("send_message", chat_id, text))
+
+    async def send_photo(self, chat_id: int, photo: Any = None, caption: Optional[str] = None, **kw):
+        mid = await self._rec("send_photo", chat_id, caption)
+        return SimpleNamespace(message_id=mid, photo=[SimpleNamespace(file_id=f"photo-{mid}")])
+
+    async def send_document(self, chat_id: int, document: Any = None, caption: Optional[str] = None, **kw):
+        mid = await self._rec("send_document", chat_id, caption)
+        return SimpleNamespace(message_id=mid, document=SimpleNamespace(file_id=f"doc-{mid}"))
+
+    async def edit_message_media(self, media: Any = None, chat_id: Optional[int] = None, message_id: Optional[int] = None, **kw):
+        await self._rec("edit_message_media", chat_id)
+        return True
+
+    async def get_chat_member(self, chat_id: int, user_id: int, **kw):
+        await self._rec("get_chat_member", chat_id)
+        return SimpleNamespace(status="administrator")
+
+    async def pin_chat_message(self, chat_id: int, message_id: int, **kw):
+        await self._rec("pin_chat_message", chat_id)
+        return True
+
+    def __getattr__(self, name: str):
+        # cualquier otro método de la API: se registra y "funciona"
+        if name.startswith("_"):
+            raise AttributeError(name)
+        async def call(*args, chat_id: Optional[int] = None, **kw):
+            await self._rec(name, chat_id if chat_id is not None else (args[0] if args else None))
+            return True
+        return call
+
+    def alerts(self) -> Counter:
+        out: Counter = Counter()
+        for s in self.log:
+            if s.method == "send_message" and s.text:
+                out[next((k for p, k in ALERT_KINDS if s.text.startswith(p)), "other")] += 1
+            elif s.method == "send_photo":
+                out["plot"] += 1
+        return out
+
+    def digest(self) -> str:
+        # orden estable: instante simulado y chat (dentro de un chat el orden de llegada se conserva)
+        lines = [s.line() for s in sorted(self.log, key=lambda s: (s.at, s.chat_id or 0))]
+        return hashlib.sha256("\n".join(lines).encode()).hexdigest()
+
+
+# ---------------- parches ----------------
+class _SimTime:
+    """Sustituto del módulo time en los jobs: time() es el reloj simulado; lo demás, el real."""
+
+    def __init__(self, source: ReplaySource):
+        self._source = source
+
+    def time(self) -> float:
+        return self._source.now.timestamp()
+
+    def __getattr__(self, name: str):
+        return getattr(time, name)
+
+async def _blank_plot(*args, **kwargs) -> io.BytesIO:
+    return io.BytesIO(b"\x89PNG replay")
+
+@contextlib.contextmanager
+def patched(source: ReplaySource, render: bool = True) -> Iterator[None]:
+    """Sustituye mercado, niveles y reloj de los jobs (y opcionalmente el render) durante el replay."""
+    saved: List[Tuple[Any, str, Any]] = []
+
+    def swap(obj: Any, name: str, value: Any) -> None:
+        saved.append((obj, name, getattr(obj, name)))
+        setattr(obj, name, value)
+
+    clock = _SimTime(source)
+    swap(jobs, "okx_klines", source.okx_klines)
+    swap(jobs, "cg_prices_df", source.cg_prices_df)
+    swap(jobs, "get_levels", source.get_levels)
+    swap(jobs, "time", clock)
+    swap(header, "time", clock)
+    if not render:
+        swap(render_pool, "render_plot15", _blank_plot)
+    try:
+        yield
+    finally:
+        for obj, name, value in reversed(saved):
+            setattr(obj, name, value)
+
+
+# ---------------- ejecución ----------------
+@dataclass
+class ReplayReport:
+    start: pd.Timestamp
+    end: pd.Timestamp
+    chats: int
+    ticks: int = 0
+    jobs: int = 0
+    errors: int = 0
+    overruns: int = 0
+    wall: float = 0.0
+    tick_ms: List[float] = field(default_factory=list, repr=False)
+    job_ms: List[float] = field(default_factory=list, repr=False)
+    alerts: Dict[str, int] = field(default_factory=dict)
+    calls: Dict[str, int] = field(default_factory=dict)
+    fetches: Dict[str, int] = field(default_factory=dict)
+    digest: str = ""
+    poll_sec: int = 60
+
+    @property
+    def sim_seconds(self) -> float:
+        return (self.end - self.start).total_seconds()
+
+    def summary(self) -> Dict[str, Any]:
+        mean_tick = statistics.fmean(self.tick_ms) / 1000.0 if self.tick_ms else 0.0
+        return {
+            "sim": f"{self.start} → {self.end}",
+            "chats": self.chats,
+            "ticks": self.ticks,
+            "jobs": self.jobs,
+            "errors": self.errors,
+            "wall_s": round(self.wall, 2),
+            "speed_x": round(self.sim_seconds / self.wall, 1) if self.wall else 0.0,
+            "jobs_per_s": round(self.jobs / self.wall, 1) if self.wall else 0.0,
+            "tick_ms_p50": round(_pct(self.tick_ms, 50), 1),
+            "tick_ms_p95": round(_pct(self.tick_ms, 95), 1),
+            "tick_ms_max": round(max(self.tick_ms, default=0.0), 1),
+            "job_ms_p50": round(_pct(self.job_ms, 50), 2),
+            "job_ms_p95": round(_pct(self.job_ms, 95), 2),
+            "job_ms_p99": round(_pct(self.job_ms, 99), 2),
+            "overruns": self.overruns,
+            # extrapolación lineal: chats cuyo tick completo cabe en POLL_SEC en tiempo real
+            "est_max_chats": int(self.chats * self.poll_sec / mean_tick) if mean_tick else 0,
+            "alerts": dict(sorted(self.alerts.items())),
+            "calls": dict(sorted(self.calls.items())),
+            "fetches": dict(sorted(self.fetches.items())),
+            "digest": self.digest[:16],
+        }
+
+    def text(self) -> str:
+        return "\n".join(f"  {k:>14}: {v}" for k, v in self.summary().items())
+
+
+class Replay:
+    """
+    Ejecuta `chats` chats (símbolos, modos y precisión repartidos) sobre una ReplaySource.
+    speed: N× tiempo real (sim POLL_SEC cada POLL_SEC/N s de reloj); 0 = lo más rápido posible.
+    """
+
+    def __init__(self, source: ReplaySource, chats: int = 50, speed: float = 0.0, poll_sec: int = 60,
+                 header_sec: int = 300, start: Optional[pd.Timestamp] = None, end: Optional[pd.Timestamp] = None,
+                 db_path: Optional[str] = None, outbox: bool = False, render: bool = True,
+                 latency: float = 0.0, warmup: pd.Timedelta = pd.Timedelta(days=4)):
+        lo, hi = source.span()
+        self.source = source
+        self.chats = max(1, int(chats))
+        self.speed = float(speed)
+        self.poll_sec = int(poll_sec)
+        self.header_sec = int(header_sec)
+        # por defecto: tras `warmup` (300 velas de 15m ≈ 3 días + niveles del día anterior)
+        self.start = pd.Timestamp(start) if start is not None else lo + warmup
+        self.end = min(pd.Timestamp(end), hi) if end is not None else hi
+        self.db_path = db_path
+        self.use_outbox = outbox
+        self.render = render
+        self.bot = RecordingBot(lambda: self.source.now, latency=latency)
+
+    async def _setup_chats(self, db_path: str) -> List[int]:
+        syms = self.source.symbols
+        modos = ("agresivo", "balanceado", "conservador")
+        ids = []
+        for i in range(self.chats):
+            sym = syms[i % len(syms)]
+            st = ChatState(chat_id=i + 1, coin_id=sym.split("-")[0].lower(), symbol_okx=sym,
+                           modo=modos[(i // len(syms)) % 3], precision_on=(i // (3 * len(syms))) % 2, alerts_on=1)
+            await repo.upsert_chat(db_path, st)
+            ids.append(st.chat_id)
+        return ids
+
+    async def _timed(self, fn, ctx, rep: ReplayReport) -> None:
+        t0 = time.perf_counter()
+        try:
+            await fn(ctx)
+        except Exception as e:
+            rep.errors += 1
+            if rep.errors <= 5:
+                log.exception("job %s (chat %s): %s", fn.__name__, ctx.job.chat_id, e)
+        rep.job_ms.append((time.perf_counter() - t0) * 1000.0)
+
+    async def run(self, progress_every: float = 10.0) -> ReplayReport:
+        if self.start >= self.end:
+            raise ValueError(f"sin datos que reproducir ({self.start} ≥ {self.end})")
+        tmp = None
+        db_path = self.db_path
+        if db_path is None:
+            tmp = tempfile.TemporaryDirectory(prefix="replay-")
+            db_path = os.path.join(tmp.name, "replay.db")
+        await repo.ensure_schema(db_path)
+        chat_ids = await self._setup_chats(db_path)
+
+        app = SimpleNamespace(bot=self.bot, bot_data={
+            "config": SimpleNamespace(db_path=db_path, poll_sec=self.poll_sec), "runtime": {}})
+        if self.use_outbox:
+            app.bot_data["outbox"] = Outbox(self.bot).start()
+        ctxs = [SimpleNamespace(application=app, bot=self.bot,
+                                job=SimpleNamespace(chat_id=cid, data={"chat_id": cid}))
+                for cid in chat_ids]
+
+        rep = ReplayReport(start=self.start, end=self.end, chats=len(chat_ids), poll_sec=self.poll_sec)
+        step = pd.Timedelta(seconds=self.poll_sec)
+        budget = self.poll_sec / self.speed if self.speed > 0 else 0.0
+        next_header = self.start
+        wall0 = last_log = time.perf_counter()
+        try:
+            with patched(self.source, render=self.render):
+                t = self.start
+                while t < self.end:
+                    self.source.set_time(t)
+                    todo = [(jobs.heartbeat_job, c) for c in ctxs]
+                    if t >= next_header:
+                        todo += [(header.header_sync_job, c) for c in ctxs]
+                        next_header = t + pd.Timedelta(seconds=self.header_sec)
+                    t0 = time.perf_counter()
+                    await asyncio.gather(*(self._timed(fn, c, rep) for fn, c in todo))
+                    took = time.perf_counter() - t0
+                    rep.tick_ms.append(took * 1000.0)
+                    rep.ticks += 1
+                    rep.jobs += len(todo)
+                    if budget:
+                        if took > budget:
+                            rep.overruns += 1
+                        else:
+                            await asyncio.sleep(budget - took)
+                    now = time.perf_counter()
+                    if progress_every and now - last_log >= progress_every:
+                        last_log = now
+                        done = (t - self.start) / (self.end - self.start)
+                        log.info("replay %s · %.0f%% · %s ticks · %s alertas", t, 100 * done, rep.ticks,
+                                 sum(self.bot.alerts().values()))
+                    t += step
+                outbox = app.bot_data.get("outbox")
+                if outbox is not None:
+                    await outbox.stop()
+        finally:
+            await repo.close_writers()
+            if tmp is not None:
+                tmp.cleanup()
+        rep.wall = time.perf_counter() - wall0
+        rep.alerts = dict(self.bot.alerts())
+        rep.calls = dict(self.bot.calls)
+        rep.fetches = dict(self.source.calls)
+        rep.digest = self.bot.digest()
+        return rep
+
+    def write_log(self, path: str) -> None:
+        with open(path, "w", encoding="utf-8") as f:
+            for s in sorted(self.bot.log, key=lambda s: (s.at, s.chat_id or 0)):
+                f.write(s.line() + "\n")
+
+
+# ---------------- CLI ----------------
+def load_frames(specs: Sequence[str], days: float = 7) -> Dict[str, pd.DataFrame]:
+    """'WIF-USDT=wif5m.csv' lee el CSV; 'WIF-USDT' a secas descarga `days` días de 5m de OKX."""
+    from .services import backtest
+    frames: Dict[str, pd.DataFrame] = {}
+    for spec in specs:
+        sym, _, path = spec.partition("=")
+        sym = sym.strip().upper()
+        df = pd.read_csv(path, parse_dates=["time"]) if path else backtest.load_history(sym, days)
+        if df is None or df.empty:
+            raise SystemExit(f"sin velas para {sym}")
+        frames[sym] = df
+    return frames
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    ap = argparse.ArgumentParser(description="Replay acelerado de velas grabadas a través de los jobs reales")
+    ap.add_argument("streams", nargs="+", help="SYMBOL=velas.csv (o SYMBOL para descargar de OKX)")
+    ap.add_argument("--days", type=float, default=7, help="días a descargar si no hay CSV")
+    ap.add_argument("--chats", type=int, default=50)
+    ap.add_argument("--speed", type=float, default=0.0, help="N× tiempo real (0 = máximo)")
+    ap.add_argument("--poll", type=int, default=60, help="POLL_SEC simulado del heartbeat")
+    ap.add_argument("--header", type=int, default=300, help="intervalo del header (s simulados)")
+    ap.add_argument("--start", help="instante inicial (por defecto: inicio + 4 días)")
+    ap.add_argument("--hours", type=float, help="duración simulada")
+    ap.add_argument("--outbox", action="store_true", help="enviar por la cola de salida (Outbox)")
+    ap.add_argument("--no-render", action="store_true", help="no renderizar gráficas")
+    ap.add_argument("--latency", type=float, default=0.0, help="latencia simulada de Telegram (s)")
+    ap.add_argument("--record", help="JSONL con todos los mensajes (para comparar ejecuciones)")
+    a = ap.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(name)s: %(message)s")
+
+    source = ReplaySource(load_frames(a.streams, a.days))
+    start = pd.Timestamp(a.start) if a.start else None
+    lo, _ = source.span()
+    end = ((start or lo + pd.Timedelta(days=4)) + pd.Timedelta(hours=a.hours)) if a.hours else None
+    rp = Replay(source, chats=a.chats, speed=a.speed, poll_sec=a.poll, header_sec=a.header, start=start, end=end,
+                outbox=a.outbox, render=not a.no_render, latency=a.latency)
+    rep = asyncio.run(rp.run())
+    if a.record:
+        rp.write_log(a.record)
+    print(rep.text())
+
+
+if __name__ == "__main__":
+    main()
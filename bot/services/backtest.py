@@ -0,0 +1,337 @@
+# bot/services/backtest.py
+"""
+Backtest de las reglas del heartbeat (entrada, TP/SL, trailing, peligro) sobre velas históricas de OKX.
+
+Los indicadores y señales se calculan vectorizados sobre todo el historial; solo el bucle de
+posición (cooldown, TP/SL, trailing) recorre las velas de 15m, con listas de floats.
+
+    python -m bot.services.backtest WIF-USDT --days 365 --modo agresivo --precision --cache wif5m.csv
+
+Diferencias conocidas con el live:
+  - cada vela de 15m cerrada es un "tick" (el live consulta cada POLL_SEC la vela en formación);
+  - indicadores sobre el historial completo (el live usa ventanas de 400/300 velas);
+  - niveles diarios (pivotes + F618) a partir de las propias velas de OKX, no de CoinGecko.
+"""
+from __future__ import annotations
+import argparse
+import logging
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+import requests
+
+from . import signals
+from .indicators import ema, rsi, macd, modo_params
+
+log = logging.getLogger("backtest")
+
+OKX_BASE = "https://www.okx.com"
+OHLC = {"open": "first", "high": "max", "low": "min", "close": "last"}
+
+WARMUP = 200           # velas de 15m sin señales (EMA200)
+
+
+# ---------------- histórico OKX ----------------
+def fetch_history_sync(inst_id: str, bar: str = "5m", days: float = 365, pause: float = 0.11) -> Optional[pd.DataFrame]:
+    """Pagina /market/history-candles hacia atrás (100 velas por petición, ~20 req/2 s)."""
+    since_ms = int((time.time() - days * 86400) * 1000)
+    rows: List[list] = []
+    after: Optional[str] = None
+    while True:
+        params = {"instId": inst_id, "bar": bar, "limit": 100}
+        if after:
+            params["after"] = after
+        try:
+            r = requests.get(f"{OKX_BASE}/api/v5/market/history-candles", params=params, timeout=15)
+            if r.status_code == 429:
+                time.sleep(1.0)
+                continue
+            if r.status_code != 200:
+                log.warning("OKX history HTTP %s: %s", r.status_code, r.text[:200])
+                break
+            data = r.json().get("data", []) or []
+        except Exception as e:
+            log.warning("OKX history error: %s", e)
+            break
+        if not data:
+            break
+        rows.extend(data)
+        after = data[-1][0]  # vienen de más nueva a más vieja
+        if int(after) <= since_ms:
+            break
+        time.sleep(pause)
+    if not rows:
+        return None
+    df = pd.DataFrame([r[:5] for r in rows], columns=["ts", "open", "high", "low", "close"])
+    df["ts"] = df["ts"].astype("int64")
+    df = df[df["ts"] >= since_ms].drop_duplicates("ts").sort_values("ts")
+    for c in ("open", "high", "low", "close"):
+        df[c] = df[c].astype(float)
+    df["time"] = pd.to_datetime(df["ts"], unit="ms")
+    return df[["time", "open", "high", "low", "close"]].reset_index(drop=True)
+
+def load_history(inst_id: str, days: float = 365, cache: Optional[str] = None) -> Optional[pd.DataFrame]:
+    """Velas de 5m; con `cache` se leen/guardan en CSV para no repetir la descarga."""
+    if cache and os.path.exists(cache):
+        return pd.read_csv(cache, parse_dates=["time"])
+    df = fetch_history_sync(inst_id, "5m", days)
+    if df is not None and cache:
+        df.to_csv(cache, index=False)
+    return df
+
+
+# ---------------- features (vectorizado) ----------------
+@dataclass
+class Features:
+    """Matriz float64 (velas de 15m × columnas); los booleanos van como 0/1."""
+    time: np.ndarray
+    names: Tuple[str, ...]
+    X: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.X)
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        return self.X[:, self.names.index(name)]
+
+def _partial_ema(prev: np.ndarray, x: np.ndarray, span: int) -> np.ndarray:
+    # EMA de la vela 4H en formación = un paso más sobre la EMA de la 4H anterior
+    a = 2.0 / (span + 1)
+    return np.where(np.isnan(prev), x, prev + a * (x - prev))
+
+def features(df5: pd.DataFrame) -> Features:
+    """
+    Todo lo que mira el heartbeat, alineado al cierre de cada vela de 15m:
+    15m (RSI, MACD, EMAs), 5m (última vela del bloque), 4H con la vela en formación y niveles del día anterior.
+    """
+    d5 = df5.set_index("time").sort_index()
+    c5 = d5["close"].astype(float)
+    d15 = d5[list(OHLC)].resample("15min").agg(OHLC).dropna()
+    c15 = d15["close"]
+    idx = d15.index
+
+    # 15m
+    rsi15 = rsi(c15, 14)
+    m15, s15, h15 = macd(c15)
+    e20, e50, e200 = ema(c15, 20), ema(c15, 50), ema(c15, 200)
+
+    # 5m → valor de la última vela de 5m de cada bloque de 15m
+    m5, s5, _ = macd(c5)
+    macd5_up = (m5 > s5).astype(float).resample("15min").last().reindex(idx)
+    rsi5 = rsi(c5, 14).resample("15min").last().reindex(idx)
+
+    # 4H: EMAs/RSI de las 4H cerradas + paso parcial con el cierre de 15m actual
+    d4 = d15.resample("4h").agg(OHLC).dropna()
+    c4 = d4["close"]
+    a = 1.0 / 14
+    delta4 = c4.diff()
+    up4 = delta4.clip(lower=0.0).ewm(alpha=a, adjust=False).mean()
+    dn4 = (-delta4.clip(upper=0.0)).ewm(alpha=a, adjust=False).mean()
+    prev4 = pd.DataFrame({
+        "c": c4, "e20": ema(c4, 20), "e50": ema(c4, 50), "e200": ema(c4, 200), "up": up4, "dn": dn4,
+    }).shift(1)
+    prev4 = prev4.reindex(idx.floor("4h")).to_numpy()
+    x = c15.to_numpy()
+    d = x - prev4[:, 0]
+    up = np.where(np.isnan(prev4[:, 4]), np.maximum(d, 0.0), (1 - a) * prev4[:, 4] + a * np.maximum(d, 0.0))
+    dn = np.where(np.isnan(prev4[:, 5]), np.maximum(-d, 0.0), (1 - a) * prev4[:, 5] + a * np.maximum(-d, 0.0))
+    rsi4 = 100 - (100 / (1 + up / (dn + 1e-9)))
+    e4_20 = _partial_ema(prev4[:, 1], x, 20)
+    e4_50 = _partial_ema(prev4[:, 2], x, 50)
+    e4_200 = _partial_ema(prev4[:, 3], x, 200)
+
+    # niveles: pivotes clásicos + F618 del último día UTC cerrado
+    day = d15.resample("1D").agg(OHLC).dropna().shift(1).reindex(idx.floor("1D"))
+    hi, lo, cl = (day[k].to_numpy() for k in ("high", "low", "close"))
+    P = (hi + lo + cl) / 3.0
+    s1 = 2 * P - hi
+    s2 = P - (hi - lo)
+    f618 = hi - 0.618 * np.maximum(hi - lo, 1e-12)
+
+    cols = {
+        "close": x,
+        "low": d15["low"].to_numpy(),
+        "prev_close": c15.shift(1).to_numpy(),
+        "rsi15": rsi15.to_numpy(),
+        "rsi15_prev": rsi15.shift(1).to_numpy(),
+        "macd15_up": (m15 > s15).to_numpy(dtype=float),
+        "hist15_up": (h15 > h15.shift(1)).to_numpy(dtype=float),
+        "ema20": e20.to_numpy(), "ema50": e50.to_numpy(), "ema200": e200.to_numpy(),
+        "macd5_up": macd5_up.to_numpy(dtype=float),
+        "rsi5": rsi5.to_numpy(dtype=float),
+        "rsi4": rsi4, "e4_20": e4_20, "e4_50": e4_50, "e4_200": e4_200, "close4": x,
+        "S1": s1, "S2": s2, "F618": f618,
+    }
+    names = signals.FIELDS
+    X = np.column_stack([np.asarray(cols[n], dtype=float) for n in names])
+    return Features(time=idx.to_numpy(), names=names, X=X)
+
+
+# ---------------- señales (vectorizado, reglas de services/signals) ----------------
+def entry_signal(f: Features, params: Dict[str, float], precision: bool) -> np.ndarray:
+    """Condición de entrada del heartbeat por vela (sin cooldown: depende de la posición)."""
+    sig = np.asarray(signals.entry(f, params, precision), dtype=bool).copy()
+    sig[:WARMUP] = False
+    return sig
+
+def weak_signal(f: Features) -> np.ndarray:
+    return np.asarray(signals.weak(f), dtype=bool)
+
+def danger_signal(f: Features, params: Dict[str, float]) -> np.ndarray:
+    out = np.asarray(signals.danger(f, params), dtype=bool).copy()
+    out[:WARMUP] = False
+    return out
+
+
+# ---------------- simulación ----------------
+@dataclass
+class Trade:
+    entry_time: pd.Timestamp
+    exit_time: Optional[pd.Timestamp]
+    entry: float
+    exit: Optional[float]
+    reason: str           # tp | sl | trailing | open
+
+    @property
+    def pnl_pct(self) -> float:
+        return 0.0 if self.exit is None else (self.exit / self.entry - 1.0) * 100.0
+
+@dataclass
+class BacktestResult:
+    trades: List[Trade]
+    equity: np.ndarray              # mark-to-market por vela de 15m (1.0 = inicio)
+    bars: int
+    alerts: Dict[str, int] = field(default_factory=dict)
+    runtime: float = 0.0
+
+    @property
+    def closed(self) -> List[Trade]:
+        return [t for t in self.trades if t.exit is not None]
+
+    @property
+    def win_rate(self) -> float:
+        c = self.closed
+        return 100.0 * sum(t.pnl_pct > 0 for t in c) / len(c) if c else 0.0
+
+    @property
+    def total_return(self) -> float:
+        return (float(self.equity[-1]) - 1.0) * 100.0 if len(self.equity) else 0.0
+
+    @property
+    def max_drawdown(self) -> float:
+        if not len(self.equity):
+            return 0.0
+        peak = np.maximum.accumulate(self.equity)
+        return float(((peak - self.equity) / peak).max()) * 100.0
+
+    def summary(self) -> Dict[str, float]:
+        c = self.closed
+        return {
+            "trades": len(c),
+            "win_rate": round(self.win_rate, 2),
+            "return_pct": round(self.total_return, 2),
+            "max_dd_pct": round(self.max_drawdown, 2),
+            "avg_trade_pct": round(float(np.mean([t.pnl_pct for t in c])), 3) if c else 0.0,
+            "tp": sum(t.reason == "tp" for t in c),
+            "sl": sum(t.reason == "sl" for t in c),
+            "trailing": sum(t.reason == "trailing" for t in c),
+            "bars": self.bars,
+            "runtime_s": round(self.runtime, 3),
+            **{f"alerts_{k}": v for k, v in self.alerts.items()},
+        }
+
+def simulate(f: Features, entry: np.ndarray, tp_pct: float, sl_pct: float, precision: bool,
+             weak: Optional[np.ndarray] = None) -> Tuple[List[Tuple[int, int, float, float, str]], np.ndarray, int]:
+    """
+    Bucle de posición de signals.evaluate sobre índices: entrada (con cooldown en precisión), luego TP → SL → trailing.
+    Devuelve ([(i_entrada, i_salida, entrada, salida, motivo)], equity por vela, avisos de debilidad).
+    """
+    price = f["close"].tolist()
+    ent = entry.tolist()
+    wk = weak.tolist() if weak is not None else None
+    n = len(price)
+    equity = np.empty(n)
+    trades: List[Tuple[int, int, float, float, str]] = []
+    eq = 1.0
+    pos: Optional[float] = None
+    peak = 0.0
+    i_in = 0
+    last_entry: Optional[int] = None
+    weak_alerts = 0
+    for i in range(n):
+        p = price[i]
+        if pos is None and ent[i] and signals.cooldown_ok(None if last_entry is None else i - last_entry, precision):
+            pos, peak, i_in, last_entry = p, p, i, i
+        if pos is not None:
+            if p > peak:
+                peak = p
+            reason, gain, _ = signals.exit_reason(pos, peak, p, tp_pct, sl_pct)
+            if reason:
+                trades.append((i_in, i, pos, p, reason))
+                eq *= p / pos
+                pos = None
+            elif wk is not None and wk[i] and gain > 0:
+                weak_alerts += 1
+        equity[i] = eq if pos is None else eq * price[i] / pos
+    if pos is not None:
+        trades.append((i_in, -1, pos, float("nan"), "open"))
+    return trades, equity, weak_alerts
+
+def run(df5: Optional[pd.DataFrame], modo: str = "agresivo", precision: bool = False,
+        tp_pct: float = 2.0, sl_pct: float = 1.5, params: Optional[Dict[str, float]] = None,
+        feats: Optional[Features] = None) -> BacktestResult:
+    """
+    Backtest completo sobre velas de 5m. `params` sobrescribe modo_params(modo) (p.ej. para barridos);
+    con `feats` ya calculadas no hace falta df5.
+    """
+    t0 = time.perf_counter()
+    f = feats if feats is not None else features(df5)
+    mp = {**modo_params(modo), **(params or {})}
+    entry = entry_signal(f, mp, precision)
+    danger = danger_signal(f, mp)
+    raw, equity, weak_alerts = simulate(f, entry, tp_pct, sl_pct, precision, weak=weak_signal(f))
+    ts = pd.to_datetime(f.time)
+    trades = [Trade(ts[i], None if j < 0 else ts[j], e, None if j < 0 else x, r) for i, j, e, x, r in raw]
+    res = BacktestResult(trades=trades, equity=equity, bars=len(f),
+                         alerts={"entry": len(trades), "danger": int(danger.sum()), "weak": weak_alerts})
+    res.runtime = time.perf_counter() - t0
+    return res
+
+
+# ---------------- CLI ----------------
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    ap = argparse.ArgumentParser(description="Backtest de las reglas del heartbeat sobre velas de OKX")
+    ap.add_argument("symbol", help="instId OKX, p.ej. WIF-USDT")
+    ap.add_argument("--days", type=float, default=365)
+    ap.add_argument("--modo", default="agresivo", choices=("agresivo", "balanceado", "conservador"))
+    ap.add_argument("--precision", action="store_true")
+    ap.add_argument("--tp", type=float, default=2.0, help="TP en %%")
+    ap.add_argument("--sl", type=float, default=1.5, help="SL en %%")
+    ap.add_argument("--cache", help="CSV de velas 5m (se crea si no existe)")
+    ap.add_argument("--trades", action="store_true", help="listar operaciones")
+    a = ap.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(name)s: %(message)s")
+
+    t0 = time.perf_counter()
+    df5 = load_history(a.symbol.upper(), a.days, a.cache)
+    if df5 is None or df5.empty:
+        raise SystemExit(f"sin velas para {a.symbol}")
+    t_load = time.perf_counter() - t0
+
+    res = run(df5, a.modo, a.precision, a.tp, a.sl)
+    print(f"{a.symbol.upper()} · {len(df5)} velas 5m ({df5['time'].iloc[0]} → {df5['time'].iloc[-1]}) · "
+          f"modo={a.modo} precisión={'on' if a.precision else 'off'} TP={a.tp}% SL={a.sl}% · carga {t_load:.1f}s")
+    for k, v in res.summary().items():
+        print(f"  {k:>14}: {v}")
+    if a.trades:
+        for t in res.trades:
+            print(f"  {t.entry_time} → {t.exit_time}  {t.entry:.6g} → {t.exit if t.exit is None else f'{t.exit:.6g}'}"
+                  f"  {t.reason:<8} {t.pnl_pct:+.2f}%")
+
+
+if __name__ == "__main__":
+    main()
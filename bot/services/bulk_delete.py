@@ -0,0 +1,166 @@
+# bot/services/bulk_delete.py
+from __future__ import annotations
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.constants import ParseMode
+from telegram.error import BadRequest, RetryAfter
+
+log = logging.getLogger("bulk_delete")
+
+BATCH = 100          # máximo de deleteMessages
+CONCURRENCY = 4      # lotes en vuelo (AIORateLimiter sigue marcando el ritmo)
+PROGRESS_EVERY = 1.0 # s entre ediciones del mensaje de progreso
+
+CANCEL_DATA = "purge:cancel"
+
+Progress = Callable[[int, int], Awaitable[None]]
+
+
+@dataclass
+class DeleteResult:
+    requested: int = 0
+    processed: int = 0   # ids en lotes aceptados: Telegram omite en silencio los que no existen,
+                         # así que es un tope de lo borrado, no un recuento exacto
+    failed: int = 0      # ids que Telegram no dejó borrar
+    cancelled: bool = False
+
+
+def batches(ids: Sequence[int], size: int = BATCH) -> List[List[int]]:
+    ids = list(ids)
+    return [ids[i:i + size] for i in range(0, len(ids), size)]
+
+
+# Errores del chat entero (no de mensajes concretos): partir el lote no salva nada
+_CHAT_ERRORS = ("chat not found", "not enough rights", "have no rights", "chat_admin_required")
+
+
+async def _delete_batch(bot, chat_id: int, ids: List[int], split: bool = True) -> Tuple[int, int]:
+    """
+    (procesados, fallidos). Si el lote se rechaza entero, se parte en mitades para salvar el resto.
+    No se parte si el error es del chat ni si la primera mitad no salvó nada (la segunda se intenta
+    una vez): lo que quede cuenta como fallido. Peor caso ~2·log2(n) llamadas en vez de 2n−1.
+    """
+    while True:
+        try:
+            await bot.delete_messages(chat_id, ids)
+            return len(ids), 0
+        except RetryAfter as e:
+            ra = e.retry_after
+            await asyncio.sleep(ra.total_seconds() if hasattr(ra, "total_seconds") else float(ra))
+        except BadRequest as e:
+            if len(ids) == 1 or not split or any(m in str(e).lower() for m in _CHAT_ERRORS):
+                return 0, len(ids)
+            log.debug("lote de %s rechazado (%s); se divide", len(ids), e)
+            mid = len(ids) // 2
+            a = await _delete_batch(bot, chat_id, ids[:mid])
+            b = await _delete_batch(bot, chat_id, ids[mid:], split=a[0] > 0)
+            return a[0] + b[0], a[1] + b[1]
+        except Exception as e:
+            log.warning("delete_messages falló en chat %s: %s", chat_id, e)
+            return 0, len(ids)
+
+
+async def delete_ids(bot, chat_id: int, ids: Sequence[int], *,
+                     cancel: Optional[asyncio.Event] = None,
+                     progress: Optional[Progress] = None,
+                     concurrency: int = CONCURRENCY) -> DeleteResult:
+    """Borra `ids` con deleteMessages en lotes de 100, varios en paralelo. Se detiene si `cancel` se activa."""
+    res = DeleteResult(requested=len(ids))
+    sem = asyncio.Semaphore(max(1, concurrency))
+    done = 0
+
+    async def run(batch: List[int]) -> None:
+        nonlocal done
+        async with sem:
+            if cancel is not None and cancel.is_set():
+                return
+            ok, bad = await _delete_batch(bot, chat_id, batch)
+        res.processed += ok; res.failed += bad; done += len(batch)
+        if progress is not None:
+            try:
+                await progress(done, res.requested)
+            except Exception:
+                pass
+
+    await asyncio.gather(*(run(b) for b in batches(ids)))
+    res.cancelled = bool(cancel is not None and cancel.is_set() and done < res.requested)
+    return res
+
+
+# ------------------------- tarea con progreso y cancelación ------------------------- #
+def _kb_cancel() -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup([[InlineKeyboardButton("✖️ Cancelar", callback_data=CANCEL_DATA)]])
+
+def _cancel_key(chat_id: int):
+    return ("purge_cancel", chat_id)
+
+def begin(runtime: Dict, chat_id: int) -> bool:
+    """Reserva el chat (una limpieza a la vez). False si ya hay una en curso."""
+    if _cancel_key(chat_id) in runtime:
+        return False
+    runtime[_cancel_key(chat_id)] = asyncio.Event()
+    return True
+
+def cancel(runtime: Dict, chat_id: int) -> bool:
+    ev = runtime.get(_cancel_key(chat_id))
+    if ev is None:
+        return False
+    ev.set()
+    return True
+
+
+async def run_with_status(app, chat_id: int, ids: Sequence[int], title: str,
+                          summary: Callable[[DeleteResult], str],
+                          autodelete: float = 0.0) -> Optional[DeleteResult]:
+    """
+    Publica un mensaje de estado con botón de cancelar, borra `ids` y edita el estado
+    con el progreso (máx. 1 edición/s) y el resumen final (`summary(res)`, HTML);
+    `autodelete` > 0 borra el resumen tras esos segundos.
+    Se lanza con app.create_task tras begin(): los handlers corren en serie y el botón debe poder atenderse.
+    """
+    runtime = app.bot_data.setdefault("runtime", {})
+    ev = runtime.setdefault(_cancel_key(chat_id), asyncio.Event())
+    bot = app.bot
+    status = None
+    try:
+        try:
+            status = await bot.send_message(chat_id, f"{title}\n⏳ 0/{len(ids)}",
+                                            parse_mode=ParseMode.HTML, reply_markup=_kb_cancel())
+        except Exception as e:
+            log.info("no se pudo publicar progreso: %s", e)
+
+        last = 0.0
+        async def progress(done: int, total: int) -> None:
+            nonlocal last
+            now = time.monotonic()
+            if status is None or done >= total or now - last < PROGRESS_EVERY:
+                return
+            last = now
+            await status.edit_text(f"{title}\n⏳ {done}/{total}", parse_mode=ParseMode.HTML,
+                                   reply_markup=_kb_cancel())
+
+        t0 = time.monotonic()
+        res = await delete_ids(bot, chat_id, ids, cancel=ev, progress=progress)
+        runtime.pop(_cancel_key(chat_id), None)
+        log.info("chat %s: %s/%s ids procesados en %.1fs%s", chat_id, res.processed, res.requested,
+                 time.monotonic() - t0, " (cancelado)" if res.cancelled else "")
+
+        text = summary(res)
+        try:
+            if status is not None:
+                await status.edit_text(text, parse_mode=ParseMode.HTML)
+            else:
+                status = await bot.send_message(chat_id, text, parse_mode=ParseMode.HTML)
+            if autodelete > 0:
+                await asyncio.sleep(autodelete)
+                await status.delete()
+        except Exception:
+            pass
+        return res
+    finally:
+        runtime.pop(_cancel_key(chat_id), None)
@@ -0,0 +1,29 @@
+# bot/services/canvas.py
+from __future__ import annotations
+import io
+from typing import Tuple
+
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+from PIL import Image
+
+
+def new_figure(figsize: Tuple[float, float], dpi: int = 100) -> Figure:
+    """
+    Figura Agg explícita, sin pyplot: no hay figura "actual" global, así que
+    varios renders pueden correr a la vez en hilos sin pisarse.
+    """
+    fig = Figure(figsize=figsize, dpi=dpi)
+    FigureCanvasAgg(fig)
+    return fig
+
+def to_png(fig: Figure, **savefig_kwargs) -> io.BytesIO:
+    buf = io.BytesIO()
+    fig.savefig(buf, format="png", **savefig_kwargs)
+    buf.seek(0)
+    return buf
+
+def to_image(fig: Figure) -> Image.Image:
+    """Rasteriza la figura (mismo resultado que savefig a su dpi) sin pasar por PNG."""
+    fig.canvas.draw()
+    return Image.frombuffer("RGBA", fig.canvas.get_width_height(), fig.canvas.buffer_rgba(), "raw", "RGBA", 0, 1).copy()
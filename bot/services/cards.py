@@ -1,8 +1,11 @@
 from __future__ import annotations
 import io
-import matplotlib
-matplotlib.use("Agg")  # backend sin GUI
-import matplotlib.pyplot as plt
+from matplotlib.patches import Rectangle
+
+from PIL import Image
+
+from . import encoding
+from .canvas import new_figure, to_png
 
 def status_card(text: str, bg: str = "#1b5e20", fg: str = "#ffffff") -> io.BytesIO:
     """
@@ -13,7 +16,7 @@ def status_card(text: str, bg: str = "#1b5e20", fg: str = "#ffffff") -> io.Bytes
       - Lateral: #b45309 (amber/dark)
     """
     # Figura con facecolor ya en el color deseado
-    fig = plt.figure(figsize=(4.6, 1.0), dpi=220)
+    fig = new_figure((4.6, 1.0), dpi=220)
     fig.patch.set_facecolor(bg)
     fig.patch.set_alpha(1.0)
 
@@ -22,7 +25,7 @@ def status_card(text: str, bg: str = "#1b5e20", fg: str = "#ffffff") -> io.Bytes
     ax.set_axis_off()
 
     # “Pinta” el fondo explícitamente dentro del eje
-    ax.add_patch(plt.Rectangle((0, 0), 1, 1, transform=ax.transAxes, color=bg))
+    ax.add_patch(Rectangle((0, 0), 1, 1, transform=ax.transAxes, color=bg))
 
     # Texto centrado
     ax.text(
@@ -32,15 +35,12 @@ def status_card(text: str, bg: str = "#1b5e20", fg: str = "#ffffff") -> io.Bytes
     )
 
     # Guardar preservando facecolor y sin márgenes
-    buf = io.BytesIO()
-    plt.savefig(
-        buf, format="png",
+    png = to_png(
+        fig,
         facecolor=fig.get_facecolor(),
         edgecolor="none",
         bbox_inches="tight", pad_inches=0
     )
-    plt.close(fig)
-    buf.seek(0)
-    return buf
+    return io.BytesIO(encoding.encode(Image.open(png), lossless=True, kind="card"))
 
 
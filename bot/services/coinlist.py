@@ -0,0 +1,169 @@
+# bot/services/coinlist.py
+from __future__ import annotations
+import asyncio
+import bisect
+import re
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from .disk_index import DiskIndex
+
+try:
+    from pycoingecko import CoinGeckoAPI
+except Exception:
+    CoinGeckoAPI = None
+
+_PATH = "cg_coins.json"  # Config.coinlist_path / coinlist_refresh_h (start)
+_MAX_AGE = 24 * 3600
+
+_NORM = re.compile(r"[^a-z0-9]+")
+
+
+def _norm(s: str) -> str:
+    return _NORM.sub("", (s or "").lower())
+
+def _trigrams(s: str) -> set:
+    s = f"  {_norm(s)} "
+    return {s[i:i + 3] for i in range(len(s) - 2)}
+
+
+@dataclass(frozen=True)
+class Coin:
+    id: str
+    symbol: str
+    name: str
+
+
+class CoinIndex(DiskIndex):
+    """
+    Lista de monedas de CoinGecko (id, symbol, name) en memoria:
+      - id exacto y símbolo → dict
+      - prefijo → lista ordenada de claves + bisect
+      - difuso → índice de trigramas (Dice) sobre id/símbolo/nombre
+    Se guarda en disco y se refresca una vez al día; las búsquedas no hacen red.
+    """
+
+    name = "CoinGecko coins/list"
+
+    def __init__(self, path: str, max_age: float):
+        super().__init__(path, max_age)
+        self.coins: List[Coin] = []
+        self._by_id: Dict[str, int] = {}
+        self._by_symbol: Dict[str, List[int]] = {}
+        self._keys: List[Tuple[str, int]] = []          # (clave normalizada, idx) ordenado
+        self._grams: Dict[str, List[int]] = {}          # trigrama → idx de coins
+        self._gram_len: List[int] = []
+
+    def __len__(self) -> int:
+        return len(self.coins)
+
+    # --- índice ---
+    def _index(self, coins: List[Coin], fetched_at: float) -> None:
+        by_id: Dict[str, int] = {}
+        by_symbol: Dict[str, List[int]] = defaultdict(list)
+        keys: List[Tuple[str, int]] = []
+        grams: Dict[str, List[int]] = defaultdict(list)
+        gram_len: List[int] = []
+        for i, c in enumerate(coins):
+            by_id[c.id] = i
+            by_symbol[c.symbol.lower()].append(i)
+            g = set()
+            for text in {_norm(c.id), _norm(c.symbol), _norm(c.name)}:
+                if text:
+                    keys.append((text, i))
+                    g |= _trigrams(text)
+            for t in g:
+                grams[t].append(i)
+            gram_len.append(len(g))
+        keys.sort()
+        # sustitución de golpe: los lectores nunca ven un índice a medias
+        (self.coins, self._by_id, self._by_symbol, self._keys, self._grams, self._gram_len,
+         self.fetched_at) = (coins, by_id, dict(by_symbol), keys, dict(grams), gram_len, fetched_at)
+
+    # --- consultas ---
+    def get(self, cg_id: str) -> Optional[Coin]:
+        i = self._by_id.get((cg_id or "").strip().lower())
+        return None if i is None else self.coins[i]
+
+    def by_symbol(self, symbol: str) -> List[Coin]:
+        return [self.coins[i] for i in self._by_symbol.get((symbol or "").strip().lower(), ())]
+
+    def prefix(self, q: str, limit: int = 10) -> List[Coin]:
+        q = _norm(q)
+        if not q:
+            return []
+        out: List[Coin] = []
+        seen = set()
+        j = bisect.bisect_left(self._keys, (q, -1))
+        while j < len(self._keys) and self._keys[j][0].startswith(q) and len(out) < limit:
+            i = self._keys[j][1]
+            if i not in seen:
+                seen.add(i)
+                out.append(self.coins[i])
+            j += 1
+        return out
+
+    def fuzzy(self, q: str, limit: int = 5, min_score: float = 0.35) -> List[Coin]:
+        qg = _trigrams(q)
+        if not qg:
+            return []
+        hits: Dict[int, int] = defaultdict(int)
+        for t in qg:
+            for i in self._grams.get(t, ()):
+                hits[i] += 1
+        scored = []
+        for i, n in hits.items():
+            score = 2.0 * n / (len(qg) + self._gram_len[i])
+            if score >= min_score:
+                # empate: id más corto (suele ser la moneda "principal")
+                scored.append((-score, len(self.coins[i].id), i))
+        scored.sort()
+        return [self.coins[i] for _, _, i in scored[:limit]]
+
+    def suggest(self, q: str, limit: int = 5) -> List[Coin]:
+        """'¿Quisiste decir…?': símbolo exacto, luego prefijo, luego difuso (sin duplicados)."""
+        out: List[Coin] = []
+        for group in (sorted(self.by_symbol(q), key=lambda c: len(c.id)), self.prefix(q, limit), self.fuzzy(q, limit)):
+            for c in group:
+                if c not in out:
+                    out.append(c)
+                if len(out) >= limit:
+                    return out
+        return out
+
+    # --- carga / refresco (DiskIndex) ---
+    def _download(self) -> Optional[List[Any]]:
+        if CoinGeckoAPI is None:
+            return None
+        data = CoinGeckoAPI().get_coins_list() or []
+        return [[str(d.get("id") or "").lower(), str(d.get("symbol") or ""), str(d.get("name") or "")]
+                for d in data if d.get("id")]
+
+    def _parse(self, raw: List[Any]) -> List[Coin]:
+        return [Coin(str(d[0]), str(d[1]), str(d[2])) for d in raw if d and d[0]]
+
+
+_INDEX = CoinIndex(_PATH, _MAX_AGE)
+
+def index() -> CoinIndex:
+    return _INDEX
+
+def get(cg_id: str) -> Optional[Coin]:
+    return _INDEX.get(cg_id)
+
+def suggest(q: str, limit: int = 5) -> List[Coin]:
+    return _INDEX.suggest(q, limit)
+
+async def refresh() -> bool:
+    return await asyncio.to_thread(_INDEX.refresh_sync)
+
+async def start(app, path: Optional[str] = None, max_age: Optional[float] = None) -> None:
+    """Arranque: carga de disco y refresco diario (inmediato si está viejo o no existe)."""
+    _INDEX.configure(path, max_age)
+    await asyncio.to_thread(_INDEX.load)
+    _INDEX.schedule(app, refresh_job, "cg_coinlist")
+
+async def refresh_job(ctx) -> None:
+    if not await refresh():
+        _INDEX.retry_later(ctx.job_queue, refresh_job, "cg_coinlist")
@@ -0,0 +1,119 @@
+# bot/services/disk_index.py
+from __future__ import annotations
+import json
+import logging
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Callable, List, Optional
+
+log = logging.getLogger("disk_index")
+
+
+class DiskIndex(ABC):
+    """
+    Base de los listados remotos que se descargan enteros, se guardan en disco (JSON
+    {"fetched_at", "data"}) y se refrescan cada `max_age` s (catálogo OKX, lista CoinGecko).
+    Las subclases definen:
+      - `_download()` → lista cruda (lo que se guarda en "data") o None si la respuesta no sirve
+      - `_parse(raw)` → elementos; `_index(items, fetched_at)` → sustituye sus índices de golpe
+      - `__len__`
+    """
+
+    name = "listado"
+    retry_sec = 300.0  # tras un refresco fallido no se espera a max_age
+
+    def __init__(self, path: str, max_age: float):
+        self.path = path
+        self.max_age = float(max_age)
+        self.fetched_at = 0.0
+        self.complete = False  # hay un listado COMPLETO (disco o descarga), no solo entradas sueltas
+        self._lock = threading.Lock()
+
+    # --- a implementar ---
+    @abstractmethod
+    def _download(self) -> Optional[List[Any]]: ...
+
+    @abstractmethod
+    def _parse(self, raw: List[Any]) -> List[Any]: ...
+
+    @abstractmethod
+    def _index(self, items: List[Any], fetched_at: float) -> None: ...
+
+    @abstractmethod
+    def __len__(self) -> int: ...
+
+    def configure(self, path: Optional[str] = None, max_age: Optional[float] = None) -> None:
+        """Ruta y antigüedad desde Config (antes de load/schedule); None = se mantiene."""
+        if path:
+            self.path = path
+        if max_age:
+            self.max_age = float(max_age)
+
+    # --- estado ---
+    @property
+    def loaded(self) -> bool:
+        return len(self) > 0
+
+    @property
+    def stale(self) -> bool:
+        return time.time() - self.fetched_at > self.max_age
+
+    def next_refresh_in(self) -> float:
+        """Segundos hasta el próximo refresco (0 si está viejo o nunca se descargó)."""
+        return 0.0 if self.stale else max(1.0, self.max_age - (time.time() - self.fetched_at))
+
+    # --- carga / refresco ---
+    def load(self) -> bool:
+        """Carga lo guardado en disco (aunque esté viejo: mejor que nada hasta el refresco)."""
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                js = json.load(f)
+            items = self._parse(js.get("data", []) or [])
+            if items:
+                self._index(items, float(js.get("fetched_at", 0)))
+                self.complete = True
+                return True
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            log.warning("%s: copia en disco ilegible (%s): %s", self.name, self.path, e)
+        return False
+
+    def _save(self, raw: List[Any]) -> None:
+        tmp = self.path + ".tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({"fetched_at": self.fetched_at, "data": raw}, f, separators=(",", ":"), ensure_ascii=False)
+            os.replace(tmp, self.path)
+        except Exception as e:
+            log.warning("%s: no se pudo guardar en disco: %s", self.name, e)
+
+    def refresh_sync(self) -> bool:
+        """Descarga el listado completo. Si falla, se conserva el anterior."""
+        with self._lock:
+            try:
+                raw = self._download()
+            except Exception as e:
+                log.warning("%s error: %s", self.name, e)
+                return False
+            items = self._parse(raw) if raw else []
+            if not items:
+                return False
+            self._index(items, time.time())
+            self.complete = True
+            self._save(raw)
+            log.info("%s: %s entradas", self.name, len(self))
+            return True
+
+    def schedule(self, app, callback: Callable, job_name: str) -> None:
+        """Refresco periódico en el JobQueue; el primero, inmediato si lo de disco está viejo o no existe."""
+        app.job_queue.run_repeating(callback, interval=self.max_age, first=self.next_refresh_in(), name=job_name)
+
+    def retry_later(self, job_queue, callback: Callable, job_name: str) -> None:
+        """Refresco fallido: reintento a los `retry_sec` s (como mucho uno pendiente)."""
+        name = f"{job_name}:retry"
+        if job_queue is None or job_queue.get_jobs_by_name(name):
+            return
+        job_queue.run_once(callback, when=self.retry_sec, name=name)
@@ -0,0 +1,135 @@
+# bot/services/encoding.py
+from __future__ import annotations
+import io
+import logging
+import threading
+import time
+from collections import Counter
+from typing import Dict, Optional, Tuple
+
+from PIL import Image
+
+log = logging.getLogger("encoding")
+
+# Presupuesto de bytes por imagen (las subidas a Telegram dominan la latencia visible)
+_BUDGET = 200 * 1024
+_JPEG_STEPS = (90, 80, 70, 60)
+_GRAPHIC_MAX_COLORS = 32768  # colores únicos: gráficas/tarjetas rondan miles; fotos/degradados, >100k
+
+def configure(budget_kb: float) -> None:
+    """Presupuesto por imagen (Config.image_budget_kb); render_pool lo aplica también en sus workers."""
+    global _BUDGET
+    _BUDGET = int(float(budget_kb) * 1024)
+
+_STATS: Dict[str, Dict] = {}
+_LOCK = threading.Lock()
+
+
+# ------------------------- candidatos ------------------------- #
+def _png(img: Image.Image) -> bytes:
+    buf = io.BytesIO()
+    img.save(buf, format="PNG", optimize=True)
+    return buf.getvalue()
+
+def _jpeg(img: Image.Image, quality: int) -> bytes:
+    buf = io.BytesIO()
+    img.save(buf, format="JPEG", quality=quality, optimize=True)
+    return buf.getvalue()
+
+def _flatten(img: Image.Image) -> Image.Image:
+    """RGBA opaco (matplotlib, tarjetas PIL) → RGB; con transparencia real se compone sobre blanco."""
+    if img.mode == "RGB":
+        return img
+    if img.mode in ("RGBA", "LA", "P"):
+        img = img.convert("RGBA")
+        lo, _ = img.getchannel("A").getextrema()
+        if lo < 255:
+            bg = Image.new("RGBA", img.size, (255, 255, 255, 255))
+            img = Image.alpha_composite(bg, img)
+    return img.convert("RGB")
+
+def _is_graphic(img: Image.Image) -> bool:
+    """Gráficas/tarjetas: pocos colores aun con antialias. Fotos/degradados: muchos."""
+    return img.getcolors(_GRAPHIC_MAX_COLORS) is not None
+
+
+def encode(img: Image.Image, *, lossless: bool = False, budget_kb: Optional[float] = None,
+           kind: str = "image") -> bytes:
+    """
+    Codifica una imagen eligiendo formato por contenido:
+      - ≤256 colores → PNG con paleta exacta (sin pérdida)
+      - lossless (documentos) → PNG optimizado
+      - gráfico → PNG cuantizado a 256 colores si cabe en el presupuesto
+      - si no → JPEG bajando calidad hasta caber (si nada cabe, el más pequeño)
+    Registra tamaño y tiempo por `kind` (ver stats()).
+    """
+    t0 = time.perf_counter()
+    budget = _BUDGET if budget_kb is None else int(budget_kb * 1024)
+    rgb = _flatten(img)
+
+    colors = rgb.getcolors(256)
+    if colors is not None:
+        data, fmt = _png(rgb.quantize(colors=len(colors))), "png8"
+    elif lossless:
+        data, fmt = _png(rgb), "png"
+    else:
+        cands = []
+        if _is_graphic(rgb):
+            data = _png(rgb.quantize(256, method=Image.Quantize.FASTOCTREE, dither=Image.Dither.NONE))
+            cands.append((data, "png8"))
+        if not cands or len(cands[-1][0]) > budget:
+            for q in _JPEG_STEPS:
+                cands.append((_jpeg(rgb, q), f"jpeg{q}"))
+                if len(cands[-1][0]) <= budget:
+                    break
+        fit = [c for c in cands if len(c[0]) <= budget]
+        data, fmt = fit[0] if fit else min(cands, key=lambda c: len(c[0]))
+
+    _record(kind, fmt, len(data), rgb.width * rgb.height * 3, time.perf_counter() - t0)
+    return data
+
+
+# ------------------------- métricas ------------------------- #
+def _record(kind: str, fmt: str, size: int, raw: int, secs: float) -> None:
+    with _LOCK:
+        s = _STATS.setdefault(kind, {"count": 0, "bytes": 0, "raw": 0, "ms": 0.0, "formats": Counter()})
+        s["count"] += 1
+        s["bytes"] += size
+        s["raw"] += raw
+        s["ms"] += secs * 1000.0
+        s["formats"][fmt] += 1
+    log.debug("encode %s: %s %.1f KB en %.1f ms", kind, fmt, size / 1024, secs * 1000.0)
+
+def stats() -> Dict[str, Dict]:
+    """Por tipo: count, avg_kb, avg_ms, ratio (bytes/raw) y formatos elegidos."""
+    with _LOCK:
+        return {
+            k: {
+                "count": s["count"],
+                "avg_kb": s["bytes"] / s["count"] / 1024,
+                "avg_ms": s["ms"] / s["count"],
+                "ratio": s["bytes"] / max(1, s["raw"]),
+                "formats": dict(s["formats"]),
+            }
+            for k, s in _STATS.items() if s["count"]
+        }
+
+
+# ------------------------- nombres de archivo ------------------------- #
+_MAGIC: Tuple[Tuple[bytes, str], ...] = (
+    (b"\x89PNG", "png"),
+    (b"\xff\xd8\xff", "jpg"),
+    (b"GIF8", "gif"),
+)
+
+def ext_for(data: bytes) -> str:
+    """Extensión según los bytes (los renders cacheados no guardan el formato)."""
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "webp"
+    for magic, ext in _MAGIC:
+        if data.startswith(magic):
+            return ext
+    return "png"
+
+def filename(stem: str, data: bytes) -> str:
+    return f"{stem}.{ext_for(data)}"
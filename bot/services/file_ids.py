@@ -0,0 +1,147 @@
+# bot/services/file_ids.py
+from __future__ import annotations
+import hashlib
+import io
+import logging
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Union
+
+from telegram import InputFile, InputMediaDocument, InputMediaPhoto, Message
+from telegram.error import BadRequest
+
+from . import encoding
+
+log = logging.getLogger("file_ids")
+
+Data = Union[bytes, io.BytesIO]
+
+# errores del propio file_id (caducado/ajeno): solo estos justifican olvidarlo y volver a subir.
+# El resto (caption mal formado, mensaje demasiado largo, chat no encontrado...) fallaría igual al subir.
+_FILE_ID_ERRORS = ("wrong file identifier", "wrong remote file identifier", "file reference expired",
+                   "failed to get http url content", "wrong type of the web page content")
+
+
+class FileIdCache:
+    """LRU (tipo, hash de contenido) → file_id de Telegram. Mismos bytes → se envían por file_id."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max(0, int(max_entries))
+        self._data: "OrderedDict[str, str]" = OrderedDict()
+        self.hits = 0
+        self.uploads = 0
+        self.invalidations = 0
+
+    def get(self, key: str) -> Optional[str]:
+        fid = self._data.get(key)
+        if fid is not None:
+            self._data.move_to_end(key)
+        return fid
+
+    def put(self, key: str, file_id: str) -> None:
+        if self.max_entries <= 0:
+            return
+        self._data[key] = file_id
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+
+    def resize(self, max_entries: int) -> None:
+        self.max_entries = max(0, int(max_entries))
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+
+    def forget(self, key: str) -> None:
+        if self._data.pop(key, None) is not None:
+            self.invalidations += 1
+
+    def stats(self) -> Dict[str, int]:
+        return {"entries": len(self._data), "hits": self.hits,
+                "uploads": self.uploads, "invalidations": self.invalidations}
+
+
+_CACHE = FileIdCache(4096)
+
+def configure(max_entries: int) -> None:
+    """Tamaño de la caché (Config.file_id_cache), desde _post_init."""
+    _CACHE.resize(max_entries)
+
+def stats() -> Dict[str, int]:
+    return _CACHE.stats()
+
+
+# ------------------------- helpers ------------------------- #
+def _bytes(data: Data) -> bytes:
+    return data.getvalue() if isinstance(data, io.BytesIO) else bytes(data)
+
+def _key(kind: str, data: bytes) -> str:
+    # photo y document tienen file_id distintos aunque sean los mismos bytes
+    return kind + ":" + hashlib.blake2b(data, digest_size=20).hexdigest()
+
+def _file_id(kind: str, msg: Any) -> Optional[str]:
+    if not isinstance(msg, Message):
+        return None
+    if kind == "photo" and msg.photo:
+        return msg.photo[-1].file_id
+    if kind == "document" and msg.document:
+        return msg.document.file_id
+    return None
+
+def _remember(key: str, kind: str, msg: Any) -> None:
+    fid = _file_id(kind, msg)
+    if fid:
+        _CACHE.put(key, fid)
+
+def _upload(data: bytes, filename: Optional[str], stem: str) -> InputFile:
+    return InputFile(io.BytesIO(data), filename=filename or encoding.filename(stem, data))
+
+async def _send_or_upload(kind: str, data: Data, filename: Optional[str],
+                          call: Callable[[Any], Awaitable[Any]]) -> Any:
+    """
+    Prueba con el file_id cacheado; si Telegram lo rechaza, se invalida y se sube.
+    `call(media)` recibe file_id (str) o InputFile y hace el envío/edición.
+    """
+    raw = _bytes(data)
+    key = _key(kind, raw)
+    fid = _CACHE.get(key)
+    if fid is not None:
+        try:
+            out = await call(fid)
+            _CACHE.hits += 1
+            return out
+        except BadRequest as e:
+            if not any(s in str(e).lower() for s in _FILE_ID_ERRORS):
+                raise
+            log.info("file_id rechazado (%s); se vuelve a subir", e)
+            _CACHE.forget(key)
+
+    out = await call(_upload(raw, filename, kind))
+    _CACHE.uploads += 1
+    _remember(key, kind, out)
+    return out
+
+
+# ------------------------- API ------------------------- #
+async def send_photo(bot, chat_id: int, data: Data, filename: Optional[str] = None, **kwargs) -> Message:
+    """bot.send_photo por file_id si esos bytes ya se subieron (a cualquier chat)."""
+    return await _send_or_upload("photo", data, filename,
+                                 lambda media: bot.send_photo(chat_id=chat_id, photo=media, **kwargs))
+
+async def send_document(bot, chat_id: int, data: Data, filename: Optional[str] = None, **kwargs) -> Message:
+    return await _send_or_upload("document", data, filename,
+                                 lambda media: bot.send_document(chat_id=chat_id, document=media, **kwargs))
+
+async def reply_document(message: Message, data: Data, filename: Optional[str] = None, **kwargs) -> Message:
+    return await _send_or_upload("document", data, filename,
+                                 lambda media: message.reply_document(document=media, **kwargs))
+
+async def edit_media(edit: Callable[..., Awaitable[Any]], kind: str, data: Data, filename: Optional[str] = None,
+                     caption: Optional[str] = None, parse_mode: Optional[str] = None, **edit_kwargs) -> Any:
+    """
+    edit_message_media con file_id cacheado. `edit` es p.ej. bot.edit_message_media o
+    query.edit_message_media; `edit_kwargs` van a esa llamada (chat_id, message_id, reply_markup...).
+    """
+    media_cls = InputMediaPhoto if kind == "photo" else InputMediaDocument
+    return await _send_or_upload(
+        kind, data, filename,
+        lambda media: edit(media=media_cls(media=media, caption=caption, parse_mode=parse_mode), **edit_kwargs),
+    )
@@ -0,0 +1,202 @@
+# bot/services/instruments.py
+from __future__ import annotations
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+import requests
+
+from .disk_index import DiskIndex
+
+log = logging.getLogger("instruments")
+
+OKX_BASE = "https://www.okx.com"
+_PATH = "okx_instruments.json"  # Config.instruments_path / instruments_refresh_min (start)
+_MAX_AGE = 360 * 60
+
+TRADABLE = frozenset({"live", "suspend"})  # 'live' preferido
+
+
+def decimals_from_ticksz(tick: str) -> int:
+    # tickSz es string tipo "0.0001" o "0.01"
+    if not tick or "." not in tick:
+        return 0
+    frac = tick.rstrip("0").split(".")[1]
+    return max(0, len(frac))
+
+
+@dataclass(frozen=True)
+class Instrument:
+    inst_id: str
+    base: str
+    quote: str
+    tick_sz: str
+    lot_sz: str
+    min_sz: str
+    state: str
+
+    @property
+    def decimals(self) -> int:
+        return decimals_from_ticksz(self.tick_sz)
+
+    @property
+    def tradable(self) -> bool:
+        return self.state in TRADABLE
+
+    @staticmethod
+    def from_okx(it: Dict) -> Optional["Instrument"]:
+        inst_id = str(it.get("instId") or "").upper()
+        if not inst_id:
+            return None
+        return Instrument(
+            inst_id=inst_id,
+            base=str(it.get("baseCcy") or "").upper(),
+            quote=str(it.get("quoteCcy") or "").upper(),
+            tick_sz=str(it.get("tickSz") or ""),
+            lot_sz=str(it.get("lotSz") or ""),
+            min_sz=str(it.get("minSz") or ""),
+            state=str(it.get("state") or ""),
+        )
+
+
+class InstrumentCatalog(DiskIndex):
+    """
+    Catálogo SPOT de OKX en memoria, indexado por instId y por baseCcy.
+    Se descarga entero (una petición), se guarda en disco y se refresca cada `max_age` s.
+    Las búsquedas son lecturas de dict; el refresco sustituye los índices de golpe.
+    """
+
+    name = "OKX instruments"
+
+    def __init__(self, path: str, max_age: float):
+        super().__init__(path, max_age)
+        self._by_id: Dict[str, Instrument] = {}
+        self._by_base: Dict[str, List[Instrument]] = {}
+        self._last_try = 0.0
+
+    # --- consultas ---
+    def __len__(self) -> int:
+        return len(self._by_id)
+
+    def get(self, inst_id: str) -> Optional[Instrument]:
+        return self._by_id.get((inst_id or "").strip().upper())
+
+    def by_base(self, base: str) -> List[Instrument]:
+        return list(self._by_base.get((base or "").strip().upper(), ()))
+
+    def find(self, base: str, quotes: Iterable[str] = ("USDT", "USDC", "USD")) -> Optional[Instrument]:
+        """Par base-quote por preferencia de quote (operables primero); si no, cualquiera de esa base."""
+        items = self._by_base.get((base or "").strip().upper(), [])
+        for q in quotes:
+            for it in items:
+                if it.quote == q and it.tradable:
+                    return it
+        return items[0] if items else None
+
+    # --- carga / refresco ---
+    def _index(self, items: Iterable[Instrument], fetched_at: float) -> None:
+        by_id: Dict[str, Instrument] = {}
+        by_base: Dict[str, List[Instrument]] = {}
+        for it in items:
+            by_id[it.inst_id] = it
+            by_base.setdefault(it.base, []).append(it)
+        self._by_id, self._by_base, self.fetched_at = by_id, by_base, fetched_at
+
+    def _add(self, inst: Instrument) -> None:
+        # copia y sustitución: los lectores nunca ven un índice a medias
+        by_id = dict(self._by_id)
+        by_id[inst.inst_id] = inst
+        by_base = dict(self._by_base)
+        by_base[inst.base] = [i for i in by_base.get(inst.base, []) if i.inst_id != inst.inst_id] + [inst]
+        self._by_id, self._by_base = by_id, by_base
+
+    # --- DiskIndex ---
+    def _download(self) -> Optional[List[Any]]:
+        r = requests.get(f"{OKX_BASE}/api/v5/public/instruments", params={"instType": "SPOT"}, timeout=15)
+        if r.status_code != 200:
+            log.warning("OKX instruments HTTP %s", r.status_code)
+            return None
+        keep = ("instId", "baseCcy", "quoteCcy", "tickSz", "lotSz", "minSz", "state")
+        return [{k: d.get(k) for k in keep} for d in (r.json().get("data", []) or []) if d.get("instId")]
+
+    def _parse(self, raw: List[Any]) -> List[Instrument]:
+        return [i for i in (Instrument.from_okx(d) for d in raw) if i]
+
+    def fetch_one_sync(self, inst_id: str) -> Optional[Instrument]:
+        """Un solo instId (p.ej. listado después del último refresco); se añade al índice."""
+        try:
+            r = requests.get(f"{OKX_BASE}/api/v5/public/instruments",
+                             params={"instType": "SPOT", "instId": inst_id.strip().upper()}, timeout=10)
+            if r.status_code != 200:
+                return None
+            data = r.json().get("data", []) or []
+            inst = Instrument.from_okx(data[0]) if data else None
+        except Exception as e:
+            log.info("OKX instrument %s: %s", inst_id, e)
+            return None
+        if inst is not None:
+            self._add(inst)
+        return inst
+
+    def ensure_sync(self, retry_sec: float = 60.0) -> bool:
+        """
+        Disco o, si no hay catálogo completo, descarga bloqueante (como mucho una cada `retry_sec`).
+        Los instrumentos sueltos de fetch_one_sync no cuentan: sin catálogo se sigue reintentando.
+        """
+        if self.complete or self.load():
+            return True
+        if time.time() - self._last_try < retry_sec:
+            return False
+        self._last_try = time.time()
+        return self.refresh_sync()
+
+
+_CATALOG = InstrumentCatalog(_PATH, _MAX_AGE)
+
+def catalog() -> InstrumentCatalog:
+    return _CATALOG
+
+def get(inst_id: str) -> Optional[Instrument]:
+    return _CATALOG.get(inst_id)
+
+def find(base: str, quotes: Iterable[str] = ("USDT", "USDC", "USD")) -> Optional[Instrument]:
+    return _CATALOG.find(base, quotes)
+
+async def refresh() -> bool:
+    return await asyncio.to_thread(_CATALOG.refresh_sync)
+
+async def prefetch(*inst_ids: str) -> None:
+    """
+    Deja en memoria el tickSz de estos símbolos (red en hilos, nunca en el loop).
+    Sin catálogo todavía → se carga/descarga entero; si falta alguno → consulta puntual.
+    """
+    ids = {i.strip().upper() for i in inst_ids if i and i.strip()}
+    missing = [i for i in ids if _CATALOG.get(i) is None]
+    if missing and not _CATALOG.complete:
+        await asyncio.to_thread(_CATALOG.ensure_sync)
+        missing = [i for i in missing if _CATALOG.get(i) is None]
+    if missing:
+        await asyncio.gather(*(asyncio.to_thread(_CATALOG.fetch_one_sync, i) for i in missing))
+
+_TASKS: Set[asyncio.Task] = set()
+
+def prefetch_soon(*inst_ids: str) -> asyncio.Task:
+    """prefetch en segundo plano (p.ej. justo después de /setsymbol)."""
+    task = asyncio.get_running_loop().create_task(prefetch(*inst_ids))
+    _TASKS.add(task)
+    task.add_done_callback(_TASKS.discard)
+    return task
+
+async def start(app, symbols: Iterable[str] = (), path: Optional[str] = None, max_age: Optional[float] = None) -> None:
+    """Arranque: carga de disco, prefetch de los símbolos configurados y refresco periódico."""
+    _CATALOG.configure(path, max_age)
+    await asyncio.to_thread(_CATALOG.load)
+    if _CATALOG.loaded:
+        prefetch_soon(*symbols)  # sin catálogo lo cubre el primer refresco (inmediato)
+    _CATALOG.schedule(app, refresh_job, "okx_instruments")
+
+async def refresh_job(ctx) -> None:
+    if not await refresh():
+        _CATALOG.retry_later(ctx.job_queue, refresh_job, "okx_instruments")
@@ -0,0 +1,197 @@
+# bot/services/outbox.py
+from __future__ import annotations
+import asyncio
+import heapq
+import io
+import itertools
+import logging
+from dataclasses import dataclass, field
+from datetime import timedelta
+from typing import Any, Dict, Hashable, List, Optional, Set, Tuple
+
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter
+
+from . import file_ids
+
+log = logging.getLogger("outbox")
+
+# clases de prioridad (menor = antes)
+ALERT = 0   # entrada / TP / SL / trailing / peligro
+TEXT = 1    # avisos informativos
+IMAGE = 2   # gráficas
+
+
+@dataclass(order=True)
+class _Item:
+    prio: int
+    seq: int
+    chat_id: int = field(compare=False)
+    kind: str = field(compare=False)                 # "text" | "photo"
+    payload: Dict[str, Any] = field(compare=False)
+    key: Optional[Hashable] = field(default=None, compare=False)
+    attempts: int = field(default=0, compare=False)
+    cancelled: bool = field(default=False, compare=False)
+
+
+class Outbox:
+    """
+    Cola de salida a Telegram con prioridades (ALERT > TEXT > IMAGE, FIFO dentro de cada clase).
+    - `key`: un mensaje nuevo con la misma (chat, key) reemplaza al anterior aún no entregado.
+    - Entrega en segundo plano con `workers` tareas; nunca dos envíos a la vez al mismo chat
+      (se conserva el orden por chat).
+    - RetryAfter: espera lo indicado y reintenta; errores de red: backoff exponencial.
+    """
+
+    def __init__(self, bot, workers: int = 4, max_attempts: int = 5, backoff: float = 1.0):
+        self.bot = bot
+        self.workers = max(1, int(workers))
+        self.max_attempts = max(1, int(max_attempts))
+        self.backoff = float(backoff)
+        self._heap: List[_Item] = []
+        self._seq = itertools.count()
+        self._by_key: Dict[Tuple[int, Hashable], _Item] = {}
+        self._busy: Set[int] = set()
+        self._inflight = 0
+        self._wake: Optional[asyncio.Event] = None
+        self._tasks: List[asyncio.Task] = []
+        self.sent = 0
+        self.coalesced = 0
+        self.dropped = 0
+
+    # --- encolar (no bloquea) ---
+    def put(self, chat_id: int, kind: str, prio: int, key: Optional[Hashable] = None, **payload) -> None:
+        item = _Item(prio, next(self._seq), chat_id, kind, payload, key)
+        if key is not None:
+            old = self._by_key.get((chat_id, key))
+            if old is not None and not old.cancelled:
+                old.cancelled = True
+                self.coalesced += 1
+            self._by_key[(chat_id, key)] = item
+        heapq.heappush(self._heap, item)
+        if self._wake is not None:
+            self._wake.set()
+
+    def text(self, chat_id: int, text: str, prio: int = TEXT, key: Optional[Hashable] = None, **kwargs) -> None:
+        self.put(chat_id, "text", prio, key, text=text, **kwargs)
+
+    def photo(self, chat_id: int, data, caption: Optional[str] = None, prio: int = IMAGE,
+              key: Optional[Hashable] = None, **kwargs) -> None:
+        raw = data.getvalue() if isinstance(data, io.BytesIO) else bytes(data)
+        self.put(chat_id, "photo", prio, key, data=raw, caption=caption, **kwargs)
+
+    def pending(self) -> int:
+        return sum(1 for it in self._heap if not it.cancelled) + self._inflight
+
+    def stats(self) -> Dict[str, int]:
+        return {"pending": self.pending(), "sent": self.sent, "coalesced": self.coalesced, "dropped": self.dropped}
+
+    # --- entrega ---
+    async def _deliver(self, item: _Item) -> None:
+        p = dict(item.payload)
+        if item.kind == "text":
+            await self.bot.send_message(chat_id=item.chat_id, **p)
+        else:
+            await file_ids.send_photo(self.bot, item.chat_id, p.pop("data"), **p)
+
+    def _next(self) -> Optional[_Item]:
+        """Siguiente item vigente cuyo chat no esté ocupado (los saltados vuelven a la cola)."""
+        skipped, found = [], None
+        while self._heap:
+            item = heapq.heappop(self._heap)
+            if item.cancelled:
+                continue
+            if item.chat_id in self._busy:
+                skipped.append(item)
+                continue
+            found = item
+            break
+        for it in skipped:
+            heapq.heappush(self._heap, it)
+        return found
+
+    async def _run(self) -> None:
+        while True:
+            item = self._next()
+            if item is None:
+                self._wake.clear()
+                await self._wake.wait()
+                continue
+            if item.key is not None and self._by_key.get((item.chat_id, item.key)) is item:
+                self._by_key.pop((item.chat_id, item.key), None)
+            self._busy.add(item.chat_id)
+            self._inflight += 1
+            try:
+                await self._attempt(item)
+            finally:
+                self._inflight -= 1
+                self._busy.discard(item.chat_id)
+                self._wake.set()  # el chat quedó libre: otro worker puede tomar su siguiente mensaje
+
+    async def _attempt(self, item: _Item) -> None:
+        try:
+            await self._deliver(item)
+            self.sent += 1
+            return
+        except RetryAfter as e:
+            ra = e.retry_after
+            delay = ra.total_seconds() if isinstance(ra, timedelta) else float(ra)
+            log.info("RetryAfter %.1fs (chat %s)", delay, item.chat_id)
+        except (Forbidden, BadRequest) as e:
+            # chat bloqueado/borrado o mensaje inválido: reintentar no sirve
+            self.dropped += 1
+            log.warning("outbox: descartado chat %s (%s)", item.chat_id, e)
+            return
+        except NetworkError as e:
+            delay = self.backoff * (2 ** item.attempts)
+            log.info("outbox: error de red chat %s (%s); reintento en %.1fs", item.chat_id, e, delay)
+        except Exception as e:
+            self.dropped += 1
+            log.warning("outbox: error inesperado chat %s: %s", item.chat_id, e)
+            return
+
+        item.attempts += 1
+        if item.attempts >= self.max_attempts:
+            self.dropped += 1
+            log.warning("outbox: descartado chat %s tras %s intentos", item.chat_id, item.attempts)
+            return
+        await asyncio.sleep(delay)
+        # vuelve con su prioridad y orden originales (salvo que algo más nuevo lo haya reemplazado)
+        if item.key is None or (item.chat_id, item.key) not in self._by_key:
+            if item.key is not None:
+                self._by_key[(item.chat_id, item.key)] = item
+            heapq.heappush(self._heap, item)
+
+    # --- ciclo de vida ---
+    @property
+    def running(self) -> bool:
+        return any(not t.done() for t in self._tasks)
+
+    def start(self) -> "Outbox":
+        if self.running:
+            return self
+        self._wake = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        self._tasks = [loop.create_task(self._run(), name=f"outbox:{i}") for i in range(self.workers)]
+        if self._heap:
+            self._wake.set()
+        return self
+
+    async def drain(self, timeout: float = 10.0) -> bool:
+        """Espera a que se entregue lo pendiente (o se agote `timeout`)."""
+        loop = asyncio.get_running_loop()
+        end = loop.time() + timeout
+        while self.pending() and loop.time() < end:
+            await asyncio.sleep(0.05)
+        return not self.pending()
+
+    async def stop(self, drain_timeout: float = 10.0) -> None:
+        if self.running and not await self.drain(drain_timeout):
+            log.warning("outbox: %s mensajes sin entregar al apagar", self.pending())
+        tasks, self._tasks = self._tasks, []
+        for t in tasks:
+            t.cancel()
+        for t in tasks:
+            try:
+                await t
+            except asyncio.CancelledError:
+                pass
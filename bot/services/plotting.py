@@ -1,14 +1,15 @@
 from __future__ import annotations
 import io
-from typing import Dict, Optional
+import threading
+from typing import Dict, Optional, Tuple
 
-import matplotlib
-matplotlib.use("Agg")  # backend sin GUI
-import matplotlib.pyplot as plt
+import matplotlib.dates as mdates
 from matplotlib.ticker import FuncFormatter, AutoMinorLocator
 
 import pandas as pd
 
+from . import encoding
+from .canvas import new_figure, to_image
 from .formatting import fmt_price, get_symbol_decimals
 
 # Paleta solicitada
@@ -23,8 +24,115 @@ LEVEL_COLORS = {
     "F618":"#1b5e20",  # verde oscuro
 }
 
-def _fmt(inst_id: Optional[str], v: float) -> str:
-    return fmt_price(inst_id or "", float(v))
+def _fmt(inst_id: Optional[str], v: float, dp: Optional[int] = None) -> str:
+    return fmt_price(inst_id or "", float(v), dp)
+
+class _ChartTemplate:
+    """
+    Figura persistente para la gráfica de alertas: ejes, formateadores, grid y líneas
+    se crean una vez; cada render sólo actualiza datos/niveles y redibuja el canvas.
+    """
+
+    def __init__(self, figsize=(9.2, 5.2), dpi=150):
+        self.dp = 4
+        fig = self.fig = new_figure(figsize, dpi)
+        ax = self.ax = fig.add_subplot()
+        sp = fig.subplotpars
+        self._margins = dict(left=sp.left, right=sp.right, bottom=sp.bottom, top=sp.top)
+        ax.xaxis_date()
+
+        # Serie principal + EMAs (colores del ciclo por defecto, como antes)
+        self.price_line, = ax.plot([], [], label="Precio", linewidth=1.4, color="C0")
+        self.ema_lines = tuple(
+            ax.plot([], [], label=lbl, linewidth=1.0, alpha=0.95, color=col)[0]
+            for lbl, col in (("EMA20", "C1"), ("EMA50", "C2"), ("EMA200", "C3"))
+        )
+
+        # Niveles horizontales (ocultos hasta que haya valor); F618 más notorio
+        trans = ax.get_yaxis_transform()
+        self.levels = {}
+        for key in ("S3", "S2", "S1", "P", "R1", "R2", "R3", "F618"):
+            color = LEVEL_COLORS.get(key, "#9e9e9e")
+            fib = key == "F618"
+            line = ax.axhline(0.0, color=color, linewidth=1.3 if fib else 1.0,
+                              linestyle="-." if fib else "--", label=key, visible=False)
+            # etiqueta pequeña al borde derecho
+            text = ax.text(
+                1.002, 0.0, "",
+                transform=trans,
+                va="center", ha="left",
+                fontsize=8, color=color,
+                bbox=dict(boxstyle="round,pad=0.2", fc="white", ec="none", alpha=0.75 if fib else 0.7),
+                visible=False,
+            )
+            self.levels[key] = (line, text)
+
+        # Estética
+        ax.set_xlabel("Tiempo", fontsize=10)
+        ax.set_ylabel("Precio", fontsize=10)
+
+        # Eje Y con formateador por símbolo/decimales (lee self.dp en cada render)
+        ax.yaxis.set_major_formatter(FuncFormatter(lambda y, _: f"{y:.{self.dp}f}"))
+        ax.yaxis.set_minor_locator(AutoMinorLocator(2))
+
+        # Grid
+        ax.grid(True, which="major", alpha=0.28)
+        ax.grid(True, which="minor", alpha=0.12)
+
+    def render(self, df, levels, emas, title: str, inst_id: Optional[str], dp: int, draw_labels: bool) -> io.BytesIO:
+        ax = self.ax
+        t = mdates.date2num(pd.to_datetime(df["time"]).tolist())
+        self.price_line.set_data(t, df["close"].to_numpy(dtype=float))
+        for line, s in zip(self.ema_lines, emas):
+            y = s.tail(len(df)).to_numpy(dtype=float)
+            line.set_data(t[len(t) - len(y):], y)
+
+        handles = [self.price_line, *self.ema_lines]
+        for key, (line, text) in self.levels.items():
+            v = levels.get(key)
+            show = v is not None and pd.notna(v)
+            line.set_visible(show)
+            text.set_visible(show and draw_labels)
+            if show:
+                v = float(v)
+                line.set_ydata([v, v])
+                text.set_y(v)
+                text.set_text(f" {key} {_fmt(inst_id, v, dp)}")
+                handles.append(line)
+
+        # sólo líneas (sin colecciones): relim recalcula límites con los artistas visibles
+        ax.relim(visible_only=True)
+        ax.autoscale_view()
+
+        self.dp = dp
+        ax.set_title(title, fontsize=12, pad=10)
+
+        # Leyenda compacta (sólo lo visible)
+        ax.legend(handles=handles, fontsize=8, loc="upper left", ncol=4, frameon=False)
+
+        # Márgenes
+        # tight_layout parte siempre de los márgenes iniciales (idempotente entre renders)
+        self.fig.subplots_adjust(**self._margins)
+        self.fig.tight_layout()
+
+        # Rasterizar y codificar (formato/tamaño según contenido y presupuesto)
+        return io.BytesIO(encoding.encode(to_image(self.fig), kind="plot15"))
+
+
+# Una plantilla por hilo y tamaño: los renders en hilos (sin pool) ya no se serializan
+# entre sí; en un worker del pool (un solo hilo) sigue habiendo una por proceso.
+_LOCAL = threading.local()
+
+def _template(figsize=(9.2, 5.2), dpi=150) -> _ChartTemplate:
+    key = (tuple(figsize), int(dpi))
+    templates = getattr(_LOCAL, "templates", None)
+    if templates is None:
+        templates = _LOCAL.templates = {}
+    tpl = templates.get(key)
+    if tpl is None:
+        tpl = templates[key] = _ChartTemplate(figsize, dpi)
+    return tpl
+
 
 def plot_chart(
     df_price: pd.DataFrame,
@@ -36,6 +144,7 @@ def plot_chart(
     inst_id: Optional[str] = None,
     max_bars: int = 220,
     draw_labels: bool = True,
+    dp: Optional[int] = None,
 ) -> io.BytesIO:
     """
     Renderiza la gráfica 15m con EMAs y niveles.
@@ -43,86 +152,22 @@ def plot_chart(
                si es None, se usa un fallback por magnitud del precio.
     - max_bars: últimos N puntos a mostrar.
     - draw_labels: dibuja pequeñas etiquetas de texto sobre cada nivel.
+    - dp: decimales ya resueltos (los workers del pool no tienen el catálogo de OKX).
+    La figura es una plantilla persistente: sólo se actualizan los datos.
     """
     if df_price is None or len(df_price) == 0:
         raise ValueError("df_price vacío")
 
     # Ventana
-    df = df_price.tail(max_bars).copy()
-    t = df["time"]
-    close = df["close"]
+    df = df_price.tail(max_bars)
 
     # Decimales recomendados (para ejes y textos)
-    try:
-        sample_price = float(close.iloc[-1])
-    except Exception:
-        sample_price = None
-    dp = get_symbol_decimals(inst_id or "", sample_price)
-
-    # --- Figura
-    fig = plt.figure(figsize=(9.2, 5.2), dpi=150)
-    ax = plt.gca()
-
-    # Serie principal + EMAs
-    ax.plot(t, close, label="Precio", linewidth=1.4)
-    ax.plot(t, ema20.tail(len(df)), label="EMA20", linewidth=1.0, alpha=0.95)
-    ax.plot(t, ema50.tail(len(df)), label="EMA50", linewidth=1.0, alpha=0.95)
-    ax.plot(t, ema200.tail(len(df)), label="EMA200", linewidth=1.0, alpha=0.95)
-
-    # Niveles horizontales
-    def hline(key: str, lw=1.0, ls="--"):
-        if key in levels and pd.notna(levels[key]):
-            ax.axhline(levels[key], color=LEVEL_COLORS.get(key, "#9e9e9e"), linewidth=lw, linestyle=ls, label=key)
-            if draw_labels:
-                # etiqueta pequeña al borde derecho
-                ax.text(
-                    1.002, levels[key],
-                    f" {key} {_fmt(inst_id, levels[key])}",
-                    transform=ax.get_yaxis_transform(),
-                    va="center", ha="left",
-                    fontsize=8, color=LEVEL_COLORS.get(key, "#9e9e9e"),
-                    bbox=dict(boxstyle="round,pad=0.2", fc="white", ec="none", alpha=0.7)
-                )
-
-    # Pivotes
-    for k in ("S3", "S2", "S1", "P", "R1", "R2", "R3"):
-        hline(k, lw=1.0, ls="--")
-
-    # Fibo 0.618, si existe, más notorio
-    if "F618" in levels and pd.notna(levels["F618"]):
-        ax.axhline(levels["F618"], color=LEVEL_COLORS["F618"], linewidth=1.3, linestyle="-.", label="F618")
-        if draw_labels:
-            ax.text(
-                1.002, levels["F618"],
-                f" F618 {_fmt(inst_id, levels['F618'])}",
-                transform=ax.get_yaxis_transform(),
-                va="center", ha="left",
-                fontsize=8, color=LEVEL_COLORS["F618"],
-                bbox=dict(boxstyle="round,pad=0.2", fc="white", ec="none", alpha=0.75)
-            )
-
-    # Estética
-    ax.set_title(title, fontsize=12, pad=10)
-    ax.set_xlabel("Tiempo", fontsize=10)
-    ax.set_ylabel("Precio", fontsize=10)
-
-    # Eje Y con formateador por símbolo/decimales
-    ax.yaxis.set_major_formatter(FuncFormatter(lambda y, _: f"{y:.{dp}f}"))
-    ax.yaxis.set_minor_locator(AutoMinorLocator(2))
-
-    # Grid
-    ax.grid(True, which="major", alpha=0.28)
-    ax.grid(True, which="minor", alpha=0.12)
-
-    # Leyenda compacta
-    ax.legend(fontsize=8, loc="upper left", ncol=4, frameon=False)
-
-    # Márgenes
-    plt.tight_layout()
-
-    # Guardar a buffer
-    buf = io.BytesIO()
-    plt.savefig(buf, format="png")
-    plt.close(fig)
-    buf.seek(0)
-    return buf
+    if dp is None:
+        try:
+            sample_price = float(df["close"].iloc[-1])
+        except Exception:
+            sample_price = None
+        dp = get_symbol_decimals(inst_id or "", sample_price)
+
+    tpl = _template()
+    return tpl.render(df, levels or {}, (ema20, ema50, ema200), title, inst_id, dp, draw_labels)
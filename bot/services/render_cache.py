@@ -0,0 +1,126 @@
+# bot/services/render_cache.py
+from __future__ import annotations
+import hashlib
+import io
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+# ------------------------- hash de entradas ------------------------- #
+def _feed(h, obj: Any) -> None:
+    """Alimenta el hash con todo lo que afecta a la imagen (DataFrames/Series por contenido)."""
+    if obj is None:
+        h.update(b"N")
+    elif isinstance(obj, (pd.DataFrame, pd.Series)):
+        h.update(b"D" if isinstance(obj, pd.DataFrame) else b"S")
+        if isinstance(obj, pd.DataFrame):
+            h.update(repr(list(obj.columns)).encode())
+        h.update(pd.util.hash_pandas_object(obj, index=False).to_numpy().tobytes())
+    elif isinstance(obj, np.ndarray):
+        h.update(b"A" + str(obj.dtype).encode())
+        h.update(np.ascontiguousarray(obj).tobytes())
+    elif isinstance(obj, dict):
+        h.update(b"{")
+        for k in sorted(obj, key=str):
+            _feed(h, k); _feed(h, obj[k])
+        h.update(b"}")
+    elif isinstance(obj, (list, tuple)):
+        h.update(b"[")
+        for x in obj:
+            _feed(h, x)
+        h.update(b"]")
+    else:
+        h.update(type(obj).__name__.encode() + b":" + repr(obj).encode())
+
+def make_key(*parts: Any) -> str:
+    h = hashlib.blake2b(digest_size=20)
+    for p in parts:
+        _feed(h, p)
+    return h.hexdigest()
+
+
+# ------------------------- LRU por bytes ------------------------- #
+class RenderCache:
+    """LRU de bytes renderizados (PNG/JPEG) acotada por tamaño total. Thread-safe."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max(0, int(max_bytes))
+        self._data: "OrderedDict[str, bytes]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            data = self._data.get(key)
+            if data is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return data
+
+    def put(self, key: str, data: bytes) -> None:
+        if len(data) > self.max_bytes:
+            return  # no cabe: no desalojamos todo por una sola imagen
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self._size -= len(old)
+            self._data[key] = data
+            self._size += len(data)
+            while self._size > self.max_bytes and self._data:
+                _, ev = self._data.popitem(last=False)
+                self._size -= len(ev)
+
+    def resize(self, max_bytes: int) -> None:
+        with self._lock:
+            self.max_bytes = max(0, int(max_bytes))
+            while self._size > self.max_bytes and self._data:
+                _, ev = self._data.popitem(last=False)
+                self._size -= len(ev)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._size = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"entries": len(self._data), "bytes": self._size,
+                    "hits": self.hits, "misses": self.misses}
+
+
+_CACHE = RenderCache(32 * 1024 * 1024)
+
+def configure(max_mb: float) -> None:
+    """Tamaño de la caché (Config.render_cache_mb), desde _post_init."""
+    _CACHE.resize(int(float(max_mb) * 1024 * 1024))
+
+def get(key: str) -> Optional[bytes]:
+    return _CACHE.get(key)
+
+def put(key: str, data: bytes) -> None:
+    _CACHE.put(key, data)
+
+def stats() -> Dict[str, int]:
+    return _CACHE.stats()
+
+def cached(namespace: str, fn: Callable[..., Any], *args, **kwargs) -> io.BytesIO:
+    """
+    Devuelve un BytesIO nuevo con el render de fn(*args, **kwargs).
+    La clave es el hash de (namespace, args, kwargs): chats con las mismas entradas
+    (misma vela, niveles, tema, precisión...) comparten los bytes sin re-renderizar.
+    `fn` puede devolver BytesIO o bytes.
+    """
+    key = make_key(namespace, args, kwargs)
+    data = _CACHE.get(key)
+    if data is None:
+        out = fn(*args, **kwargs)
+        data = out.getvalue() if isinstance(out, io.BytesIO) else bytes(out)
+        _CACHE.put(key, data)
+    return io.BytesIO(data)
@@ -0,0 +1,156 @@
+# bot/services/render_pool.py
+from __future__ import annotations
+import asyncio
+import io
+import logging
+import multiprocessing as mp
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+from . import render_cache
+from .formatting import get_symbol_decimals
+
+log = logging.getLogger("render_pool")
+
+_POOL: Optional[ProcessPoolExecutor] = None
+_WORKERS = 0
+_BUDGET: Optional[float] = None  # presupuesto de imagen de los workers (se repite al recrear el pool)
+_RESTART: Optional[asyncio.Task] = None
+
+
+# ------------------------- payload compacto ------------------------- #
+def _pack_df(df: pd.DataFrame) -> Dict[str, np.ndarray]:
+    out = {"time": pd.to_datetime(df["time"]).to_numpy(dtype="datetime64[ns]").view("int64")}
+    for c in ("open", "high", "low", "close"):
+        if c in df.columns:
+            out[c] = df[c].to_numpy(dtype=float)
+    return out
+
+def _unpack_df(arrs: Dict[str, np.ndarray]) -> pd.DataFrame:
+    cols = {"time": pd.to_datetime(arrs["time"], unit="ns")}
+    cols.update({k: v for k, v in arrs.items() if k != "time"})
+    return pd.DataFrame(cols)
+
+def _pack_series(s) -> np.ndarray:
+    return np.asarray(s, dtype=float)
+
+
+# ------------------------- lado worker ------------------------- #
+def _warm(image_budget_kb: Optional[float] = None) -> None:
+    """
+    Inicializador: carga matplotlib, fuentes y crea las plantillas de figura una sola vez por proceso.
+    Los workers (spawn) no heredan la configuración del principal: el presupuesto de imagen llega aquí.
+    """
+    from ..handlers.commands import grafica
+    from . import encoding, plotting
+    if image_budget_kb is not None:
+        encoding.configure(image_budget_kb)
+    n = 60
+    t = pd.date_range("2000-01-01", periods=n, freq="15min")
+    c = pd.Series(np.linspace(1.0, 2.0, n))
+    df = pd.DataFrame({"time": t, "open": c, "high": c, "low": c, "close": c})
+    for dark in (False, True):
+        grafica.plot_chart(df, {}, c, c, c, title="warm", dark=dark)
+    plotting.plot_chart(df, {}, c, c, c, title="warm")
+
+def _ping() -> int:
+    return os.getpid()
+
+def _render_grafica(arrs, levels, e20, e50, e200, kwargs) -> bytes:
+    from ..handlers.commands.grafica import plot_chart
+    return plot_chart(_unpack_df(arrs), levels, pd.Series(e20), pd.Series(e50), pd.Series(e200), **kwargs).getvalue()
+
+def _render_plot15(arrs, levels, e20, e50, e200, kwargs) -> bytes:
+    from .plotting import plot_chart
+    return plot_chart(_unpack_df(arrs), levels, pd.Series(e20), pd.Series(e50), pd.Series(e200), **kwargs).getvalue()
+
+
+# ------------------------- ciclo de vida ------------------------- #
+async def start(workers: Optional[int] = None, image_budget_kb: Optional[float] = None) -> int:
+    """Crea el pool (spawn) y calienta todos los workers. workers=0 → sin pool (hilos)."""
+    global _POOL, _WORKERS, _BUDGET
+    if _POOL is not None:
+        return _WORKERS
+    n = (os.cpu_count() or 1) if workers is None else int(workers)
+    if n <= 0:
+        return 0
+    _BUDGET = image_budget_kb
+    _POOL = ProcessPoolExecutor(max_workers=n, mp_context=mp.get_context("spawn"), initializer=_warm, initargs=(image_budget_kb,))
+    _WORKERS = n
+    loop = asyncio.get_running_loop()
+    try:
+        pids = await asyncio.gather(*(loop.run_in_executor(_POOL, _ping) for _ in range(n)))
+        log.info("render pool listo: %s workers (%s calientes)", n, len(set(pids)))
+    except Exception as e:
+        log.warning("render pool no disponible, se usan hilos: %s", e)
+        await stop()
+    return _WORKERS
+
+async def stop() -> None:
+    global _POOL, _WORKERS
+    pool, _POOL, _WORKERS = _POOL, None, 0
+    if pool is not None:
+        await asyncio.to_thread(pool.shutdown, True, cancel_futures=True)
+
+async def _restart(broken: ProcessPoolExecutor) -> None:
+    """Recrea el pool roto con los mismos workers y presupuesto, solo si sigue siendo el activo."""
+    if _POOL is not broken:
+        return
+    workers = _WORKERS
+    await stop()
+    await start(workers, _BUDGET)
+
+
+# ------------------------- API async ------------------------- #
+def _with_dp(df: pd.DataFrame, kwargs: Dict[str, Any]) -> Dict[str, Any]:
+    """Decimales resueltos aquí (catálogo OKX en memoria del proceso principal) y enviados al worker."""
+    if kwargs.get("dp") is None and kwargs.get("inst_id"):
+        try:
+            kwargs = dict(kwargs, dp=get_symbol_decimals(kwargs["inst_id"], float(df["close"].iloc[-1])))
+        except Exception:
+            pass
+    return kwargs
+
+async def _render(namespace: str, worker_fn: Callable, local_fn: Callable,
+                  df: pd.DataFrame, levels: Dict[str, float], ema20, ema50, ema200,
+                  kwargs: Dict[str, Any]) -> io.BytesIO:
+    global _RESTART
+    key = render_cache.make_key(namespace, (df, levels, ema20, ema50, ema200), kwargs)
+    data = render_cache.get(key)
+    if data is not None:
+        return io.BytesIO(data)
+
+    pool = _POOL
+    if pool is not None:
+        try:
+            data = await asyncio.get_running_loop().run_in_executor(
+                pool, worker_fn, _pack_df(df), dict(levels or {}),
+                _pack_series(ema20), _pack_series(ema50), _pack_series(ema200), kwargs,
+            )
+        except BrokenProcessPool as e:
+            # Varios renders caen a la vez con el mismo pool: solo el primero lo recrea, y uno que
+            # falle tarde con el pool viejo no debe parar el nuevo.
+            if _POOL is pool and (_RESTART is None or _RESTART.done()):
+                log.warning("render pool roto (%s); se recrea y se usa hilo para este render", e)
+                _RESTART = asyncio.get_running_loop().create_task(_restart(pool))
+    if data is None:
+        out = await asyncio.to_thread(local_fn, df, levels, ema20, ema50, ema200, **kwargs)
+        data = out.getvalue()
+
+    render_cache.put(key, data)
+    return io.BytesIO(data)
+
+async def render_grafica(df, levels, ema20, ema50, ema200, **kwargs) -> io.BytesIO:
+    """grafica.plot_chart en un worker caliente (o hilo si no hay pool)."""
+    from ..handlers.commands.grafica import plot_chart
+    return await _render("grafica", _render_grafica, plot_chart, df, levels, ema20, ema50, ema200, _with_dp(df, kwargs))
+
+async def render_plot15(df, levels, ema20, ema50, ema200, **kwargs) -> io.BytesIO:
+    """plotting.plot_chart (alertas del heartbeat) en un worker caliente."""
+    from .plotting import plot_chart
+    return await _render("plot15", _render_plot15, plot_chart, df, levels, ema20, ema50, ema200, _with_dp(df, kwargs))
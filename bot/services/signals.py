@@ -0,0 +1,303 @@
+# bot/services/signals.py
+"""
+Motor de señales puro: sin Telegram, BD ni red.
+
+Entrada: velas (o features ya calculadas), niveles, ajustes del chat y estado previo.
+Salida: decisiones (entrada, TP/SL/trailing, debilidad, peligro) y el estado siguiente.
+
+Las reglas leen un mapeo nombre → valor (ver FIELDS): con escalares las usa el heartbeat y /estado,
+con arrays de numpy el backtest y los barridos (mismo código, vectorizado).
+"""
+from __future__ import annotations
+from dataclasses import dataclass, field, replace
+from typing import Dict, List, Mapping, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .indicators import ema, rsi, macd, modo_params
+
+# columnas que consumen las reglas (backtest.features produce exactamente estas)
+FIELDS: Tuple[str, ...] = (
+    "close", "low", "prev_close",
+    "rsi15", "rsi15_prev", "macd15_up", "hist15_up", "ema20", "ema50", "ema200",
+    "macd5_up", "rsi5",
+    "rsi4", "e4_20", "e4_50", "e4_200", "close4",
+    "S1", "S2", "F618",
+)
+
+COOLDOWN_BARS = 6      # velas de 15m entre entradas (modo precisión, ~90 min)
+TRAIL_ARM = 0.01       # el trailing se arma con +1%
+TRAIL_DD = 0.008       # y salta con un retroceso de 0.8% desde el máximo
+BAR15 = pd.Timedelta(minutes=15)
+
+EXITS = ("tp", "sl", "trailing")
+
+
+# ---------------- ajustes / estado ----------------
+@dataclass(frozen=True)
+class Settings:
+    modo: str = "agresivo"
+    precision: bool = False
+    tp_pct: float = 2.0
+    sl_pct: float = 1.5
+    params: Optional[Mapping[str, float]] = None   # sobrescribe modo_params (barridos)
+
+    @staticmethod
+    def from_chat(st) -> "Settings":
+        return Settings(modo=st.modo, precision=bool(getattr(st, "precision_on", 0)),
+                        tp_pct=float(st.tp_pct), sl_pct=float(st.sl_pct))
+
+    def mode_params(self) -> Dict[str, float]:
+        return {**modo_params(self.modo), **(self.params or {})}
+
+@dataclass
+class SignalState:
+    """Lo que el heartbeat recuerda entre ticks (posición virtual, máximo, última vela de entrada)."""
+    position_entry: Optional[float] = None
+    peak: Optional[float] = None
+    last_entry_bar: Optional[pd.Timestamp] = None
+
+@dataclass(frozen=True)
+class Decision:
+    kind: str                      # entry | tp | sl | trailing | weak | danger
+    price: float
+    gain: float = 0.0              # fracción sobre la entrada
+    drawdown: float = 0.0          # trailing: retroceso desde el máximo
+    level: Optional[str] = None    # danger: "S1" / "S2"
+
+    @property
+    def closes(self) -> bool:
+        return self.kind in EXITS
+
+@dataclass
+class Evaluation:
+    decisions: List[Decision]
+    state: SignalState
+    danger: bool = False
+    inputs: Dict[str, float] = field(default_factory=dict)
+
+    def get(self, kind: str) -> Optional[Decision]:
+        return next((d for d in self.decisions if d.kind == kind), None)
+
+
+# ---------------- velas → features (escalares) ----------------
+def _at(s: pd.Series, i: int, default: float = float("nan")) -> float:
+    try:
+        return float(s.iloc[i])
+    except (IndexError, TypeError, ValueError):
+        return default
+
+def bar_index(n: int, precision: bool) -> int:
+    # precisión: última vela CERRADA; si no, la vela en formación
+    return -2 if n >= 2 and precision else -1
+
+def bar_time(df15: pd.DataFrame, precision: bool) -> Optional[pd.Timestamp]:
+    try:
+        return pd.Timestamp(df15["time"].iloc[bar_index(len(df15), precision)])
+    except Exception:
+        return None
+
+def snapshot(df15: pd.DataFrame, df5: pd.DataFrame, ctx4: Mapping, levels: Optional[Mapping],
+             precision: bool) -> Dict[str, float]:
+    """Features de un tick en vivo (mismos nombres que las columnas del backtest)."""
+    close15 = df15["close"].astype(float)
+    i = bar_index(len(close15), precision)
+    price = _at(close15, i)
+    rsi15 = rsi(close15, 14)
+    m15, s15, h15 = macd(close15)
+    long = len(close15) >= 2
+
+    close5 = (df5["close"] if "close" in df5 else df5.iloc[:, -1]).astype(float)
+    i5 = bar_index(len(close5), precision)
+    m5, s5, _ = macd(close5)
+
+    lv = levels or {}
+    def level(k: str) -> float:
+        v = lv.get(k)
+        return float(v) if v is not None else float("nan")
+
+    df4 = ctx4.get("df")
+    return {
+        "close": price,
+        "low": _at(df15["low"], i, price) if "low" in df15.columns else price,
+        "prev_close": _at(close15, i - 1, price) if long else price,
+        "rsi15": _at(rsi15, i),
+        "rsi15_prev": _at(rsi15, i - 1) if long else _at(rsi15, i),
+        "macd15_up": float(m15.iloc[i] > s15.iloc[i]),
+        "hist15_up": float(h15.iloc[i] > h15.iloc[i - 1]) if long else 0.0,
+        "ema20": _at(ema(close15, 20), i), "ema50": _at(ema(close15, 50), i), "ema200": _at(ema(close15, 200), i),
+        "macd5_up": float(m5.iloc[i5] > s5.iloc[i5]),
+        "rsi5": _at(rsi(close5, 14), i5),
+        "rsi4": float(ctx4["rsi"]),
+        "e4_20": float(ctx4.get("ema20", 0.0)), "e4_50": float(ctx4.get("ema50", 0.0)),
+        "e4_200": float(ctx4.get("ema200", 0.0)),
+        "close4": _at(df4["close"], -1, price) if df4 is not None else price,
+        "S1": level("S1"), "S2": level("S2"), "F618": level("F618"),
+    }
+
+
+# ---------------- reglas (escalar o vectorizado) ----------------
+def _b(v):
+    return np.nan_to_num(v) > 0.5
+
+def trend_up(f) -> np.ndarray:
+    return (f["rsi4"] > 50) & (f["close4"] > f["e4_50"])
+
+def trend_down(f) -> np.ndarray:
+    return (f["rsi4"] < 50) & (f["close4"] < f["e4_50"])
+
+def entry(f, params: Mapping[str, float], precision: bool):
+    """Condición de entrada del heartbeat (sin cooldown: depende del estado)."""
+    p = f["close"]
+    with np.errstate(invalid="ignore"):
+        if precision:
+            thresh = max(40.0, params["rsi_buy"])
+            strict = (f["rsi4"] > 52.0) & (f["e4_20"] > f["e4_50"]) & (f["e4_50"] > f["e4_200"])
+            rsi_cross_up = (f["rsi15_prev"] < thresh) & (f["rsi15"] >= thresh + 0.8)
+            f618 = f["F618"]
+            breakout = (f["prev_close"] < f618) & (p >= f618 * (1 + 0.0005))
+            retest = (p >= f618) & (f["low"] <= f618 * (1 + 0.0010))
+            fib_ok = np.isnan(f618) | breakout | retest
+            return (strict
+                    & (p > f["ema20"]) & (f["ema20"] > f["ema50"])
+                    & _b(f["macd15_up"]) & _b(f["hist15_up"])
+                    & (f["rsi15"] > 45.0) & rsi_cross_up
+                    & _b(f["macd5_up"]) & (f["rsi5"] > 50.0)
+                    & fib_ok)
+        return (trend_up(f) & (f["rsi15"] < max(40, params["rsi_buy"])) & _b(f["macd15_up"])
+                & (p > f["ema20"]) & _b(f["macd5_up"]) & (f["rsi5"] > 45))
+
+def weak(f):
+    """Debilidad intradía (aviso, no cierra): MACD 5m↓ y precio < EMA20 15m."""
+    with np.errstate(invalid="ignore"):
+        return ~_b(f["macd5_up"]) & (f["close"] < f["ema20"])
+
+def danger(f, params: Mapping[str, float]):
+    """PELIGRO: confluencia bajista 15m/5m con el precio pegado a S1/S2 (según pre_break_buffer)."""
+    p = f["close"]
+    buf = params["pre_break_buffer"]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        bearish = (f["rsi15"] < 45) & ~_b(f["macd15_up"]) & (p < f["ema20"]) & ~_b(f["macd5_up"])
+        near = False
+        for k in ("S1", "S2"):
+            lv = f[k]
+            near = near | (np.isfinite(lv) & (np.abs(p - lv) / np.maximum(lv, 1e-9) <= buf) & (p <= lv * (1 + buf)))
+    return bearish & near
+
+def nearest_support(f: Mapping[str, float]) -> str:
+    p = f["close"]
+    dist = {k: abs(p - f[k]) for k in ("S1", "S2") if np.isfinite(f[k])}
+    return min(dist, key=dist.get) if dist else "S1"
+
+def cooldown_ok(bars_since: Optional[float], precision: bool) -> bool:
+    return not precision or bars_since is None or bars_since >= COOLDOWN_BARS
+
+def exit_reason(entry_price: float, peak: float, price: float, tp_pct: float, sl_pct: float) -> Tuple[Optional[str], float, float]:
+    """TP → SL → trailing, en ese orden. Devuelve (motivo | None, ganancia, retroceso desde el máximo)."""
+    gain = (price - entry_price) / max(entry_price, 1e-12)
+    dd = (peak - price) / peak if peak else 0.0
+    if gain >= tp_pct / 100.0:
+        return "tp", gain, dd
+    if gain <= -sl_pct / 100.0:
+        return "sl", gain, dd
+    if gain >= TRAIL_ARM and peak and dd >= TRAIL_DD:
+        return "trailing", gain, dd
+    return None, gain, dd
+
+
+# ---------------- un tick ----------------
+def evaluate(f: Mapping[str, float], settings: Settings, state: SignalState,
+             bar: Optional[pd.Timestamp] = None) -> Evaluation:
+    """
+    Un tick del heartbeat: entrada (con cooldown en precisión), gestión de la posición y peligro.
+    No modifica `state`; el estado siguiente va en el resultado.
+    """
+    s = replace(state)
+    mp = settings.mode_params()
+    price = float(f["close"])
+    out: List[Decision] = []
+
+    bars_since = None
+    if bar is not None and s.last_entry_bar is not None:
+        bars_since = (pd.Timestamp(bar) - pd.Timestamp(s.last_entry_bar)) / BAR15
+    if s.position_entry is None and bool(entry(f, mp, settings.precision)) and cooldown_ok(bars_since, settings.precision):
+        s.position_entry = price
+        if bar is not None:
+            s.last_entry_bar = pd.Timestamp(bar)
+        out.append(Decision("entry", price))
+
+    if s.position_entry is not None:
+        if s.peak is None or price > s.peak:
+            s.peak = price
+        reason, gain, dd = exit_reason(s.position_entry, s.peak, price, settings.tp_pct, settings.sl_pct)
+        if reason:
+            out.append(Decision(reason, price, gain=gain, drawdown=dd))
+            s.position_entry, s.peak = None, None
+        elif bool(weak(f)) and gain > 0:
+            out.append(Decision("weak", price, gain=gain))
+
+    is_danger = bool(danger(f, mp))
+    if is_danger:
+        out.append(Decision("danger", price, level=nearest_support(f)))
+    return Evaluation(decisions=out, state=s, danger=is_danger, inputs=dict(f))
+
+
+# ---------------- /estado ----------------
+def strong_signal(
+    trend_up: bool, trend_down: bool,
+    rsi15: float, rsi5: float,
+    macd15u: bool, macd5u: bool, macd_hist_up: bool,
+    price: float, ema20: float, ema50: float, ema200: float,
+    f618: Optional[float],
+) -> Optional[str]:
+    """Detección estricta de STRONG BUY / STRONG SELL."""
+    if (trend_up and macd15u and macd5u and macd_hist_up and price > ema20 > ema50 > ema200
+        and rsi15 >= 55 and rsi5 >= 50 and (f618 is None or price >= f618 * 1.0005)):
+        return "STRONG BUY"
+    if (trend_down and (not macd15u) and (not macd5u) and (not macd_hist_up) and price < ema20 < ema50 < ema200
+        and rsi15 <= 45 and rsi5 <= 50 and (f618 is None or price <= f618 * 0.9995)):
+        return "STRONG SELL"
+    return None
+
+def moderate_signal(
+    trend_up: bool, trend_down: bool,
+    rsi15: float, rsi5: float,
+    macd15u: bool, macd5u: bool,
+    price: float, ema20: float, ema50: float, ema200: float,
+) -> str:
+    score = 0
+    if trend_up: score += 2
+    if trend_down: score -= 2
+    score += 1 if macd15u else -1
+    score += 1 if macd5u else -1
+    score += 1 if price > ema20 else -1
+    score += 1 if price > ema50 else -1
+    score += 1 if price > ema200 else -1
+    if rsi15 >= 60: score += 1
+    if rsi15 < 45: score -= 1
+    if rsi5 >= 55: score += 1
+    if rsi5 < 45: score -= 1
+    if score >= 2: return "BUY"
+    if score <= -2: return "SELL"
+    return "NEUTRAL"
+
+def market_view(f: Mapping[str, float]) -> Dict:
+    """Lectura del panel /estado: señal (STRONG/moderada), decisión y las confluencias que la explican."""
+    price = float(f["close"])
+    f618 = None if np.isnan(f["F618"]) else float(f["F618"])
+    rsi15, rsi15_prev = float(f["rsi15"]), float(f["rsi15_prev"])
+    view = dict(
+        trend_up=bool(trend_up(f)), trend_down=bool(trend_down(f)),
+        price=price, ema20=float(f["ema20"]), ema50=float(f["ema50"]), ema200=float(f["ema200"]),
+        rsi15=rsi15, rsi5=float(f["rsi5"]),
+        macd15u=bool(_b(f["macd15_up"])), macd5u=bool(_b(f["macd5_up"])), macd_hist_up=bool(_b(f["hist15_up"])),
+        rsi15_cross_up=bool(rsi15_prev < 50 <= rsi15),
+        f618=f618, f618_confirmed=f618 is not None and price >= f618 * 1.001,
+    )
+    args = (view["trend_up"], view["trend_down"], view["rsi15"], view["rsi5"], view["macd15u"], view["macd5u"])
+    px = (price, view["ema20"], view["ema50"], view["ema200"])
+    sig = strong_signal(*args, view["macd_hist_up"], *px, f618) or moderate_signal(*args, *px)
+    view["signal"] = sig
+    view["decision"] = "ENTRAR YA" if sig in ("STRONG BUY", "BUY") else "ESPERAR"
+    return view
@@ -0,0 +1,100 @@
+# bot/services/snapshots.py
+from __future__ import annotations
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+log = logging.getLogger("snapshots")
+
+Fetch = Callable[[], Awaitable[Any]]
+
+
+class SnapshotCache:
+    """
+    Último resultado por clave (p.ej. ("estado", coin, símbolo)) con TTL.
+    Varias peticiones simultáneas de la misma clave comparten una sola descarga (in-flight).
+    Los None (fallo de datos) no se cachean.
+    """
+
+    def __init__(self, ttl: float, max_entries: int = 256):
+        self.ttl = float(ttl)
+        self.max_entries = max(1, int(max_entries))
+        self._data: Dict[Hashable, Tuple[float, Any]] = {}
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self.hits = 0
+        self.joined = 0
+        self.fetches = 0
+
+    def peek(self, key: Hashable, ttl: Optional[float] = None) -> Any:
+        ent = self._data.get(key)
+        if ent is None or time.monotonic() - ent[0] > (self.ttl if ttl is None else ttl):
+            return None
+        return ent[1]
+
+    def age(self, key: Hashable) -> Optional[float]:
+        ent = self._data.get(key)
+        return None if ent is None else time.monotonic() - ent[0]
+
+    async def get(self, key: Hashable, fetch: Fetch, ttl: Optional[float] = None) -> Any:
+        val = self.peek(key, ttl)
+        if val is not None:
+            self.hits += 1
+            return val
+
+        fut = self._inflight.get(key)
+        if fut is not None:
+            self.joined += 1
+            return await asyncio.shield(fut)
+
+        fut = asyncio.get_running_loop().create_future()
+        self._inflight[key] = fut
+        self.fetches += 1
+        try:
+            val = await fetch()
+        except asyncio.CancelledError:
+            fut.cancel()
+            raise
+        except Exception as e:
+            fut.set_exception(e)
+            fut.exception()  # marcado como leído aunque nadie más espere
+            raise
+        else:
+            if val is not None:
+                self._store(key, val)
+            fut.set_result(val)
+            return val
+        finally:
+            self._inflight.pop(key, None)
+
+    def _store(self, key: Hashable, val: Any) -> None:
+        self._data[key] = (time.monotonic(), val)
+        if len(self._data) > self.max_entries:
+            # fuera lo más viejo
+            for k, _ in sorted(self._data.items(), key=lambda kv: kv[1][0])[: len(self._data) - self.max_entries]:
+                self._data.pop(k, None)
+
+    def invalidate(self, key: Optional[Hashable] = None) -> None:
+        if key is None:
+            self._data.clear()
+        else:
+            self._data.pop(key, None)
+
+    def stats(self) -> Dict[str, int]:
+        return {"entries": len(self._data), "hits": self.hits, "joined": self.joined, "fetches": self.fetches}
+
+
+_CACHE = SnapshotCache(20.0)
+
+def configure(ttl: float) -> None:
+    """TTL por defecto (Config.snapshot_ttl), desde _post_init."""
+    _CACHE.ttl = float(ttl)
+
+async def get(key: Hashable, fetch: Fetch, ttl: Optional[float] = None) -> Any:
+    return await _CACHE.get(key, fetch, ttl)
+
+def invalidate(key: Optional[Hashable] = None) -> None:
+    _CACHE.invalidate(key)
+
+def stats() -> Dict[str, int]:
+    return _CACHE.stats()
@@ -0,0 +1,237 @@
+# bot/services/sweep.py
+"""
+Barrido de parámetros del heartbeat (pre_break_buffer, rsi_buy, TP/SL, precisión) sobre varios símbolos.
+
+Las features de cada símbolo se calculan una vez en el proceso principal y se publican en memoria
+compartida (SharedMemory, solo lectura); los workers (spawn, uno por núcleo) las mapean sin copiarlas
+y reciben solo tareas pequeñas: (símbolo, precisión, rsi_buy) × un trozo del resto del grid.
+
+    python -m bot.services.sweep WIF-USDT BTC-USDT --days 180 --cache-dir .bt_cache --top 20 --out sweep.csv
+
+Nota: rsi_sell no interviene en las reglas del heartbeat, por eso no forma parte del grid.
+"""
+from __future__ import annotations
+import argparse
+import itertools
+import logging
+import multiprocessing as mp
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from . import backtest
+from .backtest import Features
+
+log = logging.getLogger("sweep")
+
+DEFAULT_GRID: Dict[str, Tuple] = {
+    "precision": (False, True),
+    "rsi_buy": (30, 33, 35, 40, 45),
+    "pre_break_buffer": (0.003, 0.004, 0.006),
+    "tp_pct": (1.0, 1.5, 2.0, 3.0),
+    "sl_pct": (0.75, 1.0, 1.5, 2.0),
+}
+_OUTER = ("precision", "rsi_buy")  # lo que cambia la señal de entrada: agrupa las tareas
+_TASKS_PER_WORKER = 4  # trozos por worker: reparto equilibrado aunque haya pocos grupos _OUTER
+
+Progress = Callable[[int, int, float], None]
+
+# (nombre shm de X, nombre shm de time, shape, columnas) por símbolo
+Spec = Tuple[str, str, Tuple[int, int], Tuple[str, ...]]
+
+
+# ---------------- memoria compartida ----------------
+def _share(arr: np.ndarray) -> shared_memory.SharedMemory:
+    shm = shared_memory.SharedMemory(create=True, size=max(1, arr.nbytes))
+    np.ndarray(arr.shape, dtype=arr.dtype, buffer=shm.buf)[...] = arr
+    return shm
+
+def _view(shm: shared_memory.SharedMemory, shape, dtype) -> np.ndarray:
+    a = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+    a.flags.writeable = False
+    return a
+
+
+# ---------------- lado worker ----------------
+_FEATS: Dict[str, Features] = {}
+_SHM: List[shared_memory.SharedMemory] = []
+
+def _attach(specs: Dict[str, Spec]) -> None:
+    """Inicializador: mapea las matrices de todos los símbolos (sin copia)."""
+    for sym, (x_name, t_name, shape, names) in specs.items():
+        shx = shared_memory.SharedMemory(name=x_name)
+        sht = shared_memory.SharedMemory(name=t_name)
+        _SHM.extend((shx, sht))
+        _FEATS[sym] = Features(time=_view(sht, (shape[0],), "datetime64[ns]"), names=names,
+                               X=_view(shx, shape, np.float64))
+
+def _evaluate(sym: str, outer: Dict, inner: List[Dict]) -> List[Dict]:
+    f = _FEATS[sym]
+    rows = []
+    for p in inner:
+        q = {**outer, **p}
+        res = backtest.run(None, precision=bool(q["precision"]), tp_pct=q["tp_pct"], sl_pct=q["sl_pct"],
+                           params={"pre_break_buffer": q["pre_break_buffer"], "rsi_buy": q["rsi_buy"]}, feats=f)
+        s = res.summary()
+        s.pop("runtime_s", None)
+        rows.append({"symbol": sym, **q, **s})
+    return rows
+
+
+# ---------------- grid / ranking ----------------
+def grid(spec: Optional[Dict[str, Iterable]] = None) -> List[Dict]:
+    """Producto cartesiano del grid (por defecto DEFAULT_GRID; las claves que falten se toman de ahí)."""
+    g = {**DEFAULT_GRID, **(spec or {})}
+    keys = list(g)
+    return [dict(zip(keys, vals)) for vals in itertools.product(*(tuple(g[k]) for k in keys))]
+
+def _tasks(syms: Sequence[str], combos: List[Dict], min_tasks: int = 1) -> List[Tuple[str, Dict, List[Dict]]]:
+    """
+    (símbolo, outer, [inner, ...]) por símbolo y combinación de _OUTER. Si salen menos de `min_tasks`
+    (p.ej. 10 grupos por símbolo y 32 workers), el inner se trocea para no dejar workers parados.
+    """
+    groups: Dict[Tuple, List[Dict]] = {}
+    for c in combos:
+        key = tuple(c[k] for k in _OUTER)
+        groups.setdefault(key, []).append({k: v for k, v in c.items() if k not in _OUTER})
+    base = [(s, dict(zip(_OUTER, key)), inner) for s in syms for key, inner in groups.items()]
+    parts = -(-max(1, min_tasks) // max(1, len(base)))  # trozos por grupo (techo)
+    out = []
+    for s, outer, inner in base:
+        size = -(-len(inner) // min(parts, len(inner)))
+        out.extend((s, outer, inner[i:i + size]) for i in range(0, len(inner), size))
+    return out
+
+def rank(df: pd.DataFrame, by: str = "return_pct", min_trades: int = 5) -> pd.DataFrame:
+    """
+    Ordena por `by` (desc) y, a igualdad, menor drawdown y luego el orden del grid.
+    `rank` es la posición dentro de cada símbolo.
+    """
+    if df.empty:
+        return df
+    df = df.copy()
+    ok = df["trades"] >= min_trades  # pocas operaciones → resultado poco fiable, al final
+    df["_ok"] = ok
+    # empates: orden del grid (los resultados llegan del pool en cualquier orden)
+    ties = [k for k in ("symbol", *DEFAULT_GRID) if k in df.columns]
+    df = df.sort_values(["_ok", by, "max_dd_pct", *ties], ascending=[False, False, True] + [True] * len(ties),
+                        kind="mergesort").drop(columns="_ok")
+    df["rank"] = df.groupby("symbol").cumcount() + 1
+    return df.reset_index(drop=True)
+
+def _log_progress(done: int, total: int, elapsed: float) -> None:
+    eta = elapsed / done * (total - done) if done else float("nan")
+    log.info("sweep %s/%s (%.0f%%) · %.1fs · ETA %.1fs", done, total, 100.0 * done / total, elapsed, eta)
+
+
+# ---------------- ejecución ----------------
+def run(feats: Dict[str, Features], spec: Optional[Dict[str, Iterable]] = None, workers: Optional[int] = None,
+        by: str = "return_pct", min_trades: int = 5, progress: Optional[Progress] = _log_progress,
+        progress_every: float = 2.0) -> pd.DataFrame:
+    """
+    Evalúa el grid en todos los símbolos y devuelve la tabla ordenada.
+    workers=None → un proceso por núcleo; workers=0 → en este proceso (sin pool).
+    """
+    combos = grid(spec)
+    total = len(combos) * len(feats)
+    n = (os.cpu_count() or 1) if workers is None else int(workers)
+    tasks = _tasks(list(feats), combos, min_tasks=_TASKS_PER_WORKER * n)
+    t0 = time.perf_counter()
+    rows: List[Dict] = []
+    last = 0.0
+
+    def tick(done: int) -> None:
+        nonlocal last
+        el = time.perf_counter() - t0
+        if progress and (done == total or el - last >= progress_every):
+            last = el
+            progress(done, total, el)
+
+    if n <= 0:
+        _FEATS.update(feats)
+        try:
+            for sym, outer, inner in tasks:
+                rows.extend(_evaluate(sym, outer, inner))
+                tick(len(rows))
+        finally:
+            for sym in feats:
+                _FEATS.pop(sym, None)
+        return rank(pd.DataFrame(rows), by, min_trades)
+
+    shms: List[shared_memory.SharedMemory] = []
+    try:
+        specs: Dict[str, Spec] = {}
+        for sym, f in feats.items():
+            shx = _share(np.ascontiguousarray(f.X, dtype=np.float64))
+            sht = _share(np.asarray(f.time, dtype="datetime64[ns]"))
+            shms.extend((shx, sht))
+            specs[sym] = (shx.name, sht.name, f.X.shape, tuple(f.names))
+        with ProcessPoolExecutor(max_workers=n, mp_context=mp.get_context("spawn"),
+                                 initializer=_attach, initargs=(specs,)) as pool:
+            futs = [pool.submit(_evaluate, sym, outer, inner) for sym, outer, inner in tasks]
+            for fut in as_completed(futs):
+                rows.extend(fut.result())
+                tick(len(rows))
+    finally:
+        for shm in shms:
+            shm.close()
+            shm.unlink()
+    log.info("sweep: %s combinaciones × %s símbolos en %.1fs (%s workers)",
+             len(combos), len(feats), time.perf_counter() - t0, n)
+    return rank(pd.DataFrame(rows), by, min_trades)
+
+
+# ---------------- CLI ----------------
+def _floats(s: str) -> Tuple[float, ...]:
+    return tuple(float(x) for x in s.split(",") if x.strip())
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    ap = argparse.ArgumentParser(description="Barrido de parámetros del heartbeat sobre velas de OKX")
+    ap.add_argument("symbols", nargs="+", help="instIds OKX, p.ej. WIF-USDT BTC-USDT")
+    ap.add_argument("--days", type=float, default=180)
+    ap.add_argument("--cache-dir", help="directorio de CSV de velas 5m (uno por símbolo)")
+    ap.add_argument("--workers", type=int, default=None, help="procesos (por defecto: todos los núcleos)")
+    ap.add_argument("--buffer", type=_floats, help="pre_break_buffer, p.ej. 0.003,0.004,0.006")
+    ap.add_argument("--rsi-buy", type=_floats)
+    ap.add_argument("--tp", type=_floats, help="TP en %%, p.ej. 1,1.5,2")
+    ap.add_argument("--sl", type=_floats, help="SL en %%")
+    ap.add_argument("--precision", choices=("on", "off", "both"), default="both")
+    ap.add_argument("--by", default="return_pct", help="métrica de ranking (return_pct, win_rate, ...)")
+    ap.add_argument("--min-trades", type=int, default=5)
+    ap.add_argument("--top", type=int, default=10, help="filas por símbolo")
+    ap.add_argument("--out", help="CSV con la tabla completa")
+    a = ap.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(name)s: %(message)s")
+
+    spec: Dict[str, Iterable] = {"precision": {"on": (True,), "off": (False,), "both": (False, True)}[a.precision]}
+    for key, val in (("pre_break_buffer", a.buffer), ("rsi_buy", a.rsi_buy), ("tp_pct", a.tp), ("sl_pct", a.sl)):
+        if val:
+            spec[key] = val
+
+    feats: Dict[str, Features] = {}
+    if a.cache_dir:
+        os.makedirs(a.cache_dir, exist_ok=True)
+    for sym in (s.upper() for s in a.symbols):
+        cache = os.path.join(a.cache_dir, f"{sym}_5m.csv") if a.cache_dir else None
+        df5 = backtest.load_history(sym, a.days, cache)
+        if df5 is None or df5.empty:
+            log.warning("sin velas para %s, se omite", sym)
+            continue
+        feats[sym] = backtest.features(df5)
+    if not feats:
+        raise SystemExit("sin datos")
+
+    df = run(feats, spec, workers=a.workers, by=a.by, min_trades=a.min_trades)
+    if a.out:
+        df.to_csv(a.out, index=False)
+    with pd.option_context("display.max_rows", None, "display.width", 200):
+        print(df[df["rank"] <= a.top].sort_values(["symbol", "rank"]).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
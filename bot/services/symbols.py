@@ -1,6 +1,14 @@
 from __future__ import annotations
-from typing import Optional, Iterable, Dict
-import requests
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Awaitable, Callable, Optional, Iterable, Dict, Tuple
+
+from ..db import repo
+from . import instruments
+
+log = logging.getLogger("symbols")
 
 try:
     from pycoingecko import CoinGeckoAPI
@@ -8,13 +16,19 @@ except Exception:
     CoinGeckoAPI = None  # por si acaso
 
 _CG = CoinGeckoAPI() if CoinGeckoAPI else None
+if _CG:
+    _CG.request_timeout = 10  # por defecto 120 s: un hilo colgado sobreviviría de sobra al plazo de /setcoin
 _CACHE: Dict[str, str] = {}  # cg_id -> instId OKX resuelto
 
-OKX_BASE = "https://www.okx.com"
-
+def _not_found(e: Exception) -> bool:
+    # pycoingecko: 404 con JSON → ValueError({'error': 'coin not found'})
+    return isinstance(e, ValueError) and "not found" in str(e).lower()
 
 def _cg_get_symbol(cg_id: str) -> Optional[str]:
-    """Obtiene el símbolo base (ej. 'BTC', 'WIF') desde CoinGecko."""
+    """
+    Obtiene el símbolo base (ej. 'BTC', 'WIF') desde CoinGecko.
+    None = la moneda no existe; errores de transporte (429, timeout...) se propagan.
+    """
     if not _CG:
         return None
     try:
@@ -28,108 +42,173 @@ def _cg_get_symbol(cg_id: str) -> Optional[str]:
             developer_data=False,
             sparkline=False,
         )
-        sym = d.get("symbol") or d.get("symbol", "")
-        return sym.upper() if sym else None
-    except Exception:
-        return None
+    except Exception as e:
+        if _not_found(e):
+            return None
+        raise
+    sym = d.get("symbol")
+    return sym.upper() if sym else None
 
 
+def _okx_catalog() -> instruments.InstrumentCatalog:
+    """
+    Catálogo SPOT completo. Si no hay (OKX caído o reintento aún en espera) lanza RuntimeError:
+    "no está en OKX" solo puede concluirse con el catálogo entero delante.
+    """
+    cat = instruments.catalog()
+    if not cat.ensure_sync():
+        raise RuntimeError("catálogo OKX no disponible")
+    return cat
+
 def _okx_validate_inst(inst_id: str) -> bool:
-    """Valida que un instId exista en OKX a través del catálogo de instrumentos."""
-    try:
-        r = requests.get(
-            f"{OKX_BASE}/api/v5/public/instruments",
-            params={"instType": "SPOT", "instId": inst_id},
-            timeout=10,
-        )
-        if r.status_code != 200:
-            return False
-        data = r.json().get("data", [])
-        return len(data) > 0 and (data[0].get("state") in {"live", "suspend"})  # 'live' preferido
-    except Exception:
-        return False
+    """Valida que un instId exista (y opere) en el catálogo SPOT de OKX."""
+    inst = _okx_catalog().get(inst_id)
+    return inst is not None and inst.tradable
 
 
 def _okx_search_by_base(base: str, quotes: Iterable[str] = ("USDT", "USDC", "USD")) -> Optional[str]:
-    """Busca en todo el listado de SPOT un par base-quote por preferencia."""
-    try:
-        r = requests.get(
-            f"{OKX_BASE}/api/v5/public/instruments",
-            params={"instType": "SPOT"},
-            timeout=15,
-        )
-        if r.status_code != 200:
-            return None
-        items = r.json().get("data", [])
-        base = base.upper()
-        # Primero preferencia por quotes (orden)
-        for q in quotes:
-            for it in items:
-                if it.get("baseCcy", "").upper() == base and it.get("quoteCcy", "").upper() == q:
-                    if it.get("state") in {"live", "suspend"}:
-                        return it.get("instId")
-        # Si no se halló por preferencia, devolver cualquier match por base
-        for it in items:
-            if it.get("baseCcy", "").upper() == base:
-                return it.get("instId")
-        return None
-    except Exception:
-        return None
+    """Par base-quote por preferencia, vía el índice por baseCcy del catálogo."""
+    inst = _okx_catalog().find(base, quotes)
+    return inst.inst_id if inst else None
 
 
 def _cg_tickers_try_okx(cg_id: str) -> Optional[str]:
-    """Último recurso: consulta tickers de CG y busca mercado OKX/USDT."""
+    """Último recurso: consulta tickers de CG y busca mercado OKX/USDT (errores de transporte se propagan)."""
     if not _CG:
         return None
     try:
         d = _CG.get_coin_by_id(id=cg_id)  # completo; puede ser pesado
-        tickers = d.get("tickers", []) or []
-        # buscar OKX + target preferente
-        for prefer in ("USDT", "USDC", "USD"):
-            for t in tickers:
-                mkt = (t.get("market") or {}).get("identifier", "") or (t.get("market") or {}).get("name", "")
-                tgt = (t.get("target") or "").upper()
-                base = (t.get("base") or "").upper()
-                if "OKX" in str(mkt).upper() and tgt == prefer and base:
-                    inst = f"{base}-{tgt}"
-                    if _okx_validate_inst(inst):
-                        return inst
-        return None
-    except Exception:
-        return None
+    except Exception as e:
+        if _not_found(e):
+            return None
+        raise
+    tickers = d.get("tickers", []) or []
+    # buscar OKX + target preferente
+    for prefer in ("USDT", "USDC", "USD"):
+        for t in tickers:
+            mkt = (t.get("market") or {}).get("identifier", "") or (t.get("market") or {}).get("name", "")
+            tgt = (t.get("target") or "").upper()
+            base = (t.get("base") or "").upper()
+            if "OKX" in str(mkt).upper() and tgt == prefer and base:
+                inst = f"{base}-{tgt}"
+                if _okx_validate_inst(inst):
+                    return inst
+    return None
 
 
-def resolve_okx_symbol_from_cg_id(cg_id: str) -> Optional[str]:
-    """
-    Dado un CoinGecko ID (ej. 'bitcoin', 'dogwifcoin'), intenta devolver un instId de OKX (ej. 'BTC-USDT').
-    Estrategia:
-      1) CG symbol -> probar "<SYMBOL>-USDT" (validar)
-      2) Buscar en catálogo SPOT de OKX por base (preferencia USDT/USDC/USD)
-      3) Consultar tickers de CG y localizar un par en OKX
-    """
-    if not cg_id:
-        return None
-    key = cg_id.strip().lower()
-    if key in _CACHE:
-        return _CACHE[key]
+# ------------------------- resolución async (handlers) ------------------------- #
+_TTL_OK = 168 * 3600     # acierto guardado en SQLite (Config.symbol_map_ttl_h)
+_TTL_MISS = 3600         # fallo guardado: se reintenta antes
+_DEADLINE = 8.0          # s (Config.symbol_resolve_deadline)
+_HEAD_START = 1.5        # s de ventaja de cada estrategia sobre la siguiente
+
+def configure(map_ttl_h: float, deadline: float) -> None:
+    """TTL de los aciertos guardados y plazo de resolución (Config), desde _post_init."""
+    global _TTL_OK, _DEADLINE
+    _TTL_OK = int(float(map_ttl_h) * 3600)
+    _DEADLINE = float(deadline)
+
+# Hilos propios para CoinGecko: una llamada que sigue viva tras el plazo (cancel() no para hilos)
+# no ocupa el executor por defecto que usan los repo.* con to_thread.
+_CG_POOL = ThreadPoolExecutor(max_workers=2, thread_name_prefix="cg-resolve")
 
-    base = _cg_get_symbol(key)
+async def _cg_call(fn: Callable[[str], Optional[str]], cg_id: str) -> Optional[str]:
+    return await asyncio.get_running_loop().run_in_executor(_CG_POOL, fn, cg_id)
+
+async def _via_base(cg_id: str) -> Optional[str]:
+    """CG symbol → catálogo OKX por baseCcy (USDT/USDC/USD)."""
+    base = await _cg_call(_cg_get_symbol, cg_id)
     if not base:
         return None
+    cat = await asyncio.to_thread(_okx_catalog)
+    inst = cat.find(base)
+    return inst.inst_id if inst is not None and inst.tradable else None
 
-    guess = f"{base}-USDT"
-    if _okx_validate_inst(guess):
-        _CACHE[key] = guess
-        return guess
+async def _via_tickers(cg_id: str) -> Optional[str]:
+    return await _cg_call(_cg_tickers_try_okx, cg_id)
 
-    found = _okx_search_by_base(base)
-    if found:
-        _CACHE[key] = found
-        return found
+# (nombre, estrategia) por preferencia: la siguiente arranca cuando la anterior falla
+# o tras _HEAD_START sin respuesta (tickers es el payload completo: no se pide si base resuelve)
+_STRATEGIES: Tuple[Tuple[str, Callable[[str], Awaitable[Optional[str]]]], ...] = (
+    ("base", _via_base),
+    ("tickers", _via_tickers),
+)
 
-    found2 = _cg_tickers_try_okx(key)
-    if found2:
-        _CACHE[key] = found2
-        return found2
+async def _race(cg_id: str, deadline: float) -> Tuple[Optional[str], Optional[str], bool]:
+    """
+    (instId, estrategia, concluyente). Concluyente = todas las estrategias terminaron sin error;
+    un plazo agotado o un error de transporte (429, timeout) no lo es y no se persiste.
+    """
+    queue = list(_STRATEGIES)
+    tasks: Dict[asyncio.Future, str] = {}
+    pending: set = set()
+    failed = False
+    end = time.monotonic() + deadline
+    next_at = end
+
+    def launch() -> None:
+        nonlocal next_at
+        name, fn = queue.pop(0)
+        t = asyncio.ensure_future(fn(cg_id))
+        tasks[t] = name
+        pending.add(t)
+        next_at = time.monotonic() + _HEAD_START
+
+    launch()
+    try:
+        while pending:
+            wake = min(end, next_at) if queue else end
+            done, rest = await asyncio.wait(pending, timeout=max(0.0, wake - time.monotonic()),
+                                            return_when=asyncio.FIRST_COMPLETED)
+            pending.clear()
+            pending.update(rest)
+            if not done:
+                if time.monotonic() >= end or not queue:
+                    return None, None, False
+                launch()  # la anterior sigue en vuelo; la siguiente ya no espera más
+                continue
+            for t in done:
+                try:
+                    inst_id = t.result()
+                except Exception as e:
+                    log.info("estrategia %s falló para %s: %s", tasks[t], cg_id, e)
+                    failed = True
+                    inst_id = None
+                if inst_id:
+                    return inst_id, tasks[t], True
+            if queue and not pending:
+                launch()
+        return None, None, not failed
+    finally:
+        for t in pending:
+            t.cancel()  # el hilo termina solo (request_timeout); su resultado se descarta
+
+async def resolve_okx_symbol(cg_id: str, db_path: Optional[str] = None,
+                             deadline: Optional[float] = None, refresh: bool = False) -> Optional[str]:
+    """
+    Resuelve un CoinGecko ID (ej. 'dogwifcoin') a un instId de OKX (ej. 'WIF-USDT') sin bloquear el loop.
+    Orden: memoria → SQLite (symbol_map, con TTL) → estrategias escalonadas con plazo.
+    El acierto y el fallo concluyente se persisten para que /setcoin sea instantáneo tras reiniciar.
+    refresh=True ignora lo guardado (p.ej. /setsymbol auto).
+    """
+    key = (cg_id or "").strip().lower()
+    if not key:
+        return None
+    if key in _CACHE and not refresh:
+        return _CACHE[key]
 
-    return None
+    if db_path and not refresh:
+        row = await repo.get_symbol_map(db_path, key)
+        if row is not None:
+            ttl = _TTL_OK if row["inst_id"] else _TTL_MISS
+            if time.time() - float(row["resolved_at"]) < ttl:
+                if row["inst_id"]:
+                    _CACHE[key] = row["inst_id"]
+                return row["inst_id"]
+
+    inst_id, source, conclusive = await _race(key, _DEADLINE if deadline is None else deadline)
+    if inst_id:
+        _CACHE[key] = inst_id
+    if db_path and conclusive:
+        await repo.put_symbol_map(db_path, key, inst_id, source)
+    return inst_id
@@ -33,19 +33,11 @@ def status_card(
     Devuelve BytesIO PNG. Si Pillow no está, devuelve una imagen en blanco.
     """
     W, H = size
-    buf = io.BytesIO()
 
     if Image is None:
         # Fallback: PNG en blanco para no romper envío
-        from matplotlib import pyplot as plt
-        import matplotlib
-        matplotlib.use("Agg")
-        fig = plt.figure(figsize=(W / 100, H / 100), dpi=100)
-        plt.axis("off")
-        plt.savefig(buf, format="png")
-        plt.close(fig)
-        buf.seek(0)
-        return buf
+        from .canvas import new_figure, to_png
+        return to_png(new_figure((W / 100, H / 100), dpi=100))
 
     img = Image.new("RGB", (W, H), color=_parse_color(bg))
     draw = ImageDraw.Draw(img)
@@ -83,6 +75,5 @@ def status_card(
         ty = y0 + pad_y
         draw.text((tx, ty), badge_text, fill=_parse_color("#ffffff"), font=badge_font)
 
-    img.save(buf, format="PNG")
-    buf.seek(0)
-    return buf
+    from .encoding import encode
+    return io.BytesIO(encode(img, lossless=True, kind="card"))
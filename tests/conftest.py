@@ -1,5 +1,9 @@
 import asyncio
 
+import numpy as np
+import pandas as pd
+import pytest
+
 
 def pytest_pyfunc_call(pyfuncitem):
     if pyfuncitem.get_closest_marker("asyncio"):
@@ -14,3 +18,17 @@ def pytest_pyfunc_call(pyfuncitem):
 
 def pytest_configure(config):
     config.addinivalue_line("markers", "asyncio: mark async tests")
+
+
+@pytest.fixture
+def candles():
+    """
+    Velas 5m sintéticas (paseo aleatorio log-normal con semilla fija): candles(n, seed, wave=0.0).
+    `wave` suma una oscilación lenta para que haya tendencias (entradas/salidas en las reglas).
+    """
+    def make(n=12000, seed=1, wave=0.0):
+        rng = np.random.default_rng(seed)
+        c = 100 * np.exp(np.cumsum(rng.normal(0, 0.004, n) + wave * np.sin(np.arange(n) / 25)))
+        t = pd.date_range("2024-01-01", periods=n, freq="5min")
+        return pd.DataFrame({"time": t, "open": c, "high": c * 1.002, "low": c * 0.998, "close": c})
+    return make
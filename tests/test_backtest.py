@@ -0,0 +1,36 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+
+# Ensure repository root is on sys.path for imports
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from bot.services import backtest as bt
+from bot.services.indicators import ema, rsi
+
+
+def test_features_match_live_resample_with_forming_4h_bar(candles):
+    df = candles(20000)
+    f = bt.features(df)
+    i = 5000  # a mitad de una vela de 4H
+    d15 = df.set_index("time").resample("15min").agg(bt.OHLC).dropna().iloc[: i + 1]
+    c4 = d15.resample("4h").agg(bt.OHLC).dropna()["close"]  # como get_4h_context: última 4H en formación
+
+    assert np.isclose(f["rsi4"][i], rsi(c4, 14).iloc[-1])
+    assert np.isclose(f["e4_50"][i], ema(c4, 50).iloc[-1])
+    assert np.isclose(f["rsi15"][i], rsi(d15["close"], 14).iloc[-1])
+
+
+def test_simulate_tp_sl_trailing_and_precision_cooldown():
+    price = [100, 101, 102.1, 100, 98.4, 100, 101.9, 101.0, 100, 100]
+    f = bt.Features(time=np.arange(len(price)), names=("close",), X=np.array(price, dtype=float)[:, None])
+    entry = np.array([1, 0, 0, 1, 0, 1, 0, 0, 1, 0], dtype=bool)
+
+    trades, equity, _ = bt.simulate(f, entry, tp_pct=2.0, sl_pct=1.5, precision=False)
+    # TP +2.1% · SL -1.6% · trailing (+1% con retroceso de 0.88% desde 101.9) · la última queda abierta
+    assert [(t[0], t[1], t[4]) for t in trades] == [(0, 2, "tp"), (3, 4, "sl"), (5, 7, "trailing"), (8, -1, "open")]
+    assert np.isclose(equity[7], 1.021 * 0.984 * 1.01)
+
+    trades, _, _ = bt.simulate(f, entry, tp_pct=2.0, sl_pct=1.5, precision=True)
+    # precisión: 6 velas de cooldown entre entradas → la de la vela 3 y la 5 no cuentan
+    assert [(t[0], t[4]) for t in trades] == [(0, "tp"), (8, "open")]
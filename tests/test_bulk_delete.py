@@ -0,0 +1,69 @@
+import asyncio
+import sys
+from pathlib import Path
+
+import pytest
+from telegram.error import BadRequest
+
+# Ensure repository root is on sys.path for imports
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from bot.services import bulk_delete
+
+
+class FakeBot:
+    def __init__(self, protected=(), error="Message can't be deleted"):
+        self.calls = []
+        self.protected = set(protected)
+        self.error = error
+
+    async def delete_messages(self, chat_id, message_ids):
+        self.calls.append(list(message_ids))
+        if self.protected & set(message_ids):
+            raise BadRequest(self.error)
+        return True
+
+
+@pytest.mark.asyncio
+async def test_deletes_in_batches_of_100_and_isolates_rejected_ids():
+    bot = FakeBot(protected={150})
+    seen = []
+
+    async def progress(done, total):
+        seen.append((done, total))
+
+    res = await bulk_delete.delete_ids(bot, 1, range(1, 251), progress=progress)
+
+    # 3 lotes (100/100/50); el lote con el id protegido se parte hasta aislarlo
+    assert max(len(c) for c in bot.calls) == 100
+    assert [150] in bot.calls
+    assert sum(len(c) for c in bot.calls if 150 not in c) == 249
+    assert (res.requested, res.processed, res.failed, res.cancelled) == (250, 249, 1, False)
+    assert seen[-1] == (250, 250)
+
+
+@pytest.mark.asyncio
+async def test_undeletable_batches_stop_splitting():
+    # nada borrable: no se parte hasta ids sueltos (serían 2·100−1 llamadas)
+    bot = FakeBot(protected=range(100))
+    res = await bulk_delete.delete_ids(bot, 1, range(100))
+    assert len(bot.calls) <= 2 * 7 + 1
+    assert (res.processed, res.failed) == (0, 100)
+
+    # error del chat: un solo intento por lote
+    bot = FakeBot(protected=range(200), error="Chat not found")
+    res = await bulk_delete.delete_ids(bot, 1, range(200))
+    assert len(bot.calls) == 2 and res.failed == 200
+
+
+@pytest.mark.asyncio
+async def test_cancel_stops_pending_batches():
+    bot = FakeBot()
+    ev = asyncio.Event()
+
+    async def progress(done, total):
+        ev.set()  # cancelar tras el primer lote
+
+    res = await bulk_delete.delete_ids(bot, 1, range(1000), cancel=ev, progress=progress, concurrency=1)
+
+    assert len(bot.calls) == 1
+    assert res.cancelled and res.processed == 100
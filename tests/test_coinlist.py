@@ -0,0 +1,83 @@
+import sys
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+# Ensure repository root is on sys.path for imports
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from bot.db import repo
+from bot.handlers.commands import setcoin
+from bot.services import coinlist
+from bot.services.coinlist import Coin, CoinIndex
+
+COINS = [
+    Coin("bitcoin", "btc", "Bitcoin"),
+    Coin("bitcoin-cash", "bch", "Bitcoin Cash"),
+    Coin("wrapped-bitcoin", "wbtc", "Wrapped Bitcoin"),
+    Coin("dogwifcoin", "wif", "dogwifhat"),
+    Coin("dogecoin", "doge", "Dogecoin"),
+    Coin("bonk", "bonk", "Bonk"),
+]
+
+
+def _index(tmp_path):
+    idx = CoinIndex(str(tmp_path / "coins.json"), max_age=3600)
+    idx._index(list(COINS), fetched_at=0)
+    return idx
+
+
+def test_exact_prefix_and_fuzzy_lookups(tmp_path):
+    idx = _index(tmp_path)
+
+    assert idx.get("Bitcoin").name == "Bitcoin"
+    assert idx.get("bitcoinn") is None
+    assert [c.id for c in idx.prefix("bitc")] == ["bitcoin", "bitcoin-cash"]
+    assert idx.fuzzy("dogwificoin")[0].id == "dogwifcoin"       # typo
+    assert idx.suggest("wif")[0].id == "dogwifcoin"             # símbolo exacto primero
+    assert idx.suggest("btc")[0].id == "bitcoin"
+
+
+def test_persisted_index_reloads_without_network(tmp_path):
+    idx = _index(tmp_path)
+    idx._save([[c.id, c.symbol, c.name] for c in COINS])
+
+    again = CoinIndex(idx.path, max_age=3600)
+    assert again.load() and len(again) == len(COINS)
+    assert again.suggest("dogecoim")[0].id == "dogecoin"
+
+
+@pytest.mark.asyncio
+async def test_setcoin_rejects_typos_but_resolves_ids_missing_from_the_list(tmp_path, monkeypatch):
+    db_path = str(tmp_path / "test.db")
+    await repo.ensure_schema(db_path)
+    idx = _index(tmp_path)
+    idx.fetched_at = time.time()
+    monkeypatch.setattr(coinlist, "_INDEX", idx)
+    resolved, replies = [], []
+
+    async def fake_resolve(cg_id, db_path=None):
+        resolved.append(cg_id)
+        return "NEW-USDT"
+
+    async def reply_text(text, **kw):
+        replies.append(text)
+
+    monkeypatch.setattr(setcoin, "resolve_okx_symbol", fake_resolve)
+    monkeypatch.setattr(setcoin.instruments, "prefetch_soon", lambda *a: None)
+    ctx = SimpleNamespace(application=SimpleNamespace(bot_data={"config": SimpleNamespace(db_path=db_path)}))
+
+    def update(arg):
+        ctx.args = [arg]
+        return SimpleNamespace(effective_chat=SimpleNamespace(id=5), message=SimpleNamespace(reply_text=reply_text))
+
+    await setcoin.setcoin_cmd(update("dogwificoin"), ctx)     # typo con sugerencias: no se toca nada
+    assert resolved == [] and "¿Quisiste decir" in replies[-1]
+
+    await setcoin.setcoin_cmd(update("zzqxv"), ctx)           # sin sugerencias: listado posterior a la lista
+    assert resolved == ["zzqxv"] and (await repo.get_chat(db_path, 5)).symbol_okx == "NEW-USDT"
+
+    idx.fetched_at = 0                                       # lista vieja: tampoco se rechaza
+    await setcoin.setcoin_cmd(update("dogwificoin"), ctx)
+    assert resolved == ["zzqxv", "dogwificoin"]
@@ -0,0 +1,61 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+# Ensure repository root is on sys.path for imports
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from bot.app import webhook_params
+from bot.config import Config
+
+
+def test_polling_is_default(monkeypatch):
+    monkeypatch.setenv("BOT_TOKEN", "123:abc")
+    for k in ("WEBHOOK_URL", "WEBHOOK_SECRET"):
+        monkeypatch.delenv(k, raising=False)
+    cfg = Config.from_env()
+    assert not cfg.use_webhook
+
+
+def test_webhook_settings_from_env(monkeypatch):
+    monkeypatch.setenv("BOT_TOKEN", "123:abc")
+    monkeypatch.setenv("WEBHOOK_URL", "https://bot.example.com/")
+    monkeypatch.setenv("WEBHOOK_PATH", "/tg/")
+    monkeypatch.setenv("WEBHOOK_PORT", "9000")
+    monkeypatch.setenv("WEBHOOK_SECRET", "s3cret_token")
+    monkeypatch.setenv("WEBHOOK_MAX_CONNECTIONS", "500")
+    cfg = Config.from_env()
+
+    params = webhook_params(cfg)
+    assert cfg.use_webhook
+    assert params["webhook_url"] == "https://bot.example.com/tg"
+    assert (params["url_path"], params["port"]) == ("tg", 9000)
+    assert params["secret_token"] == "s3cret_token"
+    assert params["max_connections"] == 100  # límite de Telegram
+
+
+def test_invalid_secret_is_rejected():
+    cfg = Config(token="t", webhook_url="https://x", webhook_secret="con espacios")
+    with pytest.raises(RuntimeError):
+        webhook_params(cfg)
+
+
+def test_service_settings_come_from_config(monkeypatch):
+    from bot.services import file_ids, render_cache, snapshots
+    monkeypatch.setenv("BOT_TOKEN", "123:abc")
+    monkeypatch.setenv("RENDER_CACHE_MB", "0.5")
+    monkeypatch.setenv("FILE_ID_CACHE", "10")
+    monkeypatch.setenv("ESTADO_LIVE_SEC", "15")
+    cfg = Config.from_env()
+    assert (cfg.render_cache_mb, cfg.file_id_cache, cfg.estado_live_sec) == (0.5, 10, 15)
+    assert cfg.snapshot_ttl == 20.0 and cfg.instruments_path == "okx_instruments.json"
+
+    # los servicios no leen el entorno al importarse: se configuran desde _post_init
+    monkeypatch.setattr(render_cache, "_CACHE", render_cache.RenderCache(1))
+    monkeypatch.setattr(file_ids, "_CACHE", file_ids.FileIdCache(1))
+    monkeypatch.setattr(snapshots, "_CACHE", snapshots.SnapshotCache(1))
+    render_cache.configure(cfg.render_cache_mb)
+    file_ids.configure(cfg.file_id_cache)
+    snapshots.configure(cfg.snapshot_ttl)
+    assert render_cache._CACHE.max_bytes == 512 * 1024
+    assert file_ids._CACHE.max_entries == 10 and snapshots._CACHE.ttl == 20.0
@@ -0,0 +1,33 @@
+import io
+import sys
+from pathlib import Path
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+# Ensure repository root is on sys.path for imports
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from bot.services import encoding
+
+
+def test_flat_card_is_lossless_palette_png():
+    img = Image.new("RGB", (400, 120), (27, 94, 32))
+    ImageDraw.Draw(img).rectangle((20, 20, 200, 100), fill=(255, 255, 255))
+
+    data = encoding.encode(img, kind="test_card")
+
+    assert encoding.ext_for(data) == "png"
+    out = Image.open(io.BytesIO(data)).convert("RGB")
+    assert np.array_equal(np.asarray(out), np.asarray(img))
+    assert encoding.stats()["test_card"]["formats"] == {"png8": 1}
+
+
+def test_photo_like_content_falls_back_to_jpeg_within_budget():
+    rng = np.random.default_rng(0)
+    img = Image.fromarray(rng.integers(0, 256, (300, 400, 3), dtype=np.uint8))
+
+    data = encoding.encode(img, budget_kb=150, kind="test_photo")
+
+    assert encoding.ext_for(data) == "jpg"
+    assert len(data) <= 150 * 1024
+    assert encoding.filename("estado_btc", data) == "estado_btc.jpg"
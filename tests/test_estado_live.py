@@ -0,0 +1,72 @@
+import io
+import sys
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+import pandas as pd
+import pytest
+
+# Ensure repository root is on sys.path for imports
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from bot.handlers.commands import estado
+
+
+class FakeBot:
+    def __init__(self):
+        self.calls = []
+
+    async def edit_message_media(self, chat_id, message_id, media, **kw):
+        self.calls.append(("edit", message_id))
+
+    async def edit_message_reply_markup(self, chat_id, message_id, reply_markup=None, **kw):
+        self.calls.append(("markup", message_id))
+
+
+def _inputs(bar: str, price: float, signal: str = "NEUTRAL") -> dict:
+    df = pd.DataFrame({"time": [pd.Timestamp(bar)], "close": [price]})
+    return dict(
+        ctx4={"trend_up": True, "trend_down": False}, op15={"df": df, "price": price}, ex5={},
+        tz_local=None, last_ts_local_str="—", day_change_pct=None,
+        reasons_line="r", decision_main="ESPERAR", sec_signal=signal,
+    )
+
+
+@pytest.mark.asyncio
+async def test_live_job_edits_only_on_visible_changes_and_stops_when_idle(tmp_path, monkeypatch):
+    current = {"v": _inputs("2024-01-01 10:00", 100.0)}
+
+    async def fake_inputs(st):
+        return current["v"]
+
+    async def fake_payload(st, theme, as_document, **inputs):
+        return io.BytesIO(repr(inputs["op15"]["price"]).encode()), "estado.png", "c"
+
+    monkeypatch.setattr(estado, "_estado_inputs", fake_inputs)
+    monkeypatch.setattr(estado, "_build_estado_payload", fake_payload)
+
+    data = {"chat_id": 3, "message_id": 77, "as_document": False,
+            "sig": estado._live_sig(current["v"]), "price": 100.0, "until": time.monotonic() + 60}
+    removed = []
+    job = SimpleNamespace(data=data, schedule_removal=lambda: removed.append(True))
+    app = SimpleNamespace(bot_data={"config": SimpleNamespace(db_path=str(tmp_path / "t.db"))})
+    bot = FakeBot()
+    ctx = SimpleNamespace(application=app, bot=bot, job=job)
+    from bot.db import repo
+    await repo.ensure_schema(app.bot_data["config"].db_path)
+
+    current["v"] = _inputs("2024-01-01 10:00", 100.2)   # ruido dentro de la vela
+    await estado.estado_live_job(ctx)
+    assert bot.calls == []
+
+    current["v"] = _inputs("2024-01-01 10:15", 100.2)   # cierre de vela
+    await estado.estado_live_job(ctx)
+    assert bot.calls == [("edit", 77)]
+
+    current["v"] = _inputs("2024-01-01 10:15", 101.0)   # movimiento ≥ 0.5 %
+    await estado.estado_live_job(ctx)
+    assert bot.calls[-1] == ("edit", 77) and len(bot.calls) == 2
+
+    data["until"] = 0                                   # inactivo: se apaga y quita el botón live
+    await estado.estado_live_job(ctx)
+    assert bot.calls[-1] == ("markup", 77) and removed == [True]
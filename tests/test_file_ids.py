@@ -0,0 +1,63 @@
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+
+import pytest
+from telegram import Chat, InputFile, Message, PhotoSize
+from telegram.error import BadRequest
+
+# Ensure repository root is on sys.path for imports
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from bot.services import file_ids
+
+
+class FakeBot:
+    def __init__(self):
+        self.sent = []
+        self.reject = set()
+
+    async def send_photo(self, chat_id, photo, **kw):
+        if isinstance(photo, str) and photo in self.reject:
+            raise BadRequest("Wrong file identifier/http url specified")
+        self.sent.append((chat_id, "upload" if isinstance(photo, InputFile) else photo))
+        fid = f"F{len(self.sent)}"
+        return Message(message_id=len(self.sent), date=datetime.now(timezone.utc), chat=Chat(id=chat_id, type="private"),
+                       photo=(PhotoSize(file_id=fid, file_unique_id=fid, width=1, height=1),))
+
+
+@pytest.mark.asyncio
+async def test_same_bytes_go_by_file_id_and_rejected_ids_are_reuploaded():
+    bot = FakeBot()
+    data = b"\x89PNG fake chart bytes for file id test"
+
+    await file_ids.send_photo(bot, 1, data, caption="a")
+    await file_ids.send_photo(bot, 2, data, caption="b")
+    assert bot.sent == [(1, "upload"), (2, "F1")]
+
+    # file_id caducado: se invalida, se sube de nuevo y se recuerda el nuevo
+    bot.reject.add("F1")
+    await file_ids.send_photo(bot, 3, data)
+    await file_ids.send_photo(bot, 4, data)
+    assert bot.sent[2:] == [(3, "upload"), (4, "F3")]
+    assert file_ids.stats()["invalidations"] >= 1
+
+
+@pytest.mark.asyncio
+async def test_non_file_errors_keep_the_cached_file_id_and_do_not_reupload():
+    bot = FakeBot()
+    data = b"\x89PNG bytes for caption error test"
+    await file_ids.send_photo(bot, 1, data)
+
+    async def bad_caption(chat_id, photo, **kw):
+        bot.sent.append((chat_id, photo))
+        raise BadRequest("Can't parse entities: unsupported start tag")
+
+    good = bot.send_photo
+    bot.send_photo = bad_caption
+    with pytest.raises(BadRequest):
+        await file_ids.send_photo(bot, 2, data, caption="<b", parse_mode="HTML")
+    assert bot.sent == [(1, "upload"), (2, "F1")]  # una sola llamada, sin re-subida
+
+    bot.send_photo = good
+    await file_ids.send_photo(bot, 3, data)
+    assert bot.sent[-1] == (3, "F1")               # el file_id sigue en caché
@@ -0,0 +1,84 @@
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+import pandas as pd
+import pytest
+from telegram.error import BadRequest
+
+# Ensure repository root is on sys.path for imports
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from bot.db import repo
+from bot.handlers.commands import header
+
+
+class FakeBot:
+    id = 1
+
+    def __init__(self):
+        self.calls = []
+        self.next_id = 100
+        self.edit_error = None
+
+    async def send_document(self, chat_id, document, **kw):
+        self.calls.append("send")
+        self.next_id += 1
+        return SimpleNamespace(message_id=self.next_id)
+
+    async def edit_message_media(self, chat_id, message_id, media, **kw):
+        self.calls.append(("edit", message_id))
+        if self.edit_error:
+            raise self.edit_error
+
+    async def get_chat_member(self, chat_id, user_id):
+        self.calls.append("member")
+        return SimpleNamespace(status="administrator")
+
+    async def pin_chat_message(self, chat_id, message_id, **kw):
+        self.calls.append(("pin", message_id))
+
+
+def _ctx(bot, db_path, chat_id):
+    app = SimpleNamespace(bot_data={"config": SimpleNamespace(db_path=db_path), "runtime": {}})
+    return SimpleNamespace(application=app, bot=bot, job=SimpleNamespace(chat_id=chat_id, data={"chat_id": chat_id}))
+
+
+@pytest.mark.asyncio
+async def test_header_job_skips_unchanged_and_edits_in_place(tmp_path, monkeypatch):
+    db_path = str(tmp_path / "test.db")
+    await repo.ensure_schema(db_path)
+    trend = {"up": True}
+    day_open = {"v": 100.0}
+
+    async def fake_4h(coin_id, symbol):
+        return {"trend_up": trend["up"], "trend_down": not trend["up"], "rsi": 50.0}
+
+    async def fake_15m(coin_id, symbol):
+        df = pd.DataFrame({"time": [pd.Timestamp.now(tz="UTC").tz_localize(None)], "open": [day_open["v"]], "close": [101.0]})
+        return {"df": df, "price": 101.0}
+
+    monkeypatch.setattr(header, "get_4h_context", fake_4h)
+    monkeypatch.setattr(header, "get_15m_oper", fake_15m)
+
+    bot = FakeBot()
+    ctx = _ctx(bot, db_path, 5)
+
+    await header.header_sync_job(ctx)           # primer header: envío + permiso + fijado
+    await repo.close_writers()
+    assert bot.calls == ["send", "member", ("pin", 101)]
+
+    await header.header_sync_job(ctx)           # mismas entradas: nada
+    assert bot.calls == ["send", "member", ("pin", 101)]
+
+    trend["up"] = False
+    await header.header_sync_job(ctx)           # cambió la tendencia: edición in-place
+    await repo.close_writers()
+    assert bot.calls[-1] == ("edit", 101)
+
+    trend["up"] = True
+    bot.edit_error = BadRequest("Message to edit not found")
+    await header.header_sync_job(ctx)           # mensaje borrado: nuevo envío, permiso cacheado
+    await repo.close_writers()
+    assert bot.calls[-2:] == ["send", ("pin", 102)]
+    assert bot.calls.count("member") == 1
+    assert (await repo.get_chat(db_path, 5)).header_msg_id == 102
@@ -0,0 +1,115 @@
+import json
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+import pandas as pd
+import pytest
+
+# Ensure repository root is on sys.path for imports
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from bot.services import formatting, instruments, render_pool, symbols
+
+RAW = [
+    {"instId": "WIF-USDC", "baseCcy": "WIF", "quoteCcy": "USDC", "tickSz": "0.0001", "lotSz": "0.01", "minSz": "1", "state": "live"},
+    {"instId": "WIF-USDT", "baseCcy": "WIF", "quoteCcy": "USDT", "tickSz": "0.0001", "lotSz": "0.01", "minSz": "1", "state": "live"},
+    {"instId": "OLD-USDT", "baseCcy": "OLD", "quoteCcy": "USDT", "tickSz": "0.1", "lotSz": "1", "minSz": "1", "state": "expired"},
+    {"instId": "BTC-USDT", "baseCcy": "BTC", "quoteCcy": "USDT", "tickSz": "0.1", "lotSz": "0.00000001", "minSz": "0.00001", "state": "live"},
+]
+
+
+def test_refresh_indexes_and_persists(tmp_path, monkeypatch):
+    calls = []
+
+    def fake_get(url, params=None, timeout=None):
+        calls.append(params)
+        return SimpleNamespace(status_code=200, json=lambda: {"data": RAW})
+
+    monkeypatch.setattr(instruments.requests, "get", fake_get)
+    path = str(tmp_path / "inst.json")
+    cat = instruments.InstrumentCatalog(path, max_age=3600)
+
+    assert cat.refresh_sync()
+    assert calls == [{"instType": "SPOT"}]
+    assert cat.find("wif").inst_id == "WIF-USDT"          # preferencia USDT
+    assert cat.get("btc-usdt").decimals == 1
+    assert cat.get("BTC-USDT").lot_sz == "0.00000001"
+    assert not cat.get("OLD-USDT").tradable
+    assert not cat.stale
+
+    # otro proceso/arranque: desde disco, sin red
+    again = instruments.InstrumentCatalog(path, max_age=3600)
+    assert again.load() and len(again) == 4
+    assert json.load(open(path))["data"][0]["instId"] == "WIF-USDC"
+
+
+def test_symbol_and_decimal_lookups_use_the_catalog(tmp_path, monkeypatch):
+    cat = instruments.InstrumentCatalog(str(tmp_path / "x.json"), max_age=3600)
+    cat._index([instruments.Instrument.from_okx(d) for d in RAW], fetched_at=0)
+    cat.complete = True
+    monkeypatch.setattr(instruments, "_CATALOG", cat)
+
+    assert symbols._okx_validate_inst("WIF-USDT")
+    assert not symbols._okx_validate_inst("OLD-USDT")
+    assert symbols._okx_search_by_base("WIF") == "WIF-USDT"
+    assert formatting.fmt_price("WIF-USDT", 1.5) == "1.5000"
+
+
+@pytest.mark.asyncio
+async def test_fmt_price_never_hits_network_and_prefetch_fills_it(tmp_path, monkeypatch):
+    cat = instruments.InstrumentCatalog(str(tmp_path / "x.json"), max_age=3600)
+    cat._index([instruments.Instrument.from_okx(RAW[0])], fetched_at=0)
+    cat.complete = True  # catálogo cargado al que le falta un listado reciente
+    monkeypatch.setattr(instruments, "_CATALOG", cat)
+    calls = []
+
+    def fake_get(url, params=None, timeout=None):
+        calls.append(params)
+        return SimpleNamespace(status_code=200, json=lambda: {"data": [RAW[3]]})
+
+    monkeypatch.setattr(instruments.requests, "get", fake_get)
+
+    assert formatting.fmt_price("BTC-USDT", 65000.0) == "65000.00"   # fallback por magnitud
+    assert calls == []
+
+    await instruments.prefetch("BTC-USDT", "WIF-USDC")                 # solo falta BTC
+    assert calls == [{"instType": "SPOT", "instId": "BTC-USDT"}]
+    assert formatting.fmt_price("BTC-USDT", 65000.0) == "65000.0"      # tickSz 0.1
+    assert render_pool._with_dp(pd.DataFrame({"close": [65000.0]}), {"inst_id": "BTC-USDT"})["dp"] == 1
+
+
+@pytest.mark.asyncio
+async def test_single_instrument_does_not_count_as_catalog_and_failed_refresh_retries_soon(tmp_path, monkeypatch):
+    cat = instruments.InstrumentCatalog(str(tmp_path / "x.json"), max_age=3600)
+    monkeypatch.setattr(instruments, "_CATALOG", cat)
+    calls = []
+    full = {"ok": False}
+
+    def fake_get(url, params=None, timeout=None):
+        calls.append(params)
+        if "instId" in params:
+            return SimpleNamespace(status_code=200, json=lambda: {"data": [RAW[3]]})
+        if not full["ok"]:
+            return SimpleNamespace(status_code=503, json=lambda: {})
+        return SimpleNamespace(status_code=200, json=lambda: {"data": RAW})
+
+    monkeypatch.setattr(instruments.requests, "get", fake_get)
+
+    # arranque sin disco y OKX caído: el catálogo falla, la consulta puntual no
+    await instruments.prefetch("BTC-USDT")
+    assert cat.loaded and not cat.complete
+    assert calls == [{"instType": "SPOT"}, {"instType": "SPOT", "instId": "BTC-USDT"}]
+
+    # el refresco periódico falla → reintento corto (uno solo pendiente)
+    scheduled = []
+    jq = SimpleNamespace(get_jobs_by_name=lambda name: [j for j in scheduled if j[0] == name],
+                         run_once=lambda cb, when, name: scheduled.append((name, when)))
+    await instruments.refresh_job(SimpleNamespace(job_queue=jq))
+    await instruments.refresh_job(SimpleNamespace(job_queue=jq))
+    assert scheduled == [("okx_instruments:retry", cat.retry_sec)]
+
+    # el catálogo completo se vuelve a pedir aunque haya entradas sueltas
+    full["ok"] = True
+    cat._last_try = 0
+    assert symbols._okx_search_by_base("WIF") == "WIF-USDT"
+    assert cat.complete and len(cat) == 4
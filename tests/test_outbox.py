@@ -0,0 +1,54 @@
+import asyncio
+import sys
+from pathlib import Path
+
+import pytest
+from telegram.error import RetryAfter
+
+# Ensure repository root is on sys.path for imports
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from bot.services.outbox import ALERT, IMAGE, TEXT, Outbox
+
+
+class FakeBot:
+    def __init__(self, fail_first=0):
+        self.sent = []
+        self.fail_first = fail_first
+
+    async def send_message(self, chat_id, text, **kwargs):
+        if self.fail_first:
+            self.fail_first -= 1
+            raise RetryAfter(0)
+        self.sent.append((chat_id, text))
+
+
+@pytest.mark.asyncio
+async def test_alerts_go_first_and_superseded_messages_are_merged():
+    bot = FakeBot()
+    ob = Outbox(bot, workers=1)
+    # encolado antes de arrancar: el orden lo decide la prioridad, no la llegada
+    ob.text(1, "info", prio=TEXT)
+    ob.text(1, "peligro v1", prio=ALERT, key="danger")
+    ob.text(1, "peligro v2", prio=ALERT, key="danger")
+    ob.text(1, "tp", prio=ALERT)
+    ob.text(2, "otro chat", prio=IMAGE)
+
+    ob.start()
+    assert await ob.drain(timeout=2)
+    await ob.stop()
+
+    assert [t for _, t in bot.sent] == ["peligro v2", "tp", "info", "otro chat"]
+    assert ob.stats() == {"pending": 0, "sent": 4, "coalesced": 1, "dropped": 0}
+
+
+@pytest.mark.asyncio
+async def test_retry_after_is_retried_without_losing_the_message():
+    bot = FakeBot(fail_first=2)
+    ob = Outbox(bot, workers=2).start()
+    ob.text(5, "🏆 TP", prio=ALERT)
+    await asyncio.sleep(0)
+    assert await ob.drain(timeout=2)
+    await ob.stop()
+
+    assert bot.sent == [(5, "🏆 TP")]
+    assert ob.dropped == 0
@@ -0,0 +1,70 @@
+import os
+import sys
+import asyncio
+import io
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+import pandas as pd
+import pytest
+
+# Ensure repository root is on sys.path for imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from bot.services import render_pool
+
+
+class BrokenPool:
+    def submit(self, fn, *a, **kw):
+        raise BrokenProcessPool("worker muerto")
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        pass
+
+
+@pytest.mark.asyncio
+async def test_broken_pool_restarts_once_with_same_budget(monkeypatch):
+    starts = []
+
+    async def fake_start(workers=None, image_budget_kb=None):
+        starts.append((workers, image_budget_kb))
+        render_pool._POOL, render_pool._WORKERS = object(), workers
+        return workers
+
+    broken = BrokenPool()
+    monkeypatch.setattr(render_pool, "start", fake_start)
+    monkeypatch.setattr(render_pool, "_POOL", broken)
+    monkeypatch.setattr(render_pool, "_WORKERS", 3)
+    monkeypatch.setattr(render_pool, "_BUDGET", 450.0)
+    monkeypatch.setattr(render_pool, "_RESTART", None)
+
+    n = 10
+    df = pd.DataFrame({"time": pd.date_range("2024-01-01", periods=n, freq="15min"),
+                       "open": np.ones(n), "high": np.ones(n), "low": np.ones(n), "close": np.ones(n)})
+    ema = pd.Series(np.ones(n))
+    local = lambda *a, **kw: io.BytesIO(b"png")
+
+    outs = await asyncio.gather(*(render_pool._render(f"broken{i}", None, local, df, {}, ema, ema, ema, {})
+                                  for i in range(3)))
+    await render_pool._RESTART
+    assert [o.getvalue() for o in outs] == [b"png"] * 3
+    assert starts == [(3, 450.0)]
+    healthy = render_pool._POOL
+
+    # un render que falla tarde con el pool viejo no toca el nuevo
+    await render_pool._restart(broken)
+    assert render_pool._POOL is healthy and starts == [(3, 450.0)]
+    render_pool._POOL = None
+
+
+def test_chart_templates_are_per_thread():
+    from concurrent.futures import ThreadPoolExecutor
+    from bot.handlers.commands import grafica
+    from bot.services import plotting
+
+    for mod, args in ((plotting, ()), (grafica, (False,))):
+        mine = mod._template(*args)
+        assert mod._template(*args) is mine
+        with ThreadPoolExecutor(1) as ex:
+            other = ex.submit(mod._template, *args).result()
+        assert other is not mine
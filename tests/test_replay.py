@@ -0,0 +1,47 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+# Ensure repository root is on sys.path for imports
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from bot import replay
+from bot.handlers import jobs
+
+
+def test_source_serves_closed_base_candles_and_forming_bar(candles):
+    frames = {"AAA-USDT": candles(1500, seed=1), "BBB-USDT": candles(1500, seed=2)}
+    src = replay.ReplaySource(frames)
+    src.set_time(pd.Timestamp("2024-01-05 10:10"))  # velas de 5m cerradas hasta las 10:05
+
+    df = src.candles("AAA-USDT", "15m", 400)
+    base = frames["AAA-USDT"].set_index("time")
+    assert len(df) == 300  # tope de OKX
+    assert df["time"].iloc[-1] == pd.Timestamp("2024-01-05 10:00")
+    assert df["close"].iloc[-1] == base.loc["2024-01-05 10:05", "close"]           # vela en formación
+    assert df["high"].iloc[-1] == base.loc["2024-01-05 10:00":"2024-01-05 10:05", "high"].max()
+    assert df["close"].iloc[-2] == base.loc["2024-01-05 09:55", "close"]           # 15m cerrada anterior
+    assert src.candles("AAA-USDT", "1m") is None and src.candles("ZZZ-USDT") is None
+
+    lv = src.levels("AAA-USDT")
+    day = base.loc["2024-01-04"]
+    assert np.isclose(lv["P"], (day["high"].max() + day["low"].min() + day["close"].iloc[-1]) / 3)
+
+
+@pytest.mark.asyncio
+async def test_replay_runs_real_jobs_deterministically_and_restores_services(candles):
+    original = jobs.okx_klines
+    reports = []
+    for _ in range(2):
+        rp = replay.Replay(replay.ReplaySource({"AAA-USDT": candles(1500, seed=1), "BBB-USDT": candles(1500, seed=2)}), chats=4, poll_sec=300, render=False,
+                           start=pd.Timestamp("2024-01-04 00:00"), end=pd.Timestamp("2024-01-04 02:00"))
+        reports.append(await rp.run(progress_every=0))
+
+    rep = reports[0]
+    assert (rep.ticks, rep.jobs, rep.errors) == (24, 24 * 4 + 24 * 4, 0)
+    assert rep.calls["send_document"] == 4       # un header por chat, luego ediciones/nada
+    assert rep.fetches["15m"] == 2 * 24          # memorizado por símbolo y tick
+    assert reports[1].digest == rep.digest
+    assert jobs.okx_klines is original
@@ -0,0 +1,61 @@
+import sqlite3
+import sys
+from pathlib import Path
+
+# Ensure repository root is on sys.path for imports
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from bot.db import repo
+
+
+def test_migrate_fresh_db_reaches_latest_version(tmp_path):
+    db_path = str(tmp_path / "test.db")
+    assert repo.migrate(db_path) == repo.SCHEMA_VERSION
+    # segunda pasada: nada pendiente
+    assert repo.migrate(db_path) == repo.SCHEMA_VERSION
+    con = sqlite3.connect(db_path)
+    assert con.execute("PRAGMA user_version;").fetchone()[0] == repo.SCHEMA_VERSION
+    con.close()
+
+
+def test_migrate_legacy_unversioned_db_keeps_rows(tmp_path):
+    db_path = str(tmp_path / "legacy.db")
+    con = sqlite3.connect(db_path)
+    # esquema previo al versionado (dark_mode añadido por la migración suave antigua)
+    con.execute(
+        """
+        CREATE TABLE chats (
+            chat_id INTEGER PRIMARY KEY, coin_id TEXT NOT NULL DEFAULT 'dogwifcoin',
+            symbol_okx TEXT NOT NULL DEFAULT 'WIF-USDT', tp_pct REAL NOT NULL DEFAULT 2.0,
+            sl_pct REAL NOT NULL DEFAULT 1.5, modo TEXT NOT NULL DEFAULT 'agresivo',
+            precision_on INTEGER NOT NULL DEFAULT 0, alerts_on INTEGER NOT NULL DEFAULT 1,
+            dark_mode INTEGER NOT NULL DEFAULT 0
+        );
+        """
+    )
+    con.execute("INSERT INTO chats (chat_id, coin_id, dark_mode) VALUES (5, 'bonk', 1);")
+    con.commit()
+    con.close()
+
+    assert repo.migrate(db_path) == repo.SCHEMA_VERSION
+    chat = repo._get_chat_sync(db_path, 5)
+    assert (chat.coin_id, chat.dark_mode, chat.position_entry) == ("bonk", 1, None)
+
+
+def test_ledger_rows_from_v7_move_to_append_only_exits(tmp_path, monkeypatch):
+    db_path = str(tmp_path / "v7.db")
+    monkeypatch.setattr(repo, "MIGRATIONS", repo.MIGRATIONS[:7])
+    assert repo.migrate(db_path) == 7
+    con = sqlite3.connect(db_path)
+    con.execute("INSERT INTO chats (chat_id, position_entry) VALUES (1, 100.0);")
+    con.execute("INSERT INTO positions (chat_id, coin_id, symbol, entry_price, opened_at, exit_price, exit_reason, "
+                "pnl_pct, closed_at) VALUES (1, 'bitcoin', 'BTC-USDT', 90.0, 1.0, 99.0, 'tp', 10.0, 2.0);")
+    con.execute("INSERT INTO positions (chat_id, coin_id, symbol, entry_price, opened_at) "
+                "VALUES (1, 'bitcoin', 'BTC-USDT', 100.0, 3.0);")
+    con.commit()
+    con.close()
+    monkeypatch.undo()
+
+    assert repo.migrate(db_path) == repo.SCHEMA_VERSION
+    assert repo._get_open_position_sync(db_path, 1)["entry_price"] == 100.0
+    rows = repo._list_positions_sync(db_path, chat_id=1)
+    assert [(r["entry_price"], r["exit_reason"], r["pnl_pct"]) for r in rows] == [(100.0, None, None), (90.0, "tp", 10.0)]
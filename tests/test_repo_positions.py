@@ -0,0 +1,53 @@
+import sqlite3
+import sys
+from pathlib import Path
+
+import pytest
+
+# Ensure repository root is on sys.path for imports
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from bot.db import repo
+
+
+@pytest.mark.asyncio
+async def test_open_and_close_position_keeps_chat_in_sync(tmp_path):
+    db_path = str(tmp_path / "test.db")
+    await repo.ensure_schema(db_path)
+
+    pid = await repo.open_position(db_path, 1, "bitcoin", "BTC-USDT", 100.0, opened_at=1000.0)
+    # una segunda entrada no duplica la posición abierta
+    assert await repo.open_position(db_path, 1, "bitcoin", "BTC-USDT", 105.0) == pid
+    chat = await repo.get_chat(db_path, 1)
+    assert chat.position_entry == 100.0
+
+    closed = await repo.close_position(db_path, 1, 102.0, "tp", closed_at=2000.0)
+    assert closed["exit_reason"] == "tp"
+    assert closed["pnl_pct"] == pytest.approx(2.0)
+    assert (await repo.get_chat(db_path, 1)).position_entry is None
+    assert await repo.get_open_position(db_path, 1) is None
+    assert await repo.close_position(db_path, 1, 99.0, "sl") is None
+
+    # append-only: la entrada no se toca; la salida es otra fila. Luego se puede volver a entrar.
+    con = sqlite3.connect(db_path)
+    assert con.execute("SELECT closed_at, exit_price FROM positions WHERE id=?;", (pid,)).fetchone() == (None, None)
+    assert con.execute("SELECT exit_reason FROM position_exits WHERE position_id=?;", (pid,)).fetchone() == ("tp",)
+    con.close()
+    assert await repo.open_position(db_path, 1, "bitcoin", "BTC-USDT", 101.0) != pid
+    assert [p["exit_reason"] for p in await repo.list_positions(db_path, chat_id=1)] == [None, "tp"]
+
+
+@pytest.mark.asyncio
+async def test_position_stats_by_symbol(tmp_path):
+    db_path = str(tmp_path / "test.db")
+    await repo.ensure_schema(db_path)
+
+    for chat_id, exit_price, reason in ((1, 110.0, "tp"), (2, 95.0, "sl"), (3, None, "reset")):
+        await repo.open_position(db_path, chat_id, "bitcoin", "BTC-USDT", 100.0)
+        await repo.close_position(db_path, chat_id, exit_price, reason)
+    await repo.open_position(db_path, 4, "dogwifcoin", "WIF-USDT", 1.0)
+
+    stats = await repo.position_stats(db_path, symbol="BTC-USDT")
+    assert stats["trades"] == 2
+    assert stats["win_rate"] == 0.5
+    assert stats["total_pnl_pct"] == pytest.approx(5.0)
+    assert len(await repo.list_positions(db_path, symbol="BTC-USDT")) == 3
@@ -0,0 +1,81 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+# Ensure repository root is on sys.path for imports
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from bot.db import repo
+from bot.db.models import ChatState
+
+
+@pytest.mark.asyncio
+async def test_list_subscriptions_groups_alert_enabled_chats(tmp_path):
+    db_path = str(tmp_path / "test.db")
+    await repo.ensure_schema(db_path)
+    await repo.update_fields(db_path, 1, coin_id="bitcoin", symbol_okx="BTC-USDT")
+    await repo.update_fields(db_path, 2, coin_id="bitcoin", symbol_okx="BTC-USDT", tp_pct=3.0)
+    await repo.update_fields(db_path, 3, coin_id="bitcoin", symbol_okx="BTC-USDT", alerts_on=0)
+    await repo.upsert_chat(db_path, ChatState(chat_id=4))  # defaults (WIF)
+
+    groups = await repo.list_subscriptions(db_path)
+    assert sorted(st.chat_id for st in groups[("bitcoin", "BTC-USDT")]) == [1, 2]
+    assert [st.chat_id for st in groups[("dogwifcoin", "WIF-USDT")]] == [4]
+
+    only_btc = await repo.list_subscriptions(db_path, symbol_okx="BTC-USDT")
+    assert list(only_btc) == [("bitcoin", "BTC-USDT")]
+
+
+@pytest.mark.asyncio
+async def test_subscription_index_follows_incremental_changes(tmp_path):
+    db_path = str(tmp_path / "test.db")
+    await repo.ensure_schema(db_path)
+    await repo.update_fields(db_path, 1, coin_id="bitcoin", symbol_okx="BTC-USDT")
+
+    idx = await repo.SubscriptionIndex.load(db_path)
+    changes = []
+    repo.add_subscription_listener(changes.append)
+    try:
+        await repo.update_fields(db_path, 1, symbol_okx="BTC-USDC")
+        await repo.update_fields(db_path, 2, coin_id="bitcoin", symbol_okx="BTC-USDC", sl_pct=2.0)
+        await repo.update_fields(db_path, 1, alerts_on=0)
+
+        writer = repo.get_writer(db_path)
+        writer.queue(2, tp_pct=4.0)
+        await writer.flush()
+    finally:
+        repo.remove_subscription_listener(changes.append)
+        idx.close()
+
+    assert [c.moved for c in changes] == [True, True, True, False]
+    assert idx.keys() == [("bitcoin", "BTC-USDC")]
+    (st,) = idx.chats_for(("bitcoin", "BTC-USDC"))
+    assert (st.chat_id, st.sl_pct, st.tp_pct) == (2, 2.0, 4.0)
+
+
+@pytest.mark.asyncio
+async def test_only_subscription_relevant_writes_emit_changes(tmp_path):
+    db_path = str(tmp_path / "test.db")
+    await repo.ensure_schema(db_path)
+    await repo.update_fields(db_path, 1, coin_id="bitcoin", symbol_okx="BTC-USDT")
+    await repo.update_fields(db_path, 2, alerts_on=0)
+
+    changes = []
+    repo.add_subscription_listener(changes.append)
+    try:
+        await repo.open_position(db_path, 1, "bitcoin", "BTC-USDT", 100.0)
+        await repo.update_fields(db_path, 1, header_msg_id=5, peak=101.0)
+        await repo.close_position(db_path, 1, 102.0, "tp")
+        await repo.update_fields(db_path, 2, tp_pct=9.0)  # sin alertas: nadie lo sigue
+        assert changes == []
+
+        await repo.update_fields(db_path, 1, modo="conservador")
+        await repo.open_position(db_path, 3, "dogwifcoin", "WIF-USDT", 2.0)  # crea el chat (alertas por defecto)
+    finally:
+        repo.remove_subscription_listener(changes.append)
+
+    assert [(c.chat_id, c.old, c.new) for c in changes] == [
+        (1, ("bitcoin", "BTC-USDT"), ("bitcoin", "BTC-USDT")),
+        (3, None, ("dogwifcoin", "WIF-USDT")),
+    ]
+    assert changes[0].state.modo == "conservador"
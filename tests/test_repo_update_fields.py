@@ -28,3 +28,33 @@ async def test_update_fields_rejects_unknown_field(tmp_path):
 
     with pytest.raises(ValueError):
         await repo.update_fields(str(db_path), 1, invalid_field=True)
+
+
+@pytest.mark.asyncio
+async def test_header_fields_persist_and_survive_upsert(tmp_path):
+    db_path = str(tmp_path / "test.db")
+    await repo.ensure_schema(db_path)
+
+    await repo.update_fields(db_path, 7, header_msg_id=42, header_sig="up|+1.00% hoy")
+    chat = await repo.get_chat(db_path, 7)
+    assert (chat.header_msg_id, chat.header_sig) == (42, "up|+1.00% hoy")
+
+    # upsert_chat (ajustes) no pisa el header registrado
+    await repo.upsert_chat(db_path, repo.ChatState(chat_id=7, dark_mode=1))
+    chat = await repo.get_chat(db_path, 7)
+    assert chat.dark_mode == 1 and chat.header_msg_id == 42
+
+
+@pytest.mark.asyncio
+async def test_upsert_keeps_queued_header_fields(tmp_path):
+    db_path = str(tmp_path / "test.db")
+    await repo.ensure_schema(db_path)
+    await repo.start_writer(db_path, flush_ms=10_000, max_pending=10_000)
+
+    await repo.queue_update(db_path, 7, header_msg_id=42, modo="conservador")
+    await repo.upsert_chat(db_path, repo.ChatState(chat_id=7, dark_mode=1))  # /darkmode antes del flush
+    await repo.close_writers()
+
+    chat = repo._get_chat_sync(db_path, 7)
+    assert (chat.dark_mode, chat.header_msg_id) == (1, 42)
+    assert chat.modo == "agresivo"  # lo que upsert_chat sí escribe gana a la cola
@@ -0,0 +1,117 @@
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+
+# Ensure repository root is on sys.path for imports
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from bot.db import repo
+
+
+@pytest.mark.asyncio
+async def test_queue_update_coalesces_and_flushes_in_one_batch(tmp_path):
+    db_path = str(tmp_path / "test.db")
+    await repo.ensure_schema(db_path)
+    writer = await repo.start_writer(db_path, flush_ms=10_000, max_pending=10_000)
+
+    for i in range(50):
+        await repo.queue_update(db_path, 1, tp_pct=float(i))
+    await repo.queue_update(db_path, 2, modo="conservador")
+
+    # lectura consistente aunque aún no se volcó
+    chat = await repo.get_chat(db_path, 1)
+    assert chat.tp_pct == 49.0
+    assert repo._get_chat_sync(db_path, 1) is None
+
+    assert await writer.flush() == 2
+    assert repo._get_chat_sync(db_path, 1).tp_pct == 49.0
+    assert repo._get_chat_sync(db_path, 2).modo == "conservador"
+    await repo.close_writers()
+
+
+@pytest.mark.asyncio
+async def test_direct_update_wins_over_pending_and_shutdown_flushes(tmp_path):
+    db_path = str(tmp_path / "test.db")
+    await repo.ensure_schema(db_path)
+    await repo.start_writer(db_path, flush_ms=10_000, max_pending=10_000)
+
+    await repo.queue_update(db_path, 7, alerts_on=0, modo="balanceado")
+    await repo.update_fields(db_path, 7, alerts_on=1)
+    await repo.close_writers()
+
+    chat = repo._get_chat_sync(db_path, 7)
+    assert chat.alerts_on == 1
+    assert chat.modo == "balanceado"
+
+
+@pytest.mark.asyncio
+async def test_heartbeat_state_goes_through_the_queue_and_survives_restart(tmp_path):
+    db_path = str(tmp_path / "test.db")
+    await repo.ensure_schema(db_path)
+    await repo.start_writer(db_path, flush_ms=10_000, max_pending=10_000)
+
+    await repo.open_position(db_path, 3, "dogwifcoin", "WIF-USDT", 2.0)
+    for i in range(20):  # un tick por iteración: solo sube el pico
+        await repo.queue_update(db_path, 3, peak=2.0 + i / 100, last_entry_bar=1_717_171_200.0)
+    st = await repo.get_chat(db_path, 3)
+    await repo.upsert_chat(db_path, st)  # p.ej. /tp: no pisa el estado encolado
+    assert repo._get_chat_sync(db_path, 3).peak is None
+    await repo.close_writers()  # apagado
+
+    st = repo._get_chat_sync(db_path, 3)
+    assert (st.position_entry, st.peak, st.last_entry_bar) == (2.0, 2.19, 1_717_171_200.0)
+
+
+@pytest.mark.asyncio
+async def test_queue_update_rejects_unknown_field(tmp_path):
+    db_path = str(tmp_path / "test.db")
+    await repo.ensure_schema(db_path)
+    with pytest.raises(ValueError):
+        await repo.queue_update(db_path, 1, invalid_field=True)
+
+
+@pytest.mark.asyncio
+async def test_get_chat_sees_batch_while_flush_is_writing(tmp_path, monkeypatch):
+    db_path = str(tmp_path / "test.db")
+    await repo.ensure_schema(db_path)
+    writer = await repo.start_writer(db_path, flush_ms=10_000, max_pending=10_000)
+    await repo.queue_update(db_path, 3, header_msg_id=42)
+
+    seen = []
+    apply = repo._apply_batch_sync
+
+    def slow_apply(path, batch, track=False):
+        # en mitad del flush: ni la cola ni la BD tienen aún el lote
+        seen.append(writer.pending_for(3))
+        return apply(path, batch, track)
+
+    monkeypatch.setattr(repo, "_apply_batch_sync", slow_apply)
+    await writer.flush()
+    assert seen == [{"header_msg_id": 42}]
+    assert writer.pending_for(3) == {}
+    assert (await repo.get_chat(db_path, 3)).header_msg_id == 42
+    await repo.close_writers()
+
+
+@pytest.mark.asyncio
+async def test_direct_update_during_flush_is_not_overwritten_by_batch(tmp_path, monkeypatch):
+    db_path = str(tmp_path / "test.db")
+    await repo.ensure_schema(db_path)
+    writer = await repo.start_writer(db_path, flush_ms=10_000, max_pending=10_000)
+    await repo.queue_update(db_path, 3, header_msg_id=1)
+
+    apply = repo._apply_batch_sync
+    direct = threading.Thread(target=repo._direct_sync, args=(db_path, 3, ["header_msg_id"], repo._update_fields_sync,
+                                                              db_path, 3), kwargs={"header_msg_id": 2})
+
+    def racing_apply(path, batch, track=False):
+        direct.start()  # /header (directo) llega mientras el lote viejo se escribe
+        direct.join(0.2)
+        return apply(path, batch, track)
+
+    monkeypatch.setattr(repo, "_apply_batch_sync", racing_apply)
+    await writer.flush()
+    direct.join()
+    assert repo._get_chat_sync(db_path, 3).header_msg_id == 2
+    await repo.close_writers()
@@ -0,0 +1,66 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# Ensure repository root is on sys.path for imports
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from bot.services import backtest, signals
+from bot.services.indicators import ema, rsi
+from bot.services.signals import Settings, SignalState
+
+
+def _tick(**kw):
+    f = {k: np.nan for k in signals.FIELDS}
+    f.update(close=100.0, low=99.9, prev_close=99.5, rsi15=50.0, rsi15_prev=49.0, macd15_up=1.0, hist15_up=1.0,
+             ema20=99.0, ema50=98.0, ema200=97.0, macd5_up=1.0, rsi5=55.0,
+             rsi4=60.0, e4_20=99.0, e4_50=98.0, e4_200=97.0, close4=100.0)
+    f.update(kw)
+    return f
+
+
+def test_scalar_rules_match_vectorized_columns(candles):
+    f = backtest.features(candles(seed=3, wave=0.003))
+    mp = {"pre_break_buffer": 0.006, "rsi_buy": 60}
+    for precision in (False, True):
+        vec = signals.entry(f, mp, precision)
+        rows = sorted(set(range(300, len(f), 97)) | set(np.flatnonzero(vec)[:20]))
+        assert [bool(signals.entry(dict(zip(f.names, f.X[i])), mp, precision)) for i in rows] == [bool(vec[i]) for i in rows]
+    dvec = signals.danger(f, mp)
+    assert any(dvec[300:])
+    assert all(bool(signals.danger(dict(zip(f.names, f.X[i])), mp)) == dvec[i] for i in range(300, len(f), 53))
+
+
+def test_evaluate_entry_cooldown_and_exit_return_next_state():
+    cfg = Settings(modo="agresivo", precision=True, tp_pct=2.0, sl_pct=1.5, params={"rsi_buy": 45})
+    t0 = pd.Timestamp("2024-01-01 10:00")
+    entry_tick = _tick(rsi15_prev=44.0, rsi15=46.0)  # cruce de 45 (+0.8)
+
+    ev = signals.evaluate(entry_tick, cfg, SignalState(), bar=t0)
+    assert [d.kind for d in ev.decisions] == ["entry"]
+    assert ev.state.position_entry == 100.0 and ev.state.last_entry_bar == t0
+
+    st = ev.state
+    ev = signals.evaluate(_tick(close=102.5), cfg, st, bar=t0 + signals.BAR15)
+    assert [d.kind for d in ev.decisions] == ["tp"] and round(ev.get("tp").gain, 3) == 0.025
+    assert ev.state.position_entry is None and st.position_entry == 100.0  # el estado previo no se toca
+
+    # cooldown de 6 velas de 15m en precisión
+    assert signals.evaluate(entry_tick, cfg, ev.state, bar=t0 + 5 * signals.BAR15).decisions == []
+    assert signals.evaluate(entry_tick, cfg, ev.state, bar=t0 + 6 * signals.BAR15).get("entry") is not None
+
+
+def test_snapshot_from_live_frames_matches_backtest_features(candles):
+    df5 = candles(seed=3, wave=0.003)
+    f = backtest.features(df5)
+    i = 3000
+    d15 = df5.set_index("time").resample("15min").agg(backtest.OHLC).dropna().iloc[: i + 1].reset_index()
+    d4 = d15.set_index("time").resample("4h").agg(backtest.OHLC).dropna().reset_index()
+    ctx4 = {"df": d4, "rsi": float(rsi(d4["close"], 14).iloc[-1]), "ema20": float(ema(d4["close"], 20).iloc[-1]),
+            "ema50": float(ema(d4["close"], 50).iloc[-1]), "ema200": float(ema(d4["close"], 200).iloc[-1])}
+    df5_now = df5[df5["time"] < d15["time"].iloc[-1] + signals.BAR15]
+
+    snap = signals.snapshot(d15, df5_now, ctx4, None, precision=False)
+    for k in ("close", "rsi15", "rsi15_prev", "macd15_up", "hist15_up", "ema50", "macd5_up", "rsi5", "rsi4", "e4_50"):
+        assert np.isclose(snap[k], f[k][i]), k
@@ -0,0 +1,39 @@
+import asyncio
+import sys
+from pathlib import Path
+
+import pytest
+
+# Ensure repository root is on sys.path for imports
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from bot.services.snapshots import SnapshotCache
+
+
+@pytest.mark.asyncio
+async def test_concurrent_requests_share_one_fetch_and_ttl_applies():
+    cache = SnapshotCache(ttl=60)
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return {"price": len(calls)}
+
+    out = await asyncio.gather(*(cache.get(("estado", "btc"), fetch) for _ in range(5)))
+    assert len(calls) == 1 and all(o == {"price": 1} for o in out)
+
+    assert await cache.get(("estado", "btc"), fetch) == {"price": 1}          # dentro del TTL
+    assert await cache.get(("estado", "btc"), fetch, ttl=0) == {"price": 2}   # forzado
+    assert cache.stats()["fetches"] == 2
+
+
+@pytest.mark.asyncio
+async def test_failures_are_not_cached():
+    cache = SnapshotCache(ttl=60)
+    results = [None, {"ok": True}]
+
+    async def fetch():
+        return results.pop(0)
+
+    assert await cache.get("k", fetch) is None
+    assert await cache.get("k", fetch) == {"ok": True}
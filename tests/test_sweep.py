@@ -0,0 +1,42 @@
+import sys
+from pathlib import Path
+
+# Ensure repository root is on sys.path for imports
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from bot.services import backtest, sweep
+
+
+def test_grid_fills_missing_keys_from_defaults():
+    combos = sweep.grid({"rsi_buy": (40, 50), "tp_pct": (1.0,), "sl_pct": (1.0,), "pre_break_buffer": (0.004,)})
+    assert len(combos) == 2 * 2  # × precision on/off por defecto
+    assert {c["rsi_buy"] for c in combos} == {40, 50}
+
+
+def test_tasks_are_chunked_to_keep_every_worker_busy():
+    combos = sweep.grid()
+    assert len(sweep._tasks(["A"], combos)) == 10  # precisión × rsi_buy
+    tasks = sweep._tasks(["A", "B"], combos, min_tasks=4 * 32)
+    assert len(tasks) >= 128
+    done = [(s, {**outer, **p}) for s, outer, inner in tasks for p in inner]
+    assert len(done) == 2 * len(combos)
+    assert {tuple(sorted(q.items())) for s, q in done if s == "A"} == {tuple(sorted(c.items())) for c in combos}
+
+
+def test_pool_over_shared_memory_matches_inline_and_single_backtest(candles):
+    feats = {"AAA-USDT": backtest.features(candles(seed=1)), "BBB-USDT": backtest.features(candles(seed=2))}
+    spec = {"precision": (False,), "rsi_buy": (45, 55), "pre_break_buffer": (0.004,), "tp_pct": (1.0, 2.0), "sl_pct": (1.0,)}
+    seen = []
+
+    inline = sweep.run(feats, spec, workers=0, progress=None)
+    pooled = sweep.run(feats, spec, workers=2, progress=lambda d, t, el: seen.append((d, t)))
+
+    key = ["symbol", "rsi_buy", "tp_pct"]
+    assert pooled.sort_values(key).reset_index(drop=True).equals(inline.sort_values(key).reset_index(drop=True))
+    assert seen[-1] == (8, 8)
+
+    row = pooled[(pooled.symbol == "BBB-USDT") & (pooled.rsi_buy == 55) & (pooled.tp_pct == 2.0)].iloc[0]
+    ref = backtest.run(None, tp_pct=2.0, sl_pct=1.0, params={"rsi_buy": 55, "pre_break_buffer": 0.004},
+                       feats=feats["BBB-USDT"]).summary()
+    assert (row.trades, row.return_pct) == (ref["trades"], ref["return_pct"])
+    # ranking: dentro de cada símbolo, rank 1..n
+    assert sorted(pooled[pooled.symbol == "AAA-USDT"]["rank"]) == [1, 2, 3, 4]
@@ -0,0 +1,129 @@
+import asyncio
+import sys
+from pathlib import Path
+
+import pytest
+
+# Ensure repository root is on sys.path for imports
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from bot.db import repo
+from bot.services import instruments, symbols
+
+
+@pytest.mark.asyncio
+async def test_strategies_run_in_order_and_result_survives_restart(tmp_path, monkeypatch):
+    db_path = str(tmp_path / "test.db")
+    await repo.ensure_schema(db_path)
+    calls = []
+
+    async def base(cg_id):
+        calls.append("base")
+        return "WIF-USDT"
+
+    async def tickers(cg_id):
+        calls.append("tickers")
+        return "WRONG-USDT"
+
+    monkeypatch.setattr(symbols, "_STRATEGIES", (("base", base), ("tickers", tickers)))
+    monkeypatch.setattr(symbols, "_CACHE", {})
+
+    assert await symbols.resolve_okx_symbol("dogwifcoin", db_path) == "WIF-USDT"
+    assert calls == ["base"]  # tickers (payload completo) no se pide si base resuelve
+    row = await repo.get_symbol_map(db_path, "dogwifcoin")
+    assert (row["inst_id"], row["source"]) == ("WIF-USDT", "base")
+
+    # "reinicio": memoria vacía, se responde desde SQLite sin lanzar estrategias
+    monkeypatch.setattr(symbols, "_CACHE", {})
+    calls.clear()
+    assert await symbols.resolve_okx_symbol("dogwifcoin", db_path) == "WIF-USDT"
+    assert calls == []
+
+
+@pytest.mark.asyncio
+async def test_slow_strategy_gives_way_after_head_start(tmp_path, monkeypatch):
+    db_path = str(tmp_path / "test.db")
+    await repo.ensure_schema(db_path)
+
+    async def slow(cg_id):
+        await asyncio.sleep(5)
+        return "WRONG-USDT"
+
+    async def fast(cg_id):
+        return "WIF-USDT"
+
+    monkeypatch.setattr(symbols, "_STRATEGIES", (("base", slow), ("tickers", fast)))
+    monkeypatch.setattr(symbols, "_HEAD_START", 0.05)
+    monkeypatch.setattr(symbols, "_CACHE", {})
+    assert await symbols.resolve_okx_symbol("dogwifcoin", db_path, deadline=1) == "WIF-USDT"
+    assert (await repo.get_symbol_map(db_path, "dogwifcoin"))["source"] == "tickers"
+
+
+@pytest.mark.asyncio
+async def test_transport_error_is_not_persisted_as_miss(tmp_path, monkeypatch):
+    db_path = str(tmp_path / "test.db")
+    await repo.ensure_schema(db_path)
+
+    async def rate_limited(cg_id):
+        raise ValueError({"status": {"error_code": 429, "error_message": "rate limit"}})
+
+    async def nothing(cg_id):
+        return None
+
+    monkeypatch.setattr(symbols, "_CACHE", {})
+    monkeypatch.setattr(symbols, "_STRATEGIES", (("base", rate_limited), ("tickers", nothing)))
+    assert await symbols.resolve_okx_symbol("nueva", db_path) is None
+    assert await repo.get_symbol_map(db_path, "nueva") is None
+
+    # todas terminan sin error y sin par: fallo concluyente, se guarda
+    monkeypatch.setattr(symbols, "_STRATEGIES", (("base", nothing), ("tickers", nothing)))
+    assert await symbols.resolve_okx_symbol("nueva", db_path) is None
+    assert (await repo.get_symbol_map(db_path, "nueva"))["inst_id"] is None
+
+
+@pytest.mark.asyncio
+async def test_deadline_returns_none_without_persisting(tmp_path, monkeypatch):
+    db_path = str(tmp_path / "test.db")
+    await repo.ensure_schema(db_path)
+
+    async def hang(cg_id):
+        await asyncio.sleep(5)
+
+    monkeypatch.setattr(symbols, "_STRATEGIES", (("base", hang),))
+    monkeypatch.setattr(symbols, "_CACHE", {})
+
+    assert await symbols.resolve_okx_symbol("nada", db_path, deadline=0.05) is None
+    assert await repo.get_symbol_map(db_path, "nada") is None
+
+
+def test_coingecko_not_found_is_a_miss_but_transport_errors_raise(monkeypatch):
+    class FakeCG:
+        def __init__(self, exc):
+            self.exc = exc
+
+        def get_coin_by_id(self, **kw):
+            raise self.exc
+
+    monkeypatch.setattr(symbols, "_CG", FakeCG(ValueError({"error": "coin not found"})))
+    assert symbols._cg_get_symbol("nada") is None and symbols._cg_tickers_try_okx("nada") is None
+
+    monkeypatch.setattr(symbols, "_CG", FakeCG(TimeoutError("read timed out")))
+    with pytest.raises(TimeoutError):
+        symbols._cg_get_symbol("bitcoin")
+
+
+@pytest.mark.asyncio
+async def test_okx_catalog_outage_is_not_persisted_as_miss(tmp_path, monkeypatch):
+    db_path = str(tmp_path / "test.db")
+    await repo.ensure_schema(db_path)
+
+    class DownCatalog(instruments.InstrumentCatalog):
+        def _download(self):
+            raise ConnectionError("OKX 503")
+
+    monkeypatch.setattr(instruments, "_CATALOG", DownCatalog(str(tmp_path / "inst.json"), max_age=3600))
+    monkeypatch.setattr(symbols, "_CACHE", {})
+    monkeypatch.setattr(symbols, "_cg_get_symbol", lambda cg_id: "WIF")
+    monkeypatch.setattr(symbols, "_cg_tickers_try_okx", lambda cg_id: symbols._okx_validate_inst("WIF-USDT"))
+
+    assert await symbols.resolve_okx_symbol("dogwifcoin", db_path) is None
+    assert await repo.get_symbol_map(db_path, "dogwifcoin") is None
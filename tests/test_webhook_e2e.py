@@ -0,0 +1,102 @@
+import asyncio
+import json
+import socket
+import sys
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("tornado")  # python-telegram-bot[webhooks]
+import httpx
+from telegram.ext import ApplicationBuilder, CommandHandler
+from telegram.request import BaseRequest
+
+# Ensure repository root is on sys.path for imports
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from bot.app import webhook_params
+from bot.config import Config
+
+SECRET = "s3cret_token"
+
+# update real (/ping en un chat privado) tal como lo manda Telegram
+UPDATE = {
+    "update_id": 1001,
+    "message": {
+        "message_id": 7,
+        "date": 1717171717,
+        "chat": {"id": 42, "type": "private", "first_name": "Ana"},
+        "from": {"id": 42, "is_bot": False, "first_name": "Ana"},
+        "text": "/ping",
+        "entities": [{"type": "bot_command", "offset": 0, "length": 5}],
+    },
+}
+
+
+class StubRequest(BaseRequest):
+    """Bot API falsa: getMe/setWebhook/deleteWebhook responden ok, sin red."""
+
+    def __init__(self):
+        self.calls = []
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    @property
+    def read_timeout(self):
+        return 1.0
+
+    async def do_request(self, url, method, request_data=None, **kw):
+        name = url.rsplit("/", 1)[-1]
+        self.calls.append((name, request_data.parameters if request_data else {}))
+        result = {"id": 1, "is_bot": True, "first_name": "bot", "username": "stub_bot"} if name == "getMe" else True
+        return 200, json.dumps({"ok": True, "result": result}).encode()
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@pytest.mark.asyncio
+async def test_webhook_server_dispatches_updates_with_the_secret():
+    req = StubRequest()
+    app = ApplicationBuilder().token("123:abc").request(req).get_updates_request(StubRequest()).build()
+    seen = []
+    done = asyncio.Event()
+
+    async def ping(update, ctx):
+        seen.append((update.effective_chat.id, update.message.text))
+        done.set()
+
+    app.add_handler(CommandHandler("ping", ping))
+    cfg = Config(token="123:abc", webhook_url="https://bot.example.com", webhook_path="tg",
+                 webhook_listen="127.0.0.1", webhook_port=_free_port(), webhook_secret=SECRET)
+    params = webhook_params(cfg)
+    url = f"http://127.0.0.1:{cfg.webhook_port}/{params['url_path']}"
+
+    async with app:
+        await app.updater.start_webhook(**params)
+        await app.start()
+        try:
+            # setWebhook con la URL pública y el mismo secreto que valida el servidor
+            sw = dict(req.calls)["setWebhook"]
+            assert sw["url"] == "https://bot.example.com/tg" and sw["secret_token"] == SECRET
+
+            async with httpx.AsyncClient() as http:
+                bad = await http.post(url, json=UPDATE, headers={"X-Telegram-Bot-Api-Secret-Token": "otro"})
+                missing = await http.post(url, json=UPDATE)
+                assert (bad.status_code, missing.status_code) == (403, 403)
+                await asyncio.sleep(0.1)
+                assert seen == []
+
+                ok = await http.post(url, json=UPDATE, headers={"X-Telegram-Bot-Api-Secret-Token": SECRET})
+                assert ok.status_code == 200
+            await asyncio.wait_for(done.wait(), 5)
+            assert seen == [(42, "/ping")]
+        finally:
+            await app.updater.stop()
+            await app.stop()